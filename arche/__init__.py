@@ -29,6 +29,21 @@ default_settings = {
     'arche.auth.default_max_valid': 60, #Minutes
     'arche.auth.max_keep_days': 30, #Days since last activity
     'arche.log_roles': 'arche_jsonlog.security.roles', # Made-up namespace for roles adjustments - set to empty to disable
+    'arche.catalog_queue': False, # Defer catalog operations until the transaction commits
+    'arche.catalog_query_cache': 0, # Parsed query strings to keep - 0 means disabled
+    'arche.catalog_profiler': False, # Record time spent in catalog queries
+    'arche.catalog_profiler.slow': 100, # ms - queries slower than this are kept as samples
+    'arche.portlet_cache': 0, # Rendered portlets to keep - 0 means disabled
+    'arche.nav_limit': 0, # Navigation items listed per folder - 0 means all
+    'arche.instrumentation.requests': 100, # Recent requests kept by arche.tweens.instrumentation
+    'arche.instrumentation.server_timing': True, # Add a Server-Timing header to instrumented requests
+    'arche.search.lexicon': 'splitter case_normalizer', # Pipeline for the searchable_text index
+    'arche.search.language': 'english', # Used by the stemmer
+    'arche.search.stop_words': '', # Empty means the english defaults
+    'arche.search.boost': '', # Like 'title:3 description:2'
+    'arche.thumbnails.cache_dir': '', # Store thumbnails on disk - empty means disabled
+    'arche.thumbnails.cache_max_size': 500, # MB
+    'arche.thumbnails.workers': 0, # Threads creating thumbnails after upload - 0 means disabled
 }
 
 def setup_defaults(settings):
@@ -41,7 +56,14 @@ def setup_defaults(settings):
     ints = ['arche.auth.max_sessions',
             'arche.auth.activity_update',
             'arche.auth.default_max_valid',
-            'arche.auth.max_keep_days']
+            'arche.auth.max_keep_days',
+            'arche.catalog_query_cache',
+            'arche.catalog_profiler.slow',
+            'arche.instrumentation.requests',
+            'arche.portlet_cache',
+            'arche.nav_limit',
+            'arche.thumbnails.cache_max_size',
+            'arche.thumbnails.workers']
     adjust_ints(settings, ints)
 
 def includeme(config):
@@ -0,0 +1,264 @@
+""" Benchmarks for the catalog, traversal and security hot paths.
+
+    Run them offline against a generated site, in memory or in a FileStorage:
+
+        python -m arche.benchmarks --output results.json
+
+    or against an existing database (preferably a copy) with the benchmark script:
+
+        arche <paster ini> benchmark --output results.json
+
+    Results are written as json. Pass --compare with the results of a previous run
+    to report any benchmark that got slower than the threshold.
+"""
+from __future__ import unicode_literals
+
+import argparse
+import json
+import platform
+from collections import OrderedDict
+from datetime import datetime
+from itertools import islice
+from timeit import default_timer
+
+import transaction
+from pyramid.request import Request
+from pyramid.request import apply_request_extensions
+
+from arche.interfaces import ICataloger
+from arche.interfaces import IContextACL
+from arche.interfaces import IIndexedContent
+from arche.security import groupfinder
+from arche.utils import find_all_db_objects
+from arche.utils import resolve_docids
+
+
+benchmarks = OrderedDict()
+
+
+def benchmark(name):
+    """ Register a benchmark. The decorated function is called with root, request and
+        a sample of objects before each round, and should return a callable that
+        does the actual work and returns the number of operations performed.
+    """
+    def _register(func):
+        benchmarks[name] = func
+        return func
+    return _register
+
+
+@benchmark('index_object')
+def index_object_benchmark(root, request, objects):
+    catalogers = [ICataloger(x) for x in objects if IIndexedContent.providedBy(x)]
+    def _run():
+        for cataloger in catalogers:
+            cataloger.index_object()
+        return len(catalogers)
+    return _run
+
+
+@benchmark('index_object_partial')
+def index_object_partial_benchmark(root, request, objects):
+    catalogers = [ICataloger(x) for x in objects if IIndexedContent.providedBy(x)]
+    def _run():
+        for cataloger in catalogers:
+            cataloger.index_object(indexes = ('title',))
+        return len(catalogers)
+    return _run
+
+
+@benchmark('groupfinder')
+def groupfinder_benchmark(root, request, objects, users = 10):
+    userids = list(islice(root['users'].keys(), users)) if 'users' in root else []
+    def _run():
+        for obj in objects:
+            request.environ['authz_context'] = obj
+            for userid in userids:
+                groupfinder(userid, request)
+        return len(objects) * len(userids)
+    return _run
+
+
+@benchmark('resolve_docids')
+def resolve_docids_benchmark(root, request, objects):
+    docids = list(islice(root.document_map.docid_to_address.keys(), len(objects)))
+    def _run():
+        for obj in resolve_docids(request, docids):
+            pass
+        return len(docids)
+    return _run
+
+
+@benchmark('find_all_db_objects')
+def find_all_db_objects_benchmark(root, request, objects):
+    def _run():
+        return sum(1 for x in find_all_db_objects(root))
+    return _run
+
+
+@benchmark('acl')
+def acl_benchmark(root, request, objects):
+    objects = [x for x in objects if IContextACL.providedBy(x)]
+    def _run():
+        for obj in objects:
+            # Inherited ACLs raise AttributeError, like Pyramid expects
+            getattr(obj, '__acl__', None)
+        return len(objects)
+    return _run
+
+
+def make_request(root, registry):
+    request = Request.blank('/')
+    request.registry = registry
+    apply_request_extensions(request)
+    request.root = request.context = root
+    return request
+
+
+class BenchmarkRunner(object):
+    """ Runs the benchmarks against root and collects the results.
+        The transaction is aborted after each round.
+
+        sample
+            The number of objects used by benchmarks that work on single objects.
+        cold
+            Remove all objects from the connection cache before each round,
+            so objects are loaded from the storage while timing.
+    """
+
+    def __init__(self, root, registry, names = None, rounds = 5, sample = 1000, cold = False):
+        self.root = root
+        self.registry = registry
+        if names is None:
+            names = list(benchmarks)
+        for name in names:
+            if name not in benchmarks:
+                raise KeyError("No benchmark called %r" % name)
+        self.names = names
+        self.rounds = rounds
+        self.sample = sample
+        self.cold = cold
+
+    def __call__(self):
+        objects = list(islice(find_all_db_objects(self.root), self.sample))
+        results = OrderedDict()
+        for name in self.names:
+            results[name] = self.run(name, objects)
+        return {'meta': self.meta(objects), 'results': results}
+
+    def run(self, name, objects):
+        timings = []
+        operations = 0
+        for i in range(self.rounds):
+            if self.cold:
+                self.minimize_cache()
+            request = make_request(self.root, self.registry)
+            func = benchmarks[name](self.root, request, objects)
+            start = default_timer()
+            operations = func()
+            timings.append(default_timer() - start)
+            # So rounds start out the same, nothing is ever committed
+            transaction.abort()
+        best = min(timings)
+        return {'operations': operations,
+                'min': best,
+                'mean': sum(timings) / len(timings),
+                'max': max(timings),
+                'per_operation': operations and best / operations or best}
+
+    def minimize_cache(self):
+        jar = getattr(self.root, '_p_jar', None)
+        if jar is not None:
+            jar.cacheMinimize()
+
+    def meta(self, objects):
+        return {'created': datetime.utcnow().isoformat(),
+                'python': platform.python_version(),
+                'rounds': self.rounds,
+                'sample': len(objects),
+                'cold': self.cold}
+
+
+def run_benchmarks(root, registry, **kw):
+    """ Run benchmarks and return the results as a dict. See BenchmarkRunner for arguments. """
+    return BenchmarkRunner(root, registry, **kw)()
+
+
+def compare(old, new, threshold = 0.1):
+    """ Compare the time per operation of two results.
+        Returns a list of dicts, where 'regression' is true when the new time exceeds
+        the old one by more than threshold, a fraction of the old time.
+    """
+    comparison = []
+    for (name, result) in new['results'].items():
+        if name not in old['results']:
+            continue
+        before = old['results'][name]['per_operation']
+        after = result['per_operation']
+        change = before and (after - before) / before or 0.0
+        comparison.append({'name': name, 'old': before, 'new': after, 'change': change,
+                           'regression': change > threshold})
+    return comparison
+
+
+def format_results(results):
+    lines = ["%-24s %10s %12s %12s %14s" % ('Benchmark', 'Operations', 'Min (ms)', 'Mean (ms)', 'Per op (us)')]
+    for (name, result) in results['results'].items():
+        lines.append("%-24s %10s %12.2f %12.2f %14.2f" % (
+            name, result['operations'], result['min'] * 1000, result['mean'] * 1000,
+            result['per_operation'] * 1000000))
+    return "\n".join(lines)
+
+
+def format_comparison(comparison):
+    lines = ["%-24s %14s %14s %9s" % ('Benchmark', 'Old (us/op)', 'New (us/op)', 'Change')]
+    for row in comparison:
+        lines.append("%-24s %14.2f %14.2f %8.1f%%%s" % (
+            row['name'], row['old'] * 1000000, row['new'] * 1000000, row['change'] * 100,
+            row['regression'] and " REGRESSION" or ""))
+    return "\n".join(lines)
+
+
+def write_results(results, fn):
+    with open(fn, 'w') as f:
+        f.write(json.dumps(results, indent = 2))
+
+
+def read_results(fn):
+    with open(fn) as f:
+        return json.loads(f.read(), object_pairs_hook = OrderedDict)
+
+
+def report(results, parsed_ns):
+    """ Print and store results, and compare them if requested.
+        Returns False if there were any regressions.
+    """
+    print (format_results(results))
+    if parsed_ns.output:
+        write_results(results, parsed_ns.output)
+        print ("-- Results written to %s" % parsed_ns.output)
+    if parsed_ns.compare:
+        comparison = compare(read_results(parsed_ns.compare), results, threshold = parsed_ns.threshold)
+        print ("-- Compared with %s" % parsed_ns.compare)
+        print (format_comparison(comparison))
+        regressions = [x['name'] for x in comparison if x['regression']]
+        if regressions:
+            print ("-- Slower than the threshold: %s" % ", ".join(regressions))
+            return False
+    return True
+
+
+benchmark_parser = argparse.ArgumentParser(add_help = False)
+benchmark_parser.add_argument("-b", "--benchmark", action = "append", dest = "names",
+                              help = "Run only this benchmark, may be specified several times. "
+                                     "Available: %s" % ", ".join(benchmarks))
+benchmark_parser.add_argument("-r", "--rounds", type = int, default = 5,
+                              help = "Run each benchmark this many times and use the fastest")
+benchmark_parser.add_argument("-n", "--sample", type = int, default = 1000,
+                              help = "Number of objects used by per object benchmarks")
+benchmark_parser.add_argument("--cold", action = "store_true",
+                              help = "Clear the connection cache before each round")
+benchmark_parser.add_argument("-o", "--output", help = "Write the results as json to this file")
+benchmark_parser.add_argument("-c", "--compare", help = "Compare with the results in this json file")
+benchmark_parser.add_argument("-t", "--threshold", type = float, default = 0.1,
+                              help = "Allowed slowdown when comparing, as a fraction. Default 0.1")
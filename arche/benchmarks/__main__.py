@@ -0,0 +1,99 @@
+""" Run the benchmarks offline against a generated site.
+
+    The site is kept in memory unless a FileStorage is specified. An existing
+    FileStorage will be reused, so several runs can use the same site.
+"""
+from __future__ import unicode_literals
+
+import argparse
+import shutil
+import sys
+import tempfile
+
+import transaction
+from pyramid.config import Configurator
+from ZODB import DB
+from ZODB.FileStorage import FileStorage
+from ZODB.MappingStorage import MappingStorage
+from ZODB.blob import BlobStorage
+
+from arche.benchmarks import benchmark_parser
+from arche.benchmarks import report
+from arche.benchmarks import run_benchmarks
+
+
+parser = argparse.ArgumentParser(prog = "python -m arche.benchmarks",
+                                 description = __doc__,
+                                 parents = [benchmark_parser])
+parser.add_argument("-s", "--storage",
+                    help = "Path to a FileStorage to use. Blobs are kept in <path>.blobs")
+parser.add_argument("--users", type = int, default = 50)
+parser.add_argument("--groups", type = int, default = 5)
+parser.add_argument("--folders", type = int, default = 5, help = "Number of top level folders")
+parser.add_argument("--depth", type = int, default = 3, help = "How deep each folder is nested")
+parser.add_argument("--documents", type = int, default = 10, help = "Documents per folder")
+parser.add_argument("--blobs", type = int, default = 1, help = "Files per folder")
+parser.add_argument("--userid", default = "user0",
+                    help = "Userid to check permissions as. Default 'user0'")
+
+SITE_ARGS = ('users', 'groups', 'folders', 'depth', 'documents', 'blobs')
+
+
+def setup_config(userid = None):
+    """ The parts of Arche the benchmarks need, set up the same way as the tests do. """
+    from arche.testing import setup_auth
+    config = Configurator(settings = {})
+    config.include('arche.testing')
+    config.include('arche.testing.catalog')
+    config.include('arche.models.workflow')
+    config.include('arche.models.blob')
+    config.include('arche.resources')
+    setup_auth(config, userid = userid)
+    config.commit()
+    config.hook_zca()
+    config.begin()
+    return config
+
+
+def open_db(path = None):
+    if path:
+        return DB(FileStorage(path, blob_dir = path + '.blobs')), None
+    blob_dir = tempfile.mkdtemp()
+    return DB(BlobStorage(blob_dir, MappingStorage())), blob_dir
+
+
+def main(args = None):
+    from arche.benchmarks.site import generate_site
+    from arche.resources import Root
+    parsed_ns = parser.parse_args(args)
+    config = setup_config(userid = parsed_ns.userid)
+    db, tmp_dir = open_db(parsed_ns.storage)
+    conn = db.open()
+    try:
+        zodb_root = conn.root()
+        if 'app_root' not in zodb_root:
+            root = zodb_root['app_root'] = Root()
+            print ("-- Generating site")
+            created = generate_site(root, **dict((k, getattr(parsed_ns, k)) for k in SITE_ARGS))
+            transaction.commit()
+            print (", ".join("%s: %s" % x for x in sorted(created.items())))
+        else:
+            print ("-- Using the existing site in %s" % parsed_ns.storage)
+        root = zodb_root['app_root']
+        results = run_benchmarks(root, config.registry, names = parsed_ns.names,
+                                 rounds = parsed_ns.rounds, sample = parsed_ns.sample,
+                                 cold = parsed_ns.cold)
+        if not report(results, parsed_ns):
+            return 1
+        return 0
+    finally:
+        transaction.abort()
+        conn.close()
+        db.close()
+        config.end()
+        if tmp_dir:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
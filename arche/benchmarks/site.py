@@ -0,0 +1,111 @@
+""" Generate a synthetic site to run the benchmarks against. """
+from __future__ import unicode_literals
+
+from io import BytesIO
+from random import Random
+
+from arche.resources import Document
+from arche.resources import File
+from arche.resources import Group
+from arche.resources import Groups
+from arche.resources import Users
+from arche.resources import User
+from arche.security import ROLE_EDITOR
+from arche.security import ROLE_VIEWER
+
+
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit',
+         'sed', 'do', 'eiusmod', 'tempor', 'incididunt', 'labore', 'dolore', 'magna',
+         'aliqua', 'enim', 'minim', 'veniam', 'quis', 'nostrud', 'exercitation', 'ullamco',
+         'laboris', 'nisi', 'aliquip', 'commodo', 'consequat', 'duis', 'aute', 'irure')
+
+
+class SiteGenerator(object):
+    """ Adds users, groups, nested folders, documents with html bodies and files to root.
+        The same arguments and seed will always generate the same site.
+
+        Each of the top level folders is nested depth levels deep, and every folder
+        contains the specified number of documents and files. Groups get the editor
+        role on top level folders and users the viewer role in nested ones, so
+        local roles will be inherited.
+    """
+
+    def __init__(self, root, users = 50, groups = 5, folders = 5, depth = 3,
+                 documents = 10, blobs = 1, seed = 0):
+        self.root = root
+        self.users = users
+        self.groups = groups
+        self.folders = folders
+        self.depth = depth
+        self.documents = documents
+        self.blobs = blobs
+        self.random = Random(seed)
+        self.created = {}
+
+    def __call__(self):
+        userids = self.add_users()
+        principals = self.add_groups(userids)
+        for i in range(self.folders):
+            parent = self.root
+            for level in range(self.depth):
+                folder = self.add_folder(parent, 'folder-%s-%s' % (i, level))
+                if level == 0 and principals:
+                    folder.local_roles.add(principals[i % len(principals)], ROLE_EDITOR)
+                elif userids:
+                    folder.local_roles.add(self.random.choice(userids), ROLE_VIEWER)
+                for j in range(self.documents):
+                    self.add(folder, 'document-%s' % j, Document(title = self.text(3).title(),
+                                                                 body = self.html()))
+                for j in range(self.blobs):
+                    self.add(folder, 'file-%s.txt' % j, File(file_data = self.formdata(folder, j)))
+                parent = folder
+        return self.created
+
+    def add(self, parent, name, obj):
+        parent[name] = obj
+        self.created[obj.type_name] = self.created.get(obj.type_name, 0) + 1
+        return obj
+
+    def add_users(self):
+        if 'users' not in self.root:
+            self.root['users'] = Users()
+        userids = []
+        for i in range(self.users):
+            userid = 'user%s' % i
+            self.add(self.root['users'], userid, User(first_name = self.text(1).title(),
+                                                      last_name = self.text(1).title(),
+                                                      email = '%s@example.com' % userid))
+            userids.append(userid)
+        return userids
+
+    def add_groups(self, userids):
+        if 'groups' not in self.root:
+            self.root['groups'] = Groups()
+        principals = []
+        for i in range(self.groups):
+            group = self.add(self.root['groups'], 'group%s' % i, Group(title = self.text(2).title()))
+            group.members = userids[i::self.groups]
+            principals.append(group.principal_name)
+        return principals
+
+    def add_folder(self, parent, name):
+        return self.add(parent, name, Document(title = self.text(2).title(), body = self.html()))
+
+    def text(self, words):
+        return " ".join(self.random.choice(WORDS) for x in range(words))
+
+    def html(self, paragraphs = 3):
+        return "".join("<p>%s.</p>" % self.text(self.random.randint(10, 40))
+                       for x in range(paragraphs))
+
+    def formdata(self, folder, num):
+        # Unique contents, otherwise the blob store would share them
+        data = ("%s %s\n" % (folder.uid, num)).encode('ascii') * 256
+        return {'fp': BytesIO(data), 'filename': 'file-%s.txt' % num, 'mimetype': 'text/plain'}
+
+
+def generate_site(root, **kw):
+    """ Generate a synthetic site within root. Returns the number of created objects per type.
+        See SiteGenerator for arguments.
+    """
+    return SiteGenerator(root, **kw)()
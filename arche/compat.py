@@ -9,3 +9,8 @@ except ImportError:
     from collections import UserDict as IterableUserDict
     from collections import UserString
     from urllib.parse import unquote
+
+try:
+    from collections.abc import MutableSet
+except ImportError:
+    from collections import MutableSet
@@ -1 +1 @@
-VERSION = 0
+VERSION = 2
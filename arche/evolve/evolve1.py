@@ -0,0 +1,12 @@
+from __future__ import unicode_literals
+
+from arche import logger
+
+
+def evolve(root):
+    """ Build the reverse membership index for groups. """
+    groups = root.get('groups', None)
+    if groups is None:
+        return
+    logger.info("Building member index for %s groups", len(groups))
+    groups.rebuild_member_index()
@@ -0,0 +1,26 @@
+from __future__ import unicode_literals
+
+from pyramid.threadlocal import get_current_registry
+
+from arche import logger
+from arche.interfaces import ICataloger
+from arche.utils import PathResolver
+
+
+def evolve(root):
+    """ Add the metadata catalog rows use, like tags, size and thumb_key, to everything cataloged. """
+    document_map = getattr(root, 'document_map', None)
+    if document_map is None:
+        return
+    reg = get_current_registry()
+    resolve_path = PathResolver(root)
+    addresses = list(document_map.docid_to_address.items())
+    logger.info("Updating catalog metadata for %s objects", len(addresses))
+    for (docid, path) in addresses:
+        try:
+            obj = resolve_path(path)
+        except KeyError:
+            continue
+        cataloger = reg.queryAdapter(obj, ICataloger)
+        if cataloger is not None:
+            cataloger.update_metadata(docid)
@@ -388,6 +388,14 @@ class ICataloger(IContextAdapter):
     """ Content catalog adapter. """
 
 
+class ICatalogRow(Interface):
+    """ A dict with catalog data for one document, built without loading the object.
+        See arche.models.catalog.catalog_rows
+    """
+    docid = Attribute("Catalog docid")
+    path = Attribute("Path of the object")
+
+
 class IBlobs(IContextAdapter):
     """ Adapter that handles blob storage for a content type.
     """
@@ -402,13 +410,17 @@ class IEvolver(IContextAdapter):
 class IThumbnails(IContextAdapter):
     thumb_cache = Attribute("Property that returns the IThumbnailsCache utility")
 
-    def get_thumb(scale, key=None, direction="thumbnail"):
+    def get_thumb(scale, key=None, direction="thumbnail", create=True):
         """ Return the arche.models.thumbnails.Thumbnail object.
-            If it doesn't exist, it will be created first.
+            If it doesn't exist, it will be created first unless create is False.
 
             key will default to the context.blob_key attribute if it's None
         """
 
+    def is_pending(scale, key=None, direction="thumbnail"):
+        """ Return True if a background worker is creating this thumbnail.
+        """
+
     def invalidate_context_cache():
         """ Invalidate the cache relevat to the context that the adapter wrapped.
         """
@@ -428,6 +440,8 @@ class IMetadata(IContextAdapter):
     """ Named adapter that can be registered for objects that should have catalog metadata.
     """
     name = Attribute("Adapter name. Data will be stored with this as key.")
+    linked = Attribute("Attributes or indexes this value depends on. "
+                       "It will only be updated when any of them change. None means always.")
 
     def __call__(default = None):
         """ Return value to be stored, or default. """
@@ -528,7 +542,8 @@ class ICatalogIndexes(Interface):
 
 class IThumbnailsCache(Interface):
     """ Caches created thumbnails.
-        By default this is an instance of repoze.lru.LRUCache
+        By default this is arche.plugins.thumbnails.models.ThumbCache,
+        based on repoze.lru.LRUCache
 
         Value will be arche.models.thumbnails.Thumbnail objects
     """
@@ -548,6 +563,63 @@ class IThumbnailsCache(Interface):
         """ Invalidate a specific key
         """
 
+    def invalidate_uid(uid):
+        """ Invalidate all thumbnails for the object with this uid
+        """
+
+
+class IThumbnailsStore(Interface):
+    """ Persistent storage of created thumbnails, shared between processes.
+        Keys are based on the contents of the blob, so they never need to be invalidated.
+    """
+    path = Attribute("Directory where thumbnails are stored")
+    max_size = Attribute("Max size of the store in bytes. Least recently used thumbnails "
+                         "will be removed when it's exceeded. 0 means no limit.")
+
+    def get_key(blobfile, scale, size, direction):
+        """ Return the storage key for a BlobFile scaled to size (a tuple with width and height)
+            in a direction.
+        """
+
+    def __contains__(key):
+        """ Is there a stored thumbnail for key?
+        """
+
+    def get(key, default=None):
+        """ Get thumbnail
+        """
+
+    def put(key, thumb):
+        """ Store thumbnail
+        """
+
+    def evict():
+        """ Remove the least recently used thumbnails until the store fits within max_size.
+        """
+
+    def clear():
+        """ Remove all stored thumbnails
+        """
+
+
+class IThumbnailWorkers(Interface):
+    """ Creates thumbnails in background threads and puts them in the IThumbnailsStore.
+    """
+    store = Attribute("The IThumbnailsStore where the results end up")
+
+    def enqueue(storekey, filename, size, direction="thumbnail"):
+        """ Create a thumbnail from the image file at filename and store it as storekey.
+            Returns False if that thumbnail is already pending.
+        """
+
+    def is_pending(storekey):
+        """ Is this thumbnail waiting to be created?
+        """
+
+    def join():
+        """ Block until the queue is empty.
+        """
+
 
 class IScript(Interface):
     name = Attribute("Name, must be unique.")
@@ -7,8 +7,10 @@ def includeme(config):
     config.include('.file_upload')
     config.include('.flash_messages')
     config.include('.folder')
+    config.include('.folder_batch')
     config.include('.jsondata')
     config.include('.mimetype_views')
+    config.include('.query_profiler')
     config.include('.reference_guard')
     config.include('.versioning')
     config.include('.workflow')
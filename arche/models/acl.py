@@ -18,15 +18,29 @@ from arche.models.roles import Role
 class ACLEntry(IterableUserDict):
     """ Contains ACL information.
         Behaves like a callable dict.
+        Permissions are stored as frozensets, so use add and remove to change them.
     """
     title = ""
     description = ""
+    _compiled = None
 
     def __init__(self, title = "", description = ""):
         self.data = {}
         self.title = title
         self.description = description
 
+    def __setitem__(self, key, value):
+        self._compiled = None
+        if not isinstance(value, AllPermissionsList):
+            if isinstance(value, six.string_types):
+                value = (value,)
+            value = frozenset(value)
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        self._compiled = None
+        del self.data[key]
+
     def add(self, role, perms):
         if not IRole.providedBy(role):
             reg = get_current_registry()
@@ -41,9 +55,9 @@ class ACLEntry(IterableUserDict):
         if isinstance(perms, AllPermissionsList):
             self[role] = perms
         else:
-            current = self.setdefault(role, set())
+            current = self.get(role, frozenset())
             if not isinstance(current, AllPermissionsList):
-                current.update(perms)
+                self[role] = current.union(perms)
 
     def remove(self, role, perms):
         if isinstance(perms, six.string_types):
@@ -51,16 +65,21 @@ class ACLEntry(IterableUserDict):
         if isinstance(perms, AllPermissionsList):
             del self[role]
             return
-        current = self.get(role, set())
+        current = self.get(role, frozenset())
         if isinstance(current, AllPermissionsList): #pragma : no coverage
             raise ValueError("Permission list for '%s' currently set to Pyramids all permissions object. "
                              "It doesn't support clearing some permissions. ")
-        [current.remove(x) for x in perms if x in current]
+        self[role] = current.difference(perms)
 
     def __call__(self):
-        items = [(Allow, role, perms) for (role, perms) in self.items()]
-        items.append(DENY_ALL)
-        return items
+        """ Returns the ACL as a tuple. It's only built again after a change. """
+        if self._compiled is None:
+            items = []
+            for (role, perms) in self.items():
+                items.append((Allow, role, perms))
+            items.append(DENY_ALL)
+            self._compiled = tuple(items)
+        return self._compiled
 
     def __repr__(self): #pragma: no coverage
         klass = self.__class__
@@ -75,8 +94,10 @@ class ACLRegistry(IterableUserDict):
     """ Manages available ACL. """
     def __init__(self):
         self.data = {}
+        self._wf_entries = {}
 
     def __setitem__(self, key, aclentry):
+        self._wf_entries.clear()
         if isinstance(aclentry, ACLEntry):
             self.data[key] = aclentry
             if not aclentry.title: #pragma : no coverage
@@ -88,6 +109,10 @@ class ACLRegistry(IterableUserDict):
         else:
             raise TypeError("Can only have ACLEntries or strings (links to other ACL Entries as value, got %r)" % aclentry)
 
+    def __delitem__(self, key):
+        self._wf_entries.clear()
+        del self.data[key]
+
     def get_acl(self, acl_name):
         acl = self.get(acl_name, None)
         if isinstance(acl, six.string_types):
@@ -100,6 +125,21 @@ class ACLRegistry(IterableUserDict):
             logger.info("ACLRegistry has no registered type %r" % acl_name)
             return (DENY_ALL,)
 
+    def get_wf_acl(self, wf_name, state):
+        """ Return ACL for workflow name and state, or None if it isn't registered.
+            The lookup of '<workflow_name>:<workflow_state_id>' is cached.
+        """
+        key = (wf_name, state)
+        try:
+            entry = self._wf_entries[key]
+        except KeyError:
+            entry = self.get("%s:%s" % key, None)
+            if isinstance(entry, six.string_types):
+                entry = self[entry]
+            self._wf_entries[key] = entry
+        if entry is not None:
+            return entry()
+
     def is_linked(self, acl_name):
         return isinstance(self.get(acl_name, None), six.string_types)
 
@@ -1,15 +1,28 @@
+from binascii import hexlify
+from datetime import datetime
+from hashlib import md5
+from hashlib import sha256
 from uuid import uuid4
 
+import pytz
 from BTrees.OOBTree import OOBTree
 from ZODB.blob import Blob
+from ZODB.interfaces import BlobError
 from deform.widget import filedict
 from persistent import Persistent
+from pyramid.traversal import find_root
 from zope.component import adapter
+from zope.copy.interfaces import ICopyHook
+from zope.copy.interfaces import ResumeCopy
 from zope.interface import implementer
 
 from arche.compat import IterableUserDict
 from arche.interfaces import IBase
 from arche.interfaces import IBlobs
+from arche.interfaces import IFolder
+from arche.interfaces import IObjectAddedEvent
+from arche.interfaces import IObjectWillBeRemovedEvent
+from arche.interfaces import IRoot
 
 
 @implementer(IBlobs)
@@ -28,8 +41,18 @@ class Blobs(IterableUserDict):
             self.data = self.context.__blobs__ = OOBTree()
         self.data[key] = item
 
+    def __delitem__(self, key):
+        store = get_blob_store(self.context)
+        if store is not None:
+            store.release(self.data[key])
+        del self.data[key]
+
     def create(self, key, overwrite = False):
-        if key not in self or (key in self and overwrite):
+        if key in self and overwrite:
+            store = get_blob_store(self.context)
+            if store is not None:
+                store.release(self.data[key])
+        if key not in self or overwrite:
             self[key] = BlobFile()
         return self[key]
 
@@ -62,11 +85,23 @@ class Blobs(IterableUserDict):
                     del self[key]
             else:
                 bf = self.create(key)
+                store = get_blob_store(self.context)
+                if store is not None:
+                    store.release(bf)
+                # Blobs may be shared, so never write to an existing one
+                bf.blob = Blob()
                 with bf.blob.open('w') as f:
                     bf.filename = value['filename']
                     bf.mimetype = value['mimetype']
                     fp = value['fp']
-                    bf.size = upload_stream(fp, f)
+                    checksum = md5()
+                    content_hash = sha256()
+                    bf.size = upload_stream(fp, f, checksum = checksum, content_hash = content_hash)
+                bf.etag = checksum.hexdigest()
+                bf.sha256 = content_hash.hexdigest()
+                bf.modified = pytz.utc.localize(datetime.utcnow())
+                if store is not None:
+                    store.acquire(bf)
                 return bf
 
 
@@ -75,6 +110,9 @@ class BlobFile(Persistent):
     mimetype = ""
     filename = ""
     blob = None
+    etag = None #md5 hexdigest of the contents, set on upload
+    sha256 = None #Content hash used by the BlobStore
+    modified = None
 
     def __init__(self, size = None, mimetype = "", filename = ""):
         super(BlobFile, self).__init__()
@@ -83,8 +121,184 @@ class BlobFile(Persistent):
         self.filename = filename
         self.blob = Blob()
 
+    def get_etag(self):
+        """ Return the stored etag. Blobs uploaded before etags were stored
+            will use the transaction id of the blob instead.
+        """
+        if self.etag:
+            return self.etag
+        serial = getattr(self.blob, '_p_serial', None)
+        if serial:
+            return hexlify(serial).decode('ascii')
+
+    def open_read(self):
+        """ Open the blob for reading. Committed blobs are opened directly from
+            the blob directory, so the file stays usable after the
+            database connection has been closed.
+        """
+        try:
+            return open(self.blob.committed(), 'rb')
+        except BlobError:
+            return self.blob.open('r')
+
+
+class BlobIter(object):
+    """ Iterate over an open file in chunks. Usable as a webob app_iter,
+        and supports ranges by seeking within the file.
+    """
+
+    def __init__(self, _file, block_size = 1<<16, start = 0, stop = None):
+        self.file = _file
+        self.block_size = block_size
+        if start:
+            self.file.seek(start)
+        self.remaining = None if stop is None else max(stop - start, 0)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        size = self.block_size
+        if self.remaining is not None:
+            if self.remaining <= 0:
+                raise StopIteration()
+            size = min(size, self.remaining)
+        data = self.file.read(size)
+        if not data:
+            raise StopIteration()
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        return data
+
+    next = __next__ #Py2
+
+    def app_iter_range(self, start, stop):
+        return self.__class__(self.file, block_size = self.block_size, start = start, stop = stop)
+
+    def close(self):
+        self.file.close()
+
+
+class SharedBlob(Persistent):
+    """ A blob in the BlobStore and the number of BlobFiles using it. """
+    refcount = 0
+
+    def __init__(self, blob):
+        super(SharedBlob, self).__init__()
+        self.blob = blob
+
+
+class BlobStore(Persistent):
+    """ Content addressed store of blobs, keyed on sha256.
+        BlobFiles within the resource tree with the same content will
+        share the same ZODB Blob. The store only keeps track of when it should
+        let go of a blob - the data itself will be removed by packing the database
+        when nothing refers to it any longer.
+    """
+
+    def __init__(self):
+        super(BlobStore, self).__init__()
+        self.data = OOBTree()
+
+    def __contains__(self, content_hash):
+        return content_hash in self.data
 
-def upload_stream(stream, _file):
+    def __len__(self):
+        return len(self.data)
+
+    def acquire(self, blobfile):
+        """ Register usage of a BlobFile. If the same content already exists,
+            the BlobFile will use that blob instead.
+        """
+        if not blobfile.sha256:
+            return
+        try:
+            shared = self.data[blobfile.sha256]
+        except KeyError:
+            shared = self.data[blobfile.sha256] = SharedBlob(blobfile.blob)
+        if blobfile.blob is not shared.blob:
+            blobfile.blob = shared.blob
+        shared.refcount += 1
+
+    def release(self, blobfile):
+        if not blobfile.sha256:
+            return
+        shared = self.data.get(blobfile.sha256, None)
+        if shared is None or shared.blob is not blobfile.blob:
+            return
+        shared.refcount -= 1
+        if shared.refcount < 1:
+            del self.data[blobfile.sha256]
+
+
+def get_blob_store(context):
+    """ Return the BlobStore for the site context is located in,
+        or None if context isn't attached to a site.
+    """
+    try:
+        root = find_root(context)
+    except AttributeError: #pragma: no coverage
+        return
+    if not IRoot.providedBy(root):
+        return
+    store = getattr(root, '__blob_store__', None)
+    if store is None:
+        store = root.__blob_store__ = BlobStore()
+    return store
+
+
+def _iter_blob_files(context):
+    """ BlobFiles of context, and of everything within it if it's a container. """
+    if IFolder.providedBy(context) and len(context):
+        from arche.utils import find_all_db_objects
+        objs = find_all_db_objects(context)
+    else:
+        objs = (context,)
+    for obj in objs:
+        blobs = IBlobs(obj, None)
+        if blobs:
+            for blobfile in blobs.values():
+                yield blobfile
+
+
+def blobs_added_subscriber(context, event):
+    store = get_blob_store(context)
+    if store is not None:
+        for blobfile in _iter_blob_files(context):
+            store.acquire(blobfile)
+
+
+def blobs_removed_subscriber(context, event):
+    store = get_blob_store(context)
+    if store is not None:
+        for blobfile in _iter_blob_files(context):
+            store.release(blobfile)
+
+
+@implementer(ICopyHook)
+@adapter(BlobFile)
+class BlobFileCopyHook(object):
+    """ Copies of a BlobFile in the BlobStore will refer to the same blob instead
+        of cloning it. Those blobs are never written to once they've been created,
+        so this is safe. Other BlobFiles are copied as usual.
+    """
+
+    def __init__(self, context):
+        self.context = context
+
+    def __call__(self, toplevel, register):
+        context = self.context
+        if not context.sha256:
+            raise ResumeCopy
+        new_bf = BlobFile(size = context.size, mimetype = context.mimetype, filename = context.filename)
+        new_bf.__dict__.update(context.__dict__)
+        return new_bf
+
+
+def upload_stream(stream, _file, checksum = None, content_hash = None):
+    """ Copy stream to file in chunks and return the size.
+        checksum and content_hash can be hashlib objects that will be updated with the data.
+    """
     size = 0
     while 1:
         data = stream.read(1<<21)
@@ -92,8 +306,15 @@ def upload_stream(stream, _file):
             break
         size += len(data)
         _file.write(data)
+        if checksum is not None:
+            checksum.update(data)
+        if content_hash is not None:
+            content_hash.update(data)
     return size
 
 
 def includeme(config):
     config.registry.registerAdapter(Blobs, provided=IBlobs)
+    config.registry.registerAdapter(BlobFileCopyHook, provided = ICopyHook)
+    config.add_subscriber(blobs_added_subscriber, [IBase, IObjectAddedEvent])
+    config.add_subscriber(blobs_removed_subscriber, [IBase, IObjectWillBeRemovedEvent])
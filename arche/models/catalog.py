@@ -1,34 +1,50 @@
 from __future__ import unicode_literals
 
 from calendar import timegm
+from collections import OrderedDict
 from copy import copy
 from datetime import datetime
+from hashlib import md5
+from itertools import islice
+from operator import itemgetter
 from os import getenv
+from weakref import WeakKeyDictionary
+import heapq
 
+import transaction
+from pyramid.authorization import ACLAuthorizationPolicy
 from pyramid.interfaces import IApplicationCreated
+from pyramid.location import lineage
+from pyramid.security import Authenticated
+from pyramid.security import Everyone
 from pyramid.threadlocal import get_current_registry
 from pyramid.traversal import find_root
 from pyramid.traversal import resource_path
 from repoze.catalog.catalog import Catalog
+from repoze.catalog.catalog import ResultSetSize
 from repoze.catalog.document import DocumentMap
 from repoze.catalog.indexes.field import CatalogFieldIndex
 from repoze.catalog.indexes.keyword import CatalogKeywordIndex
 from repoze.catalog.indexes.path import CatalogPathIndex
 from repoze.catalog.indexes.text import CatalogTextIndex
 from repoze.catalog.query import Any, Eq
+from repoze.catalog.query import Contains
+from repoze.catalog.query import Not
 from six import string_types
+from six import text_type
 from zope.component import adapter
-from zope.index.text.lexicon import CaseNormalizer
-from zope.index.text.lexicon import Lexicon
-from zope.index.text.lexicon import Splitter
 from zope.interface import implementer
+from zope.interface import providedBy
 from zope.interface.verify import verifyClass
 
 from arche import logger
 from arche.compat import IterableUserDict
 from arche.exceptions import CatalogConfigError
+from arche.interfaces import IBlobs
 from arche.interfaces import ICatalogIndexes
+from arche.interfaces import ICatalogRow
 from arche.interfaces import ICataloger
+from arche.interfaces import IFile
 from arche.interfaces import IIndexedContent
 from arche.interfaces import ILocalRoles
 from arche.interfaces import IMetadata
@@ -36,9 +52,18 @@ from arche.interfaces import IObjectAddedEvent
 from arche.interfaces import IObjectUpdatedEvent
 from arche.interfaces import IObjectWillBeRemovedEvent
 from arche.interfaces import IRoot
+from arche.interfaces import IThumbnailedContent
+from arche.interfaces import IUser
 from arche.interfaces import IWorkflowAfterTransition
+from arche.models.lexicon import create_lexicon
+from arche.models.lexicon import get_boosts
+from arche.models.lexicon import text_fingerprint
+from arche.models.query_profiler import parse_query_cached
 from arche.models.workflow import WorkflowException
 from arche.models.workflow import get_context_wf
+from arche.security import PERM_VIEW
+from arche.security import get_roles
+from arche.utils import PathResolver
 from arche.utils import find_all_db_objects
 from arche.utils import prep_html_for_search_indexing
 
@@ -59,9 +84,11 @@ class Cataloger(object):
             those indexes. None means all though.
         """
         docid = self.document_map.docid_for_address(self.path)
+        changed = indexes
         if indexes is None:
             indexes = self.catalog.keys()
         if docid is None:
+            changed = None
             docid = self.document_map.add(self.path)
             for index in indexes:
                 if index in self.catalog:
@@ -78,7 +105,7 @@ class Cataloger(object):
                     except Exception: # pragma: no coverage
                         logger.warn("Failing index: %s", index)
                         raise
-        self.update_metadata(docid)
+        self.update_metadata(docid, indexes = changed)
 
     def unindex_object(self):
         docid = self.document_map.docid_for_address(self.path)
@@ -87,30 +114,64 @@ class Cataloger(object):
             #Metadata will be removed by running remove_docid
             self.document_map.remove_docid(docid)
 
-    def update_metadata(self, docid):
-        """ Clean up or add metadata to the document map. """
-        metadata = self.get_metadata()
+    def update_metadata(self, docid, indexes = None):
+        """ Clean up or add metadata to the document map.
+            If indexes is specified, only metadata linked to them will be updated.
+            Values that didn't change won't be written.
+        """
+        metadata = self.get_metadata(indexes = indexes)
+        try:
+            current = self.document_map.get_metadata(docid)
+        except KeyError:
+            current = {}
         if metadata:
-            self.document_map.add_metadata(docid, metadata)
-        else:
-            try:
-                self.document_map.remove_metadata(docid)
-            except KeyError:
-                pass #No metadata existed
-
-    def get_metadata(self):
-        """ Return metadata for current context, if any. """
+            changed = {}
+            for (k, v) in metadata.items():
+                if k not in current or current[k] != v:
+                    changed[k] = v
+            if changed:
+                self.document_map.add_metadata(docid, changed)
+        elif indexes is None and current:
+            self.document_map.remove_metadata(docid)
+
+    def get_metadata(self, indexes = None):
+        """ Return metadata for current context, if any.
+            If indexes is specified, only metadata linked to them will be returned.
+        """
         results = {}
         marker = object()
-        registry = get_current_registry()
-        for (name, metadata) in registry.getAdapters([self.context], IMetadata):
+        if indexes is not None:
+            indexes = set(indexes)
+        for (name, factory) in get_metadata_factories(self.context):
+            linked = getattr(factory, 'linked', None)
+            if indexes is not None and linked is not None and indexes.isdisjoint(linked):
+                continue
             #Catch exceptions? Probably
-            res = metadata(marker)
+            res = factory(self.context)(marker)
             if res is not marker:
                 results[name] = res
         return results
 
 
+def get_metadata_factories(context, registry = None):
+    """ Returns a tuple of (name, factory) for all metadata that adapts context.
+        The result is cached for each set of provided interfaces. Note that
+        the cache is only cleared by the add_metadata_field directive.
+    """
+    if registry is None:
+        registry = get_current_registry()
+    try:
+        cache = registry.metadata_factories
+    except AttributeError:
+        cache = registry.metadata_factories = {}
+    provided = providedBy(context)
+    try:
+        return cache[provided]
+    except KeyError:
+        factories = cache[provided] = tuple(registry.adapters.lookupAll((provided,), IMetadata))
+        return factories
+
+
 @implementer(ICatalogIndexes)
 class CatalogIndexes(IterableUserDict):
     name = None
@@ -136,6 +197,8 @@ class CatalogIndexHelper(object):
 
     def __init__(self):
         self.data = {}
+        self._required = None
+        self._always = None
 
     def update(self, name, linked=_default_marker, type_names=_default_marker):
         """ Update info for an index
@@ -158,6 +221,7 @@ class CatalogIndexHelper(object):
                 Mostly usable for quick reindex.
         """
         assert isinstance(name, string_types), "'name' must be a string"
+        self._required = None
         if isinstance(linked, string_types):
             linked = set([linked])
         if isinstance(type_names, string_types):
@@ -204,23 +268,57 @@ class CatalogIndexHelper(object):
         """ Returns a set of which indexes requires updates,
             given the list of other index names or attributes.
 
-            For instance, searchable_text must always be updated when title updates."""
-        # FIXME This function must be able to recurse into other index names without crashing
+            For instance, searchable_text must always be updated when title updates.
+            Indexes linked to other indexes are followed, so this works in several steps."""
         if names is None:
             # All indexes
             return
-        found = set(names)
-        names = set(names)
+        if self._required is None:
+            self.compile()
+        found = set()
+        for name in names:
+            try:
+                found.update(self._required[name])
+            except KeyError:
+                found.add(name)
+                found.update(self._always)
+        return found
+
+    def compile(self):
+        """ Build a map from each index or attribute name to all indexes that depend on it,
+            directly or through other indexes. This is done at the end of configuration,
+            or the first time it's needed after an update. Circular links are allowed.
+        """
+        dependents = {}
+        always = set()
         for info in self.values():
             if info.linked is None:
-                found.add(info.name)
-            elif info.linked & names:
-                found.add(info.name)
+                always.add(info.name)
+                continue
+            for name in info.linked:
+                dependents.setdefault(name, set()).add(info.name)
+        self._always = frozenset(self._closure(always, dependents))
+        required = {}
+        for name in set(dependents) | set(self.data):
+            required[name] = frozenset(self._closure([name], dependents) | self._always)
+        self._required = required
+
+    @staticmethod
+    def _closure(names, dependents):
+        found = set(names)
+        stack = list(names)
+        while stack:
+            for name in dependents.get(stack.pop(), ()):
+                if name not in found:
+                    # Names already found are skipped, so cycles end here
+                    found.add(name)
+                    stack.append(name)
         return found
 
     def __setitem__(self, key, value):
         assert isinstance(value, IndexInfo)
         self.data[key] = value
+        self._required = None
 
     def __getitem__(self, key):
         return self.data[key]
@@ -280,9 +378,13 @@ class Metadata(object):
                 return self.context.title.upper()
         
         config.add_metadata_field(MyUppercaseTitle)
+
+        Set linked to the attributes or indexes the value depends on, and the metadata
+        will only be updated when they change. None means always.
     """
     name = ''
     attr = ''
+    linked = None
 
     def __init__(self, context):
         self.context = context
@@ -298,9 +400,11 @@ def add_metadata_field(config, metadata_cls):
             logger.warn("Metadata adapter %r already registered with name %r. "
                         "Registering %r might override it." % (ar.factory, ar.name, metadata_cls))
     config.registry.registerAdapter(metadata_cls, name = metadata_cls.name)
+    config.registry.metadata_factories = {}
+    config.registry.row_fields = {}
 
 
-def create_metadata_field(config, callable_or_attr, name, adapts = IIndexedContent):
+def create_metadata_field(config, callable_or_attr, name, adapts = IIndexedContent, linked = None):
     """ Helper method to dynamically create metadata adapters.
         Callables must be methods that can replace the __call__ attribute of the
         Metadata class, or state an attribute to fetch.
@@ -315,6 +419,10 @@ def create_metadata_field(config, callable_or_attr, name, adapts = IIndexedConte
         Example with an attribute:
         
         config.create_metadata_field('uid', 'uid')
+
+        linked works like for update_index_info, so this will only update when title changes:
+
+        config.create_metadata_field('title', 'title', linked = 'title')
     """
     @adapter(adapts)
     class _DynMetadata(Metadata):
@@ -325,6 +433,10 @@ def create_metadata_field(config, callable_or_attr, name, adapts = IIndexedConte
     else:
         _DynMetadata.__call__ = callable_or_attr
     _DynMetadata.name = name
+    if isinstance(linked, string_types):
+        linked = (linked,)
+    if linked is not None:
+        _DynMetadata.linked = frozenset(linked)
     config.add_metadata_field(_DynMetadata)
 
 
@@ -342,6 +454,14 @@ def _get_unix_time(dt, default):
 def get_path(context, default): return resource_path(context)
 
 
+def get_parent_path(context, default):
+    """ The path index can't limit queries to direct children, so the parent is indexed too. """
+    parent = getattr(context, '__parent__', None)
+    if parent is None:
+        return default
+    return resource_path(parent)
+
+
 def get_date(context, default):
     res = getattr(context, 'date', default)
     return _get_unix_time(res, default)
@@ -381,20 +501,24 @@ def get_searchable_text(context, default):
     root = find_root(context)
     catalog = root.catalog
     registry = get_current_registry()
-    discriminators = list(getattr(registry, 'searchable_text_discriminators', ()))
+    discriminators = [(None, x) for x in getattr(registry, 'searchable_text_discriminators', ())]
     results = set()
-    registry = get_current_registry()
-    for index in registry.catalog_indexhelper['searchable_text'].linked:
+    indexes = set(getattr(registry, 'searchable_text_indexes', ()))
+    # Names linked directly with update_index_info are used too, like before
+    indexes.update(registry.catalog_indexhelper['searchable_text'].linked or ())
+    for index in indexes:
+        if index == 'searchable_text':
+            continue
         if index not in catalog: #pragma: no coverage
             # In case a bad name was linked in searchable_text, no reason to die because of it.
             continue
         disc = catalog[index].discriminator
         if isinstance(disc, string_types):
             attr_discriminator = _AttrDiscriminator(disc)
-            discriminators.append(attr_discriminator)
+            discriminators.append((index, attr_discriminator))
         else:
-            discriminators.append(catalog[index].discriminator)
-    for discriminator in discriminators:
+            discriminators.append((index, catalog[index].discriminator))
+    for (index, discriminator) in discriminators:
         res = discriminator(context, default)
         if res is default:
             continue
@@ -408,6 +532,39 @@ def get_searchable_text(context, default):
     return text and text or default
 
 
+class SearchableField(object):
+    """ Discriminator for the text index of a boosted field.
+        It reads the value like the index with the same name would.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, context, default):
+        index = find_root(context).catalog.get(self.name, None)
+        disc = getattr(index, 'discriminator', self.name)
+        if isinstance(disc, string_types):
+            res = getattr(context, disc, default)
+        else:
+            res = disc(context, default)
+        if res is default:
+            return default
+        if not isinstance(res, string_types):
+            res = str(res)
+        return res.strip() or default
+
+    def __eq__(self, other):
+        return isinstance(other, SearchableField) and other.name == self.name
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def boost_index_name(name):
+    """ Name of the text index that holds the boosted field name. """
+    return 'searchable_text_%s' % name
+
+
 def get_wf_state(context, default):
     try:
         wf = get_context_wf(context)
@@ -438,6 +595,80 @@ def get_local_roles(context, default):
     return default
 
 
+_acl_policy = ACLAuthorizationPolicy()
+
+
+def get_allowed_to_view(context, default):
+    """ Return principals allowed to view context.
+        Roles are expanded into the userids and groups that have them as local roles,
+        so the result can be matched against request.catalog_principals.
+        Inheritable roles held at the root apply everywhere, so they're kept as roles
+        instead. catalog_principals adds the roles the user has at the root.
+    """
+    registry = get_current_registry()
+    allowed = _acl_policy.principals_allowed_by_permission(context, PERM_VIEW)
+    roles = get_roles(registry = registry)
+    to_expand = set([x for x in allowed if x in roles and x not in (Everyone, Authenticated)])
+    results = set(allowed) - to_expand
+    if to_expand:
+        inherited_roles = get_roles(registry = registry, inheritable = True)
+        results.update(to_expand & set(inherited_roles))
+        for obj in lineage(context):
+            if ILocalRoles.providedBy(obj):
+                is_root = IRoot.providedBy(obj)
+                for (name, local_roles) in obj.local_roles.items():
+                    for role in local_roles:
+                        if role not in to_expand:
+                            continue
+                        if role in inherited_roles:
+                            if is_root:
+                                continue
+                        elif obj is not context:
+                            continue
+                        results.add(name)
+                        break
+    return results and tuple(results) or default
+
+
+def acl_fingerprint(registry):
+    """ A string that changes whenever the view permission in the ACL registry changes.
+        Stored on the 'allowed_to_view' index to detect when it needs to be reindexed.
+    """
+    items = []
+    for (name, entry) in getattr(registry, 'acl', {}).items():
+        if isinstance(entry, string_types):
+            items.append((name, entry))
+            continue
+        try:
+            principals = [getattr(role, 'principal', role) for (role, perms) in entry.items()
+                          if PERM_VIEW in perms]
+        except AttributeError: #pragma: no coverage
+            continue
+        items.append((name, tuple(sorted(principals))))
+    return repr(sorted(items))
+
+
+def reindex_view_permission_subscriber(context, event):
+    """ Local roles or workflow state changes may change who's allowed to view
+        anything below context too. The descendants are reindexed through the
+        index queue if it's enabled, otherwise right away.
+    """
+    if IObjectUpdatedEvent.providedBy(event):
+        if 'local_roles' not in (event.changed or ()):
+            return
+        if IRoot.providedBy(context):
+            # Inheritable roles at the root aren't expanded, see get_allowed_to_view
+            return
+    root = find_root(context)
+    catalog = getattr(root, 'catalog', None)
+    if catalog is None or 'allowed_to_view' not in catalog:
+        return
+    if _use_index_queue(get_current_registry()):
+        get_index_queue().index_descendants(root, resource_path(context), ['allowed_to_view'])
+    else:
+        _reindex_descendants(root, resource_path(context), ['allowed_to_view'])
+
+
 def get_relation(context, default):
     """ Attribute with a list of relations. """
     if hasattr(context, 'relation'):
@@ -452,33 +683,399 @@ def create_catalog(root):
     for util in reg.getAllUtilitiesRegisteredFor(ICatalogIndexes):
         for (key, index) in util.items():
             root.catalog[key] = copy(index)
+    if 'allowed_to_view' in root.catalog:
+        root.catalog['allowed_to_view'].acl_fingerprint = acl_fingerprint(reg)
+    if 'searchable_text' in root.catalog:
+        root.catalog['searchable_text'].text_fingerprint = text_fingerprint(reg.settings or {})
     _unregister_index_utils(registry=reg)
 
 
+def create_searchable_text_index(registry, field = None):
+    """ Create an empty searchable_text index, with the lexicon configured in settings.
+        Pass field to create the index for a boosted field instead.
+    """
+    settings = registry.settings or {}
+    discriminator = field is None and get_searchable_text or SearchableField(field)
+    index = CatalogTextIndex(discriminator, lexicon = create_lexicon(settings))
+    index.text_fingerprint = text_fingerprint(settings)
+    return index
+
+
+def _text_indexes(registry):
+    """ Names of the text indexes that use the lexicon settings, and their boosted field. """
+    results = {'searchable_text': None}
+    for name in getattr(registry, 'searchable_text_boosts', ()):
+        results[boost_index_name(name)] = name
+    return results
+
+
+def rebuild_index(catalog, name, registry):
+    """ Empty an index before it's reindexed. searchable_text and the boosted
+        field indexes will be recreated so changes to the lexicon settings are used.
+    """
+    text_indexes = _text_indexes(registry)
+    if name in text_indexes:
+        catalog[name] = create_searchable_text_index(registry, field = text_indexes[name])
+    else:
+        catalog[name].clear()
+
+
+def _contains_values(query, index_name):
+    """ Values searched for in index_name, except within Not. """
+    if isinstance(query, Contains):
+        if query.index_name == index_name and isinstance(query._value, string_types):
+            yield query._value
+    elif not isinstance(query, Not):
+        for child in getattr(query, 'iter_children', tuple)():
+            for value in _contains_values(child, index_name):
+                yield value
+
+
+def _boosted_weights(catalog, query, sort_index, result):
+    """ Returns (docid, weight) for a weighted searchable_text result.
+        Matches in the boosted field indexes add their own weight times the boost, minus one
+        since the field is part of searchable_text too.
+    """
+    boosts = getattr(get_current_registry(), 'searchable_text_boosts', {})
+    if sort_index != 'searchable_text' or not boosts:
+        return result.items()
+    values = list(_contains_values(query, sort_index))
+    weights = dict(result.items())
+    for (name, boost) in boosts.items():
+        index = catalog.get(boost_index_name(name), None)
+        if index is None or boost == 1:
+            continue
+        for value in values:
+            for (docid, weight) in index.applyContains(value).items():
+                if docid in weights:
+                    weights[docid] += weight * (boost - 1)
+    return weights.items()
+
+
+def sorted_query(catalog, query, sort_index = None, reverse = False, limit = None):
+    """ Like Catalog.query, but results sorted on a text index are ranked by relevance
+        through a heap when there's a limit, so only the top hits are ordered.
+        Sorting on a field index will use the catalogs own n-best sort.
+
+        Returns the same (ResultSetSize, docids) tuple as Catalog.query.
+    """
+    if not sort_index or not isinstance(catalog[sort_index], CatalogTextIndex):
+        return catalog.query(query, sort_index = sort_index, reverse = reverse, limit = limit)
+    if isinstance(query, string_types):
+        query = parse_query_cached(query)
+    res, result = catalog.query(query)
+    if hasattr(result, 'items'):
+        # A weighted result - larger weights first unless reversed
+        weights = _boosted_weights(catalog, query, sort_index, result)
+        if limit:
+            pick = reverse and heapq.nsmallest or heapq.nlargest
+            items = pick(limit, weights, key = itemgetter(1))
+        else:
+            items = sorted(weights, key = itemgetter(1), reverse = not reverse)
+        result = [docid for (docid, weight) in items]
+    elif limit:
+        # No text query, so there's nothing to rank on
+        result = list(islice(result, limit))
+    numdocs = limit and min(res.total, limit) or res.total
+    return ResultSetSize(numdocs, res.total), result
+
+
+@implementer(ICatalogRow)
+class CatalogRow(dict):
+    """ Catalog data for one document. Values are fetched from metadata or field indexes.
+        Dates from the default indexes are unix timestamps.
+    """
+
+    def __init__(self, docid, path):
+        super(CatalogRow, self).__init__()
+        self.docid = docid
+        self.path = path
+        self['__name__'] = path.rsplit('/', 1)[-1]
+
+    def url(self, request):
+        """ The same as request.resource_url for the object. """
+        url = request.resource_url(request.root)
+        if self.path != '/':
+            # Paths in the document map are already quoted
+            url += self.path.lstrip('/') + '/'
+        return url
+
+
+def get_row_fields(catalog, registry = None):
+    """ Returns the names that can be fetched for catalog rows: all field indexes
+        and metadata fields. The result is cached for each set of index names,
+        and the cache is cleared by the add_metadata_field directive.
+    """
+    if registry is None:
+        registry = get_current_registry()
+    try:
+        cache = registry.row_fields
+    except AttributeError:
+        cache = registry.row_fields = {}
+    key = tuple(sorted(catalog.keys()))
+    try:
+        return cache[key]
+    except KeyError:
+        fields = set(name for (name, index) in catalog.items() if isinstance(index, CatalogFieldIndex))
+        fields.update(ar.name for ar in registry.registeredAdapters() if ar.provided == IMetadata)
+        fields = cache[key] = frozenset(fields)
+        return fields
+
+
+def has_row_fields(request, fields):
+    """ Check if catalog_rows can return fields for the current site,
+        with the view permission checked.
+    """
+    catalog = request.root.catalog
+    if 'allowed_to_view' not in catalog:
+        return False
+    return set(fields) <= get_row_fields(catalog, request.registry)
+
+
+def get_catalog_rows(root, docids, fields):
+    """ Generator that returns a CatalogRow for each docid, in the same order.
+        Only fields that exist for that document will be set.
+        No permission checks are done here.
+    """
+    document_map = root.document_map
+    metadata = document_map.docid_to_metadata or {}
+    values = {}
+    for name in fields:
+        index = root.catalog.get(name, None)
+        if isinstance(index, CatalogFieldIndex):
+            values[name] = index._rev_index
+    marker = object()
+    for docid in docids:
+        path = document_map.address_for_docid(docid)
+        if path is None: #pragma: no coverage
+            continue
+        row = CatalogRow(docid, path)
+        meta = metadata.get(docid, {})
+        for name in fields:
+            if name in meta:
+                row[name] = meta[name]
+            elif name in values:
+                value = values[name].get(docid, marker)
+                if value is not marker:
+                    row[name] = value
+        yield row
+
+
+def catalog_rows(request, query, fields = (), limit = None, offset = 0,
+                 sort_index = None, reverse = False, perm = PERM_VIEW):
+    """ Search the catalog and return a list of CatalogRow for the result,
+        without loading any objects. Check which fields are available with
+        get_row_fields.
+
+        Since objects aren't loaded, the only permission that can be checked is view,
+        through the 'allowed_to_view' index. Pass perm = None to skip the check.
+
+        Also available as a request method, like:
+        request.catalog_rows(Eq('type_name', 'Document'), fields = ['title', 'uid'], limit = 20)
+    """
+    catalog = request.root.catalog
+    if isinstance(query, string_types):
+        query = parse_query_cached(query)
+    if perm:
+        if perm != PERM_VIEW or 'allowed_to_view' not in catalog:
+            raise CatalogConfigError("Catalog rows can only be checked for the view permission, "
+                                     "and only when the 'allowed_to_view' index exists.")
+        query &= Any('allowed_to_view', request.catalog_principals)
+    if limit is not None and limit <= 0:
+        return []
+    stop = limit and offset + limit or None
+    docids = sorted_query(catalog, query, sort_index = sort_index, reverse = reverse, limit = stop)[1]
+    return list(get_catalog_rows(request.root, islice(docids, offset, stop), fields))
+
+
+class IndexQueue(object):
+    """ Collects catalog operations during a transaction and performs them
+        once, right before the transaction commits.
+
+        Operations are coalesced per catalog address (which is what a docid maps to),
+        so an object that is updated several times during a request is only indexed once,
+        with the union of the changed indexes. Unindexing discards any index operations
+        queued before it for the same address. If something is indexed at that address
+        again after that, the old entry is removed and a full index operation is done.
+
+        Enable it by setting 'arche.catalog_queue = true' in the paster.ini file.
+    """
+
+    def __init__(self):
+        self.pending = OrderedDict()
+        self.descendants = OrderedDict()
+
+    def _key(self, cataloger):
+        return (id(cataloger.catalog), cataloger.path)
+
+    def index(self, cataloger, indexes = None):
+        key = self._key(cataloger)
+        entry = self.pending.get(key)
+        if entry is None:
+            self.pending[key] = {'cataloger': cataloger, 'indexes': _as_set(indexes), 'unindex': False}
+            return
+        if entry['cataloger'] is None:
+            # Unindexed before, so a full index operation is needed
+            entry['cataloger'] = cataloger
+            entry['indexes'] = None
+            return
+        entry['cataloger'] = cataloger
+        if entry['indexes'] is not None:
+            if indexes is None:
+                entry['indexes'] = None
+            else:
+                entry['indexes'].update(indexes)
+
+    def unindex(self, cataloger):
+        key = self._key(cataloger)
+        self.pending[key] = {'cataloger': None, 'indexes': None, 'unindex': cataloger}
+
+    def index_descendants(self, root, path, indexes):
+        """ Reindex indexes for everything cataloged below path.
+            The objects are looked up when the queue is flushed, once per path.
+        """
+        key = (id(root.catalog), path)
+        entry = self.descendants.get(key)
+        if entry is None:
+            self.descendants[key] = {'root': root, 'indexes': set(indexes)}
+        else:
+            entry['indexes'].update(indexes)
+
+    def flush(self):
+        """ Perform all pending operations. Safe to call several times. """
+        while self.pending or self.descendants:
+            while self.pending:
+                (key, entry) = self.pending.popitem(last = False)
+                if entry['unindex']:
+                    entry['unindex'].unindex_object()
+                if entry['cataloger'] is not None:
+                    entry['cataloger'].index_object(indexes = entry['indexes'])
+            if self.descendants:
+                ((catalog_id, path), entry) = self.descendants.popitem(last = False)
+                _reindex_descendants(entry['root'], path, entry['indexes'])
+
+    def __len__(self):
+        return len(self.pending) + len(self.descendants)
+
+    def __nonzero__(self):
+        return True
+    __bool__ = __nonzero__
+
+
+def _reindex_descendants(root, context_path, indexes):
+    catalog = root.catalog
+    reg = get_current_registry()
+    address_for_docid = root.document_map.address_for_docid
+    resolve_path = PathResolver(root)
+    for docid in catalog.query(Eq('path', context_path))[1]:
+        path = address_for_docid(docid)
+        if path == context_path or path is None:
+            continue
+        try:
+            obj = resolve_path(path)
+        except KeyError: #pragma: no coverage
+            # Removed within this transaction
+            continue
+        cataloger = reg.queryAdapter(obj, ICataloger)
+        if cataloger is not None:
+            cataloger.index_object(indexes = indexes)
+
+
+def _tags_metadata(self, default = None):
+    return tuple(getattr(self.context, 'tags', ())) or default
+
+
+def _thumb_key_metadata(self, default = None):
+    """ The blob thumbnails are made from, if it exists. """
+    key = getattr(self.context, 'blob_key', 'image')
+    if key in IBlobs(self.context, ()):
+        return key
+    return default
+
+
+def _as_set(indexes):
+    if indexes is None:
+        return None
+    return set(indexes)
+
+
+_index_queues = WeakKeyDictionary()
+
+
+def get_index_queue(txn = None):
+    """ Return the IndexQueue for the transaction, or the current transaction if none is specified.
+        The queue will be flushed by a before-commit hook.
+    """
+    if txn is None:
+        txn = transaction.get()
+    try:
+        return _index_queues[txn]
+    except KeyError:
+        queue = _index_queues[txn] = IndexQueue()
+        txn.addBeforeCommitHook(queue.flush)
+        return queue
+
+
+def flush_index_queue(txn = None):
+    """ Perform any pending catalog operations right away.
+        Useful when catalog queries must see changes made within the same transaction.
+    """
+    if txn is None:
+        txn = transaction.get()
+    queue = _index_queues.get(txn)
+    if queue is not None:
+        queue.flush()
+
+
+def _use_index_queue(registry):
+    settings = getattr(registry, 'settings', None) or {}
+    return settings.get('arche.catalog_queue', False)
+
+
 # Subscribers
 def index_object_subscriber(context, event):
     reg = get_current_registry()
     changed = getattr(event, 'changed', None)
+    if IWorkflowAfterTransition.providedBy(event):
+        # Transitions only change the state
+        changed = ('wf_state',)
     if changed is not None:
         changed = set(changed)
         changed = reg.catalog_indexhelper.get_required(changed)
     cataloger = reg.queryAdapter(context, ICataloger)
-    cataloger.index_object(indexes = changed)
+    if _use_index_queue(reg):
+        get_index_queue().index(cataloger, indexes = changed)
+    else:
+        cataloger.index_object(indexes = changed)
 
 
 def unindex_object_subscriber(context, event):
     reg = get_current_registry()
     cataloger = reg.queryAdapter(context, ICataloger)
-    cataloger.unindex_object()
+    if _use_index_queue(reg):
+        get_index_queue().unindex(cataloger)
+    else:
+        cataloger.unindex_object()
 
 
-def add_searchable_text_discriminator(config, discriminator):
+def add_searchable_text_discriminator(config, discriminator, linked=None):
     """ A directive to add a discriminator to the index searchable_text.
     
         Discriminators are just a function accepting context and default as argument.
         It should return text, or default.
+
+        linked is the attributes the discriminator reads. searchable_text will be
+        reindexed when any of them change. Without linked, searchable_text is reindexed
+        on every change, since there's no telling what the discriminator reads.
+        It's only narrowed down to the linked attributes if every discriminator has them.
     """
     assert callable(discriminator), "Not a callable"
+    if linked:
+        if not _searchable_text_always(config.registry):
+            config.update_index_info('searchable_text', linked)
+    else:
+        config.registry.searchable_text_always = True
+        config.update_index_info('searchable_text', linked=None)
     try:
         discriminators = config.registry.searchable_text_discriminators
     except AttributeError:
@@ -492,16 +1089,47 @@ def add_searchable_text_index(config, names):
     """
     if isinstance(names, string_types):
         names = [names]
-    config.update_index_info('searchable_text', names)
+    try:
+        indexes = config.registry.searchable_text_indexes
+    except AttributeError:
+        indexes = config.registry.searchable_text_indexes = set()
+    indexes.update(names)
+    if not _searchable_text_always(config.registry):
+        config.update_index_info('searchable_text', names)
+
+
+def _searchable_text_always(registry):
+    """ True if a discriminator without linked attributes has been added. """
+    return getattr(registry, 'searchable_text_always', False)
 
 
 def _searchable_html_body(context, default):
     body = getattr(context, 'body', default)
     if body != default and isinstance(body, string_types):
-        return prep_html_for_search_indexing(body)
+        return get_body_text(context, body)
     return default
 
 
+def get_body_text(context, body):
+    """ Returns body as plain text. The text is stored on the context together with
+        a hash of body, so the HTML only has to be parsed again when body changes.
+    """
+    data = body
+    if isinstance(data, text_type):
+        # An empty text body would be passed on as text otherwise
+        data = data.encode('utf-8')
+    digest = md5(data).hexdigest()
+    cached = getattr(context, '__body_text__', None)
+    if cached is not None and cached[0] == digest:
+        return cached[1]
+    text = prep_html_for_search_indexing(body)
+    try:
+        context.__body_text__ = (digest, text)
+    except AttributeError: #pragma: no coverage
+        pass
+    return text
+
+
 def _savepoint_callback(current):
     logger.info("Reindexing-progress: %s", current)
 
@@ -509,7 +1137,6 @@ def _savepoint_callback(current):
 def reindex_catalog(root, savepoint_limit = 1000, savepoint_callback=_savepoint_callback):
     i = 0
     total = 0
-    import transaction
     logger.info("Reindexing catalog")
     for obj in find_all_db_objects(root):
         try:
@@ -556,6 +1183,27 @@ def check_catalog(root, registry):
                 del catalog[key]
                 index_needs_indexing.append(key)
                 catalog[key] = index
+    if 'allowed_to_view' in catalog:
+        fingerprint = acl_fingerprint(registry)
+        if getattr(catalog['allowed_to_view'], 'acl_fingerprint', None) != fingerprint:
+            if 'allowed_to_view' not in index_needs_indexing:
+                logger.warn("The ACL registry has changed since 'allowed_to_view' was indexed. "
+                            "It will be reindexed.")
+                index_needs_indexing.append('allowed_to_view')
+            catalog['allowed_to_view'].acl_fingerprint = fingerprint
+    settings = registry.settings or {}
+    fingerprint = text_fingerprint(settings)
+    for name in sorted(_text_indexes(registry)):
+        if name not in catalog:
+            continue
+        # Indexes created before the lexicon was configurable used the default settings
+        current = getattr(catalog[name], 'text_fingerprint', text_fingerprint({}))
+        if current != fingerprint and name not in index_needs_indexing:
+            logger.warn("The search lexicon settings have changed. "
+                        "%r will be recreated and reindexed.", name)
+            rebuild_index(catalog, name, registry)
+            index_needs_indexing.append(name)
+        catalog[name].text_fingerprint = fingerprint
     # Clean up unused indexes
     indexes_to_remove = set()
     for key in catalog:
@@ -646,6 +1294,8 @@ def includeme(config):
     config.add_subscriber(index_object_subscriber, [IIndexedContent, IObjectUpdatedEvent])
     config.add_subscriber(index_object_subscriber, [IIndexedContent, IWorkflowAfterTransition])
     config.add_subscriber(unindex_object_subscriber, [IIndexedContent, IObjectWillBeRemovedEvent])
+    config.add_subscriber(reindex_view_permission_subscriber, [IIndexedContent, IObjectUpdatedEvent])
+    config.add_subscriber(reindex_view_permission_subscriber, [IIndexedContent, IWorkflowAfterTransition])
     config.add_subscriber(check_catalog_on_startup, IApplicationCreated)
 
     config.add_directive('add_catalog_indexes', add_catalog_indexes)
@@ -654,8 +1304,12 @@ def includeme(config):
     config.add_directive('add_searchable_text_discriminator', add_searchable_text_discriminator)
     config.add_directive('add_metadata_field', add_metadata_field)
     config.add_directive('create_metadata_field', create_metadata_field)
+    config.add_request_method(catalog_rows)
 
     config.registry.catalog_indexhelper = CatalogIndexHelper()
+    # Runs when the configuration is committed, after all index info has been added
+    config.action('arche.catalog_indexhelper', config.registry.catalog_indexhelper.compile)
+    config.registry.searchable_text_boosts = get_boosts(config.registry.settings or {})
 
     default_indexes = {
         'title': CatalogFieldIndex('title'),
@@ -663,10 +1317,13 @@ def includeme(config):
         'type_name': CatalogFieldIndex('type_name'),
         'sortable_title': CatalogFieldIndex(get_sortable_title),
         'path': CatalogPathIndex(get_path),
-        'searchable_text': CatalogTextIndex(get_searchable_text, lexicon = Lexicon(Splitter(), CaseNormalizer())),
+        'parent_path': CatalogFieldIndex(get_parent_path),
+        'searchable_text': create_searchable_text_index(config.registry),
         'uid': CatalogFieldIndex('uid'),
         'tags': CatalogKeywordIndex(get_tags),
         'search_visible': CatalogFieldIndex('search_visible'),
+        'nav_visible': CatalogFieldIndex('nav_visible'),
+        'listing_visible': CatalogFieldIndex('listing_visible'),
         'date': CatalogFieldIndex(get_date),
         'modified': CatalogFieldIndex(get_modified),
         'created': CatalogFieldIndex(get_created),
@@ -679,12 +1336,15 @@ def includeme(config):
         'last_name': CatalogFieldIndex('last_name'),
         'local_roles': CatalogKeywordIndex(get_local_roles),
         'relation': CatalogKeywordIndex(get_relation),
+        'allowed_to_view': CatalogKeywordIndex(get_allowed_to_view),
         }
     config.add_catalog_indexes(__name__, default_indexes)
     # Limit these indexes to the User type
     config.update_index_info(('userid', 'email', 'first_name', 'last_name'), type_names = 'User')
-    # Force reindex of tags and searchable text every time
-    config.update_index_info(('tags', 'searchable_text'), linked=None)
+    # Force reindex of tags every time. Searchable text is linked to the fields it's built from.
+    config.update_index_info('tags', linked=None)
+    # Who's allowed to view depends on local roles and workflow state
+    config.update_index_info('allowed_to_view', linked=('local_roles', 'wf_state'))
     config.add_searchable_text_index((
         'title',
         'description',
@@ -694,4 +1354,18 @@ def includeme(config):
         'last_name',
         'email'
     ))
-    config.add_searchable_text_discriminator(_searchable_html_body)
+    config.add_searchable_text_discriminator(_searchable_html_body, linked='body')
+    # Boosted fields get a text index of their own, so they can be weighted when searching
+    boost_indexes = {}
+    for name in config.registry.searchable_text_boosts:
+        boost_indexes[boost_index_name(name)] = create_searchable_text_index(config.registry, field = name)
+    if boost_indexes:
+        config.add_catalog_indexes('arche.search.boost', boost_indexes)
+        for name in config.registry.searchable_text_boosts:
+            config.update_index_info(boost_index_name(name), linked = name)
+    # Catalog rows need these to return the same data as IJSONData for objects
+    config.create_metadata_field(_tags_metadata, 'tags')
+    for name in ('size', 'mimetype', 'css_icon'):
+        config.create_metadata_field(name, name, adapts = IFile)
+    config.create_metadata_field('email_validated', 'email_validated', adapts = IUser)
+    config.create_metadata_field(_thumb_key_metadata, 'thumb_key', adapts = IThumbnailedContent)
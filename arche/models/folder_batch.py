@@ -0,0 +1,194 @@
+""" Paginated listings of folder contents.
+
+    Folders with many thousands of children can't be listed by loading all of them.
+    folder_batch uses the catalog to find, count and sort the children of a folder,
+    so only the objects on the requested page are loaded. When the catalog can't
+    answer the query it falls back to iterating over the folder.
+
+    Also available as a request method:
+
+        batch = request.folder_batch(context, start = 0, limit = 20, filters = {'nav_visible': True})
+"""
+from __future__ import unicode_literals
+
+from itertools import islice
+
+from pyramid.traversal import resource_path
+from repoze.catalog.query import Any
+from repoze.catalog.query import Eq
+from six import string_types
+
+from arche.models.catalog import flush_index_queue
+from arche.models.catalog import sorted_query
+from arche.security import PERM_VIEW
+from arche.utils import Batch
+from arche.utils import resolve_docids
+
+
+def batch_params(request, limit = 20, max_limit = None):
+    """ Returns start and limit from the request params, as a tuple.
+        'offset' is accepted as an old name for start.
+    """
+    params = request.params
+    try:
+        start = max(int(params.get('start', params.get('offset', 0))), 0)
+    except (TypeError, ValueError):
+        start = 0
+    try:
+        limit = max(int(params.get('limit', limit)), 1)
+    except (TypeError, ValueError):
+        pass
+    if max_limit is not None:
+        limit = min(limit, max_limit)
+    return start, limit
+
+
+def _wanted(value):
+    """ Filter values that are lists, tuples or sets match any of their items. """
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return set(value)
+
+
+def _catalog_usable(catalog, document_map, path, sort_on, filters):
+    if 'parent_path' not in catalog:
+        return False
+    if document_map.docid_for_address(path) is None:
+        return False
+    for name in filters:
+        if name not in catalog:
+            return False
+    if sort_on and not hasattr(catalog.get(sort_on, None), 'sort'):
+        return False
+    return True
+
+
+def _ordered_docids(context, path, docids, document_map, stop = None):
+    """ Generator with the docids in the result, in the same order as the folder.
+        The folder is only walked until stop docids, or all of them, have been found.
+    """
+    remaining = len(docids)
+    if stop is not None:
+        remaining = min(remaining, stop)
+    if not remaining:
+        return
+    prefix = path.rstrip('/') + '/'
+    docid_for_address = document_map.docid_for_address
+    for name in context.keys():
+        docid = docid_for_address(prefix + name)
+        if docid is not None and docid in docids:
+            yield docid
+            remaining -= 1
+            if not remaining:
+                return
+
+
+def _catalog_batch(request, context, path, start, limit, sort_on, reverse, filters, perm):
+    catalog = request.root.catalog
+    query = Eq('parent_path', path)
+    for (name, value) in filters.items():
+        wanted = _wanted(value)
+        if wanted is None:
+            query &= Eq(name, value)
+        else:
+            query &= Any(name, list(wanted))
+    if perm == PERM_VIEW and 'allowed_to_view' in catalog:
+        query &= Any('allowed_to_view', request.catalog_principals)
+        perm = None
+    if sort_on:
+        # When each object has to be checked, there's no telling how many are needed
+        res, docids = sorted_query(catalog, query, sort_index = sort_on, reverse = reverse,
+                                   limit = perm is None and start + limit or None)
+    else:
+        res, result = catalog.query(query)
+        docids = _ordered_docids(context, path, result, request.root.document_map,
+                                 stop = perm is None and start + limit or None)
+    if perm is None:
+        items = resolve_docids(request, islice(docids, start, start + limit), perm = None)
+    else:
+        items = resolve_docids(request, docids, perm = perm, limit = limit, offset = start)
+    return Batch(items, start = start, limit = limit, total = res.total, request = request)
+
+
+def _get_discriminator(catalog, name):
+    """ Read values like the index would, if there is one. """
+    index = None
+    if catalog is not None:
+        index = catalog.get(name, None)
+    discriminator = getattr(index, 'discriminator', name)
+    if isinstance(discriminator, string_types):
+        return lambda obj, default: getattr(obj, discriminator, default)
+    return discriminator
+
+
+def _matches(value, expected):
+    wanted = _wanted(expected)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        if wanted is None:
+            return expected in value
+        return not wanted.isdisjoint(value)
+    if wanted is None:
+        return value == expected
+    return value in wanted
+
+
+def _iter_batch(request, context, start, limit, sort_on, reverse, filters, perm):
+    catalog = getattr(request.root, 'catalog', None)
+    filters = [(_get_discriminator(catalog, name), value) for (name, value) in filters.items()]
+    items = []
+    for obj in context.values():
+        if perm and not request.has_permission(perm, obj):
+            continue
+        for (discriminator, expected) in filters:
+            if not _matches(discriminator(obj, None), expected):
+                break
+        else:
+            items.append(obj)
+    if sort_on:
+        discriminator = _get_discriminator(catalog, sort_on)
+        def _key(obj):
+            value = discriminator(obj, None)
+            return (value is None, value)
+        items.sort(key = _key, reverse = reverse)
+    return Batch(items[start:start + limit], start = start, limit = limit,
+                 total = len(items), request = request)
+
+
+def folder_batch(request, context, start = 0, limit = 20, sort_on = None, reverse = False,
+                 filters = None, perm = PERM_VIEW):
+    """ Returns a Batch with the children of context.
+
+        start, limit
+            The slice of the matching children to return.
+        sort_on
+            The name of a sortable catalog index. The default is the order of the folder.
+        reverse
+            Reverse the order of sort_on.
+        filters
+            A dict of index names and the values they should have. Lists, tuples and sets
+            match any of their values.
+        perm
+            Only return objects with this permission. Pass None to skip the check.
+            The view permission is checked through the 'allowed_to_view' index, other
+            permissions are checked on each object. In that case, batch.total may include
+            objects that aren't returned.
+
+        The catalog is used as long as context is indexed, and filters and sort_on are indexes.
+        Note that children that aren't indexed content won't be returned in that case.
+        Otherwise all children are loaded and filtered through the same discriminators
+        as the indexes use.
+    """
+    start = max(start, 0)
+    filters = filters or {}
+    root = request.root
+    catalog = getattr(root, 'catalog', None)
+    if catalog is not None:
+        path = resource_path(context)
+        # Pending index operations from this transaction must be visible
+        flush_index_queue()
+        if _catalog_usable(catalog, root.document_map, path, sort_on, filters):
+            return _catalog_batch(request, context, path, start, limit, sort_on, reverse, filters, perm)
+    return _iter_batch(request, context, start, limit, sort_on, reverse, filters, perm)
+
+
+def includeme(config):
+    config.add_request_method(folder_batch)
@@ -1,10 +1,19 @@
+from datetime import datetime
+
+from pyramid.i18n import TranslationString
+from pytz import utc
+from six import integer_types
 from zope.component import adapter
 from zope.interface import implementer
 
 from arche.interfaces import IBase, IContextACL
+from arche.interfaces import ICatalogRow
 from arche.interfaces import IFolder
 from arche.interfaces import IJSONData
-from pyramid.i18n import TranslationString
+
+
+NORMAL_ATTRS = ('description', 'type_name', 'type_title', 'uid', '__name__', 'size', 'mimetype')
+DT_ATTRS = ('created', 'modified', 'date')
 
 
 @implementer(IJSONData)
@@ -17,10 +26,8 @@ class JSONData(object):
     def __init__(self, context):
         self.context = context
 
-    def __call__(self, request, dt_formater = None, attrs = (), dt_attrs = ['created', 'modified', 'date']):
-        normal_attrs = ['description', 'type_name',
-                        'type_title', 'uid',
-                        '__name__', 'size', 'mimetype']
+    def __call__(self, request, dt_formater = None, attrs = (), dt_attrs = DT_ATTRS):
+        normal_attrs = list(NORMAL_ATTRS)
         normal_attrs.extend(attrs)
         #wf_state and name?
         results = {}
@@ -50,5 +57,58 @@ class JSONData(object):
         return results
 
 
+@implementer(IJSONData)
+@adapter(ICatalogRow)
+class JSONRowData(object):
+    """ The same data as JSONData, but from a catalog row so the object isn't loaded.
+        Only use it when the catalog has all fields returned by required_fields,
+        see arche.models.catalog.get_row_fields
+    """
+    # These are fetched from the content factory
+    factory_attrs = ('type_title',)
+    # These are fetched from the content factory when the row doesn't have them
+    factory_defaults = ('css_icon',)
+
+    def __init__(self, context):
+        self.context = context
+
+    @classmethod
+    def required_fields(cls, attrs = (), dt_attrs = DT_ATTRS):
+        fields = set(NORMAL_ATTRS) | set(attrs) | set(dt_attrs)
+        fields.update(['title', 'tags', 'wf_state', 'workflow'])
+        fields.update(cls.factory_defaults)
+        return fields - set(cls.factory_attrs) - set(['__name__'])
+
+    def __call__(self, request, dt_formater = None, attrs = (), dt_attrs = DT_ATTRS):
+        row = self.context
+        factory = request.content_factories.get(row.get('type_name', None), None)
+        results = {}
+        results['wf_state'] = row.get('wf_state', '')
+        results['workflow'] = row.get('workflow', '')
+        results['tags'] = tuple(row.get('tags', ()))
+        results['is_folder'] = factory is not None and IFolder.implementedBy(factory)
+        results['title'] = row.get('title', None) or row['__name__']
+        for attr in self.factory_attrs:
+            results[attr] = getattr(factory, attr, '')
+        for attr in self.factory_defaults:
+            results[attr] = row.get(attr, getattr(factory, attr, ''))
+        for attr in NORMAL_ATTRS + tuple(attrs):
+            if attr not in self.factory_attrs:
+                results[attr] = row.get(attr, '')
+            if isinstance(results[attr], TranslationString):
+                results[attr] = request.localizer.translate(results[attr])
+        for attr in dt_attrs:
+            val = row.get(attr, '')
+            if isinstance(val, integer_types):
+                # Dates are stored as unix time in the catalog
+                val = datetime.fromtimestamp(val, utc)
+            if val and dt_formater:
+                results[attr] = request.localizer.translate(dt_formater(val))
+            else:
+                results[attr] = val
+        return results
+
+
 def includeme(config):
     config.registry.registerAdapter(JSONData)
+    config.registry.registerAdapter(JSONRowData)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+""" Pipeline elements for the lexicon of the searchable_text index.
+
+    The pipeline is configured with 'arche.search.lexicon' as a list of names that will
+    process the text in order. Use a dotted name to plug in something else. It must point
+    to a callable that accepts the settings and returns an object with a process method,
+    see zope.index.text.interfaces.IPipelineElement.
+"""
+from __future__ import unicode_literals
+
+import unicodedata
+from threading import local
+
+from pyramid.path import DottedNameResolver
+from six import text_type
+from zope.index.text.lexicon import CaseNormalizer
+from zope.index.text.lexicon import Lexicon
+from zope.index.text.lexicon import Splitter
+
+from arche.exceptions import CatalogConfigError
+from zope.index.text.lexicon import StopWordRemover
+
+
+def _is_glob(word):
+    return '*' in word or '?' in word
+
+
+class AccentFolder(object):
+    """ Remove accents and other diacritics, so 'café' will match 'cafe'. """
+
+    def process(self, lst):
+        return [fold_accents(x) for x in lst]
+
+    processGlob = process
+
+
+class Stemmer(object):
+    """ Reduce words to their stem, so 'running' will match 'run'.
+        Requires the snowballstemmer package. Place it after the case normalizer.
+    """
+
+    def __init__(self, language = 'english'):
+        self.language = language
+
+    def process(self, lst):
+        return get_stemmer(self.language).stemWords(lst)
+
+    def processGlob(self, lst):
+        stemmer = get_stemmer(self.language)
+        return [_is_glob(x) and x or stemmer.stemWord(x) for x in lst]
+
+
+def fold_accents(word):
+    if not isinstance(word, text_type):
+        return word
+    return ''.join(x for x in unicodedata.normalize('NFKD', word) if not unicodedata.combining(x))
+
+
+# Stemmers keep state while they work, so each thread has its own
+_stemmers = local()
+
+
+def get_stemmer(language):
+    stemmers = getattr(_stemmers, 'by_language', None)
+    if stemmers is None:
+        stemmers = _stemmers.by_language = {}
+    try:
+        return stemmers[language]
+    except KeyError:
+        try:
+            import snowballstemmer
+        except ImportError: #pragma: no coverage
+            raise ImportError("The 'stemmer' lexicon element requires snowballstemmer. "
+                              "Install Arche with the 'stemming' extra.")
+        stemmer = stemmers[language] = snowballstemmer.stemmer(language)
+        return stemmer
+
+
+def _stop_words(settings):
+    """ Remove common words. Place it after the case normalizer.
+        Defaults to the english stop words that ship with zope.index.
+    """
+    remover = StopWordRemover()
+    words = settings.get('arche.search.stop_words', '').split()
+    if words:
+        remover.dict = dict.fromkeys(words)
+    return remover
+
+
+lexicon_elements = {
+    'splitter': lambda settings: Splitter(),
+    'case_normalizer': lambda settings: CaseNormalizer(),
+    'accent_folding': lambda settings: AccentFolder(),
+    'stop_words': _stop_words,
+    'stemmer': lambda settings: Stemmer(settings.get('arche.search.language', 'english')),
+}
+
+
+def get_lexicon_names(settings):
+    names = settings.get('arche.search.lexicon', '')
+    if not names:
+        names = 'splitter case_normalizer'
+    return names.split()
+
+
+def create_lexicon(settings):
+    resolver = DottedNameResolver()
+    pipeline = []
+    for name in get_lexicon_names(settings):
+        try:
+            factory = lexicon_elements[name]
+        except KeyError:
+            factory = resolver.maybe_resolve(name)
+        pipeline.append(factory(settings))
+    return Lexicon(*pipeline)
+
+
+def get_boosts(settings):
+    """ Parse 'arche.search.boost', like 'title:3 description:2', into a dict.
+    """
+    boosts = {}
+    for item in settings.get('arche.search.boost', '').split():
+        try:
+            name, boost = item.split(':')
+            boost = int(boost)
+        except ValueError:
+            boost = 0
+        if boost < 1:
+            raise CatalogConfigError("'arche.search.boost' must be field names and whole numbers "
+                                     "from 1 and up, like 'title:3 description:2'. Got %r" % item)
+        boosts[name] = boost
+    return boosts
+
+
+def text_fingerprint(settings):
+    """ A string that changes whenever the settings that affect the text indexes change.
+    """
+    names = get_lexicon_names(settings)
+    items = [('lexicon', tuple(names))]
+    if 'stop_words' in names:
+        items.append(('stop_words', sorted(settings.get('arche.search.stop_words', '').split())))
+    if 'stemmer' in names:
+        items.append(('language', settings.get('arche.search.language', 'english')))
+    return repr(items)
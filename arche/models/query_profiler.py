@@ -0,0 +1,198 @@
+""" A cache for parsed query strings and an opt-in profiler for catalog queries.
+
+    The catalog is a persistent repoze.catalog Catalog, so both work by wrapping
+    Catalog.query and Catalog.search. The wrappers are only installed when either
+    of them is enabled, or when requests are instrumented by arche.tweens.instrumentation.
+"""
+from __future__ import unicode_literals
+
+from collections import deque
+from json import dumps
+from logging import getLogger
+from operator import itemgetter
+from threading import Lock
+from time import time
+
+from pyramid.threadlocal import get_current_registry
+from repoze.catalog.catalog import Catalog
+from repoze.catalog.query import parse_query
+from repoze.lru import LRUCache
+from six import get_unbound_function
+from six import string_types
+
+from arche import logger
+from arche.utils import timed_phase
+
+
+#Slow queries are logged here as json, if a handler is configured
+profile_logger = getLogger('arche.catalog_profiler')
+
+_catalog_query = Catalog.query
+_catalog_search = Catalog.search
+
+
+class CatalogProfiler(object):
+    """ Collects time spent and result sizes per index, and keeps the slowest
+        queries as samples. Shared by all threads.
+    """
+
+    def __init__(self, slow = 0.1, samples = 100):
+        self.slow = slow
+        self.samples = samples
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.queries = 0
+            self.time = 0.0
+            self.indexes = {}
+            self.slow_queries = deque(maxlen = self.samples)
+
+    def record(self, query, elapsed, timings, total):
+        """ Record one query. timings is a list of (index name, seconds, result size). """
+        sample = None
+        with self._lock:
+            self.queries += 1
+            self.time += elapsed
+            for (name, index_time, size) in timings:
+                stats = self.indexes.setdefault(name, [0, 0.0, 0])
+                stats[0] += 1
+                stats[1] += index_time
+                stats[2] += size
+            if elapsed >= self.slow:
+                sample = {'query': query, 'time': elapsed, 'total': total,
+                          'indexes': timings, 'timestamp': time()}
+                self.slow_queries.append(sample)
+        if sample is not None:
+            profile_logger.info(dumps(sample))
+
+    def index_stats(self):
+        """ Returns a list of dicts with stats per index, where most time was spent first. """
+        with self._lock:
+            items = list(self.indexes.items())
+        results = []
+        for (name, (calls, index_time, size)) in items:
+            results.append({'name': name, 'calls': calls, 'time': index_time,
+                            'average_size': size // calls})
+        return sorted(results, key = itemgetter('time'), reverse = True)
+
+    def slowest(self, limit = 10):
+        with self._lock:
+            samples = list(self.slow_queries)
+        return sorted(samples, key = itemgetter('time'), reverse = True)[:limit]
+
+
+class _TimedIndex(object):
+    """ Times the apply methods of an index. """
+
+    def __init__(self, index, name, timings):
+        self._index = index
+        self._name = name
+        self._timings = timings
+
+    def __getattr__(self, name):
+        attr = getattr(self._index, name)
+        if not name.startswith('apply'):
+            return attr
+        def _timed(*args, **kw):
+            start = time()
+            result = attr(*args, **kw)
+            self._timings.append((self._name, time() - start, len(result)))
+            return result
+        return _timed
+
+
+class _TimedCatalog(object):
+    """ Passed to the query instead of the catalog, so each index lookup is timed. """
+
+    def __init__(self, catalog, timings):
+        self._catalog = catalog
+        self._timings = timings
+
+    def __getitem__(self, name):
+        return _TimedIndex(self._catalog[name], name, self._timings)
+
+    def __getattr__(self, name):
+        return getattr(self._catalog, name)
+
+
+def query_repr(query):
+    """ A readable one line version of a query object. """
+    children = list(query.iter_children())
+    if not children:
+        return str(query)
+    return "%s(%s)" % (type(query).__name__, ", ".join(query_repr(x) for x in children))
+
+
+def parse_query_cached(expr, registry = None):
+    """ Parse a query string, or fetch the query object from the cache.
+        The cached object is shared: parse_query has already optimized it, querying
+        doesn't change it and combining it with & or | creates new query objects.
+    """
+    if registry is None:
+        registry = get_current_registry()
+    cache = getattr(registry, 'catalog_query_cache', None)
+    if cache is None:
+        return parse_query(expr)
+    query = cache.get(expr)
+    if query is None:
+        query = parse_query(expr)
+        cache.put(expr, query)
+    return query
+
+
+def profiled_query(self, queryobject, sort_index = None, limit = None, sort_type = None,
+                   reverse = False, names = None):
+    registry = get_current_registry()
+    expr = None
+    if isinstance(queryobject, string_types):
+        expr = queryobject
+        queryobject = parse_query_cached(expr, registry)
+    profiler = getattr(registry, 'catalog_profiler', None)
+    with timed_phase('catalog'):
+        if profiler is None:
+            return _catalog_query(self, queryobject, sort_index = sort_index, limit = limit,
+                                  sort_type = sort_type, reverse = reverse, names = names)
+        timings = []
+        start = time()
+        results = queryobject._apply(_TimedCatalog(self, timings), names)
+        sort_start = time()
+        res = self.sort_result(results, sort_index, limit, sort_type, reverse)
+        if sort_index:
+            timings.append(('sort:%s' % sort_index, time() - sort_start, int(res[0])))
+        profiler.record(expr or query_repr(queryobject), time() - start, timings, res[0].total)
+        return res
+
+
+def profiled_search(self, **query):
+    profiler = getattr(get_current_registry(), 'catalog_profiler', None)
+    with timed_phase('catalog'):
+        if profiler is None:
+            return _catalog_search(self, **query)
+        start = time()
+        res = _catalog_search(self, **query)
+        profiler.record("search(%s)" % ", ".join("%s=%r" % x for x in sorted(query.items())),
+                        time() - start, [], res[0].total)
+        return res
+
+
+def install_query_wrappers():
+    if get_unbound_function(Catalog.query) is not profiled_query:
+        Catalog.query = profiled_query
+        Catalog.search = profiled_search
+        logger.debug("Catalog.query and Catalog.search wrapped for caching/profiling")
+
+
+def includeme(config):
+    settings = config.registry.settings
+    cache_size = int(settings.get('arche.catalog_query_cache', 0))
+    config.registry.catalog_query_cache = None
+    config.registry.catalog_profiler = None
+    if cache_size > 0:
+        config.registry.catalog_query_cache = LRUCache(cache_size)
+    if settings.get('arche.catalog_profiler', False):
+        slow = int(settings.get('arche.catalog_profiler.slow', 100)) / 1000.0
+        config.registry.catalog_profiler = CatalogProfiler(slow = slow)
+    if cache_size > 0 or config.registry.catalog_profiler is not None:
+        install_query_wrappers()
@@ -0,0 +1,422 @@
+from __future__ import unicode_literals
+
+from multiprocessing import Process
+from time import time
+from zlib import crc32
+
+import transaction
+from BTrees.IOBTree import IOBTree
+from ZODB.POSException import ConflictError
+from persistent import Persistent
+from pyramid.threadlocal import get_current_registry
+from pyramid.traversal import find_resource
+from pyramid.traversal import resource_path
+from repoze.catalog.query import Any
+
+from arche import logger
+from arche.interfaces import ICataloger
+
+
+class ReindexCheckpoint(Persistent):
+    """ Keeps track of how far one reindex worker has come.
+        Each worker has its own checkpoint object so they never write to the same object.
+    """
+    worker = 0
+    workers = 1
+    indexes = None
+    last_docid = None
+    processed = 0
+    total = 0
+    done = False
+    # Used when looking for objects missing from the catalog
+    find_missing = False
+    last_path = None
+    walked = 0
+    added = 0
+    missing_done = False
+
+    def __init__(self, worker = 0, workers = 1, indexes = None, find_missing = False):
+        super(ReindexCheckpoint, self).__init__()
+        self.worker = worker
+        self.workers = workers
+        if indexes is not None:
+            indexes = tuple(indexes)
+        self.indexes = indexes
+        self.find_missing = find_missing
+
+    def __repr__(self): #pragma: no coverage
+        klass = self.__class__
+        classname = '%s.%s' % (klass.__module__, klass.__name__)
+        return '<%s worker %s/%s at docid %r (%s/%s)>' % (classname, self.worker, self.workers,
+                                                          self.last_docid, self.processed, self.total)
+
+
+def get_checkpoints(root):
+    """ Return an IOBTree with worker number as key and checkpoints as values, or None. """
+    return getattr(root, '__reindex_checkpoints__', None)
+
+
+def create_checkpoints(root, indexes = None, workers = 1, find_missing = False):
+    """ Start a new reindex. Any previous checkpoints will be removed.
+        If find_missing is set, workers will look for objects that aren't in the
+        catalog after the reindex. See MissingObjectsIndexer.
+    """
+    assert workers > 0, "workers must be a positive integer"
+    checkpoints = root.__reindex_checkpoints__ = IOBTree()
+    for i in range(workers):
+        checkpoints[i] = ReindexCheckpoint(worker = i, workers = workers, indexes = indexes,
+                                           find_missing = find_missing)
+    return checkpoints
+
+
+def clear_checkpoints(root):
+    if hasattr(root, '__reindex_checkpoints__'):
+        delattr(root, '__reindex_checkpoints__')
+
+
+def _report_progress(reindexer, rate, eta):
+    cp = reindexer.checkpoint
+    logger.info("Reindex worker %s: %s/%s objects, %.1f objects/s, ETA %s",
+                cp.worker, cp.processed, cp.total, rate, format_eta(eta))
+
+
+def _report_missing_progress(indexer, rate, eta):
+    cp = indexer.checkpoint
+    logger.info("Reindex worker %s: %s objects checked, %s added to the catalog, %.1f objects/s",
+                cp.worker, cp.walked, cp.added, rate)
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "unknown"
+    seconds = int(seconds)
+    return "%d:%02d:%02d" % (seconds // 3600, (seconds % 3600) // 60, seconds % 60)
+
+
+class CatalogReindexer(object):
+    """ Reindex everything already present in the catalog, in committed chunks.
+
+        Work is based on docids in ascending order. After each chunk, the checkpoint
+        is updated and the transaction committed, so an interrupted run can be
+        resumed from the last committed chunk. Several workers can split the docids
+        between them by using different checkpoints (docid modulo number of workers).
+
+        checkpoint
+            A ReindexCheckpoint. See create_checkpoints.
+
+        chunk_size
+            Objects to process per transaction.
+
+        commit
+            Commit after each chunk. If False, only savepoints will be used (dry-run).
+
+        retries
+            How many times a chunk will be retried on ConflictError.
+    """
+    callback = staticmethod(_report_progress)
+
+    def __init__(self, root, checkpoint, registry = None, chunk_size = 500,
+                 commit = True, retries = 5, callback = None):
+        if registry is None:
+            registry = get_current_registry()
+        self.root = root
+        self.registry = registry
+        self.checkpoint = checkpoint
+        self.chunk_size = chunk_size
+        self.commit = commit
+        self.retries = retries
+        if callback is not None:
+            self.callback = callback
+
+    @property
+    def indexes(self):
+        """ Indexes that will be updated. None means all. """
+        indexes = self.checkpoint.indexes
+        if indexes is None:
+            return
+        required = self.registry.catalog_indexhelper.get_required(indexes)
+        if required is None:
+            return
+        return list(required)
+
+    def get_docids(self):
+        """ Return a list of docids that this worker still needs to process. """
+        docid_to_address = self.root.document_map.docid_to_address
+        cp = self.checkpoint
+        if cp.last_docid is None:
+            docids = docid_to_address.keys()
+        else:
+            docids = docid_to_address.keys(min = cp.last_docid, excludemin = True)
+        limit_types = None
+        if cp.indexes is not None:
+            limit_types = self.registry.catalog_indexhelper.get_limit_types(cp.indexes)
+        if limit_types:
+            query = Any('type_name', list(limit_types))
+            allowed = self.root.catalog.query(query)[1]
+            docids = [x for x in docids if x in allowed]
+        return [x for x in docids if x % cp.workers == cp.worker]
+
+    def index_docid(self, docid, indexes):
+        document_map = self.root.document_map
+        path = document_map.address_for_docid(docid)
+        if path is None:
+            return
+        try:
+            obj = find_resource(self.root, path)
+        except KeyError:
+            logger.warn("Docid %s points to %r which doesn't exist. Removing it from catalog.", docid, path)
+            self.root.catalog.unindex_doc(docid)
+            document_map.remove_docid(docid)
+            return
+        cataloger = self.registry.queryAdapter(obj, ICataloger)
+        if cataloger is not None:
+            cataloger.index_object(indexes = indexes)
+
+    def process_chunk(self, docids):
+        """ Index docids and store progress. Retry on conflicts if commit is enabled. """
+        indexes = self.indexes
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                for docid in docids:
+                    self.index_docid(docid, indexes)
+                cp = self.checkpoint
+                cp.last_docid = docids[-1]
+                cp.processed += len(docids)
+                if self.commit:
+                    transaction.commit()
+                else:
+                    transaction.savepoint()
+                return
+            except ConflictError:
+                if not self.commit or attempt >= self.retries:
+                    raise
+                logger.info("Conflict while reindexing chunk, retrying (attempt %s)", attempt)
+                transaction.abort()
+
+    def run(self):
+        """ Run until all docids for this worker have been processed. """
+        docids = self.get_docids()
+        cp = self.checkpoint
+        cp.total = cp.processed + len(docids)
+        if cp.done and not docids:
+            return
+        cp.done = False
+        started = time()
+        done_this_run = 0
+        for i in range(0, len(docids), self.chunk_size):
+            chunk = docids[i:i + self.chunk_size]
+            self.process_chunk(chunk)
+            done_this_run += len(chunk)
+            self._cache_gc()
+            elapsed = time() - started
+            rate = elapsed and done_this_run / elapsed or 0.0
+            remaining = cp.total - cp.processed
+            eta = rate and remaining / rate or None
+            self.callback(self, rate, eta)
+        cp.done = True
+        if self.commit:
+            transaction.commit()
+
+    def _cache_gc(self):
+        jar = getattr(self.root, '_p_jar', None)
+        if jar is not None:
+            jar.cacheGC()
+
+
+def walk_tree(root, after = None):
+    """ Generator with (names, obj) for root and everything within it, depth first
+        and in the order of each folder. names is a tuple of the path names from root.
+
+        after
+            A tuple of names. Everything up to and including that object is skipped,
+            so a walk can be resumed. If an object on that path has been removed,
+            its folder is walked from the start again.
+    """
+    if not after:
+        yield (), root
+    for item in _walk_children(root, (), after or None):
+        yield item
+
+
+def _walk_children(context, names, after):
+    try:
+        keys = context.keys()
+    except AttributeError:
+        return
+    if after and after[0] not in context:
+        after = None
+    for name in keys:
+        if after:
+            if name != after[0]:
+                continue
+            # Everything before this has been walked, and maybe some of its contents too
+            child_names = names + (name,)
+            for item in _walk_children(context[name], child_names, after[1:] or None):
+                yield item
+            after = None
+            continue
+        child = context[name]
+        child_names = names + (name,)
+        yield child_names, child
+        for item in _walk_children(child, child_names, None):
+            yield item
+
+
+class MissingObjectsIndexer(object):
+    """ Walk the resource tree and index anything that isn't in the catalog yet.
+        Objects that already exist in the catalog won't be touched. After creating
+        a new catalog, this is what indexes everything.
+
+        Like CatalogReindexer, the path of the last object checked is stored in the
+        checkpoint and the transaction committed every chunk_size objects, so an
+        interrupted walk can be resumed. With several workers, each of them walks
+        the tree but only indexes the paths that belong to it.
+    """
+    callback = staticmethod(_report_missing_progress)
+
+    def __init__(self, root, checkpoint, registry = None, chunk_size = 500,
+                 commit = True, retries = 5, callback = None):
+        if registry is None:
+            registry = get_current_registry()
+        self.root = root
+        self.registry = registry
+        self.checkpoint = checkpoint
+        self.chunk_size = chunk_size
+        self.commit = commit
+        self.retries = retries
+        if callback is not None:
+            self.callback = callback
+
+    def is_mine(self, path):
+        cp = self.checkpoint
+        if cp.workers == 1:
+            return True
+        return (crc32(path.encode('utf-8')) & 0xffffffff) % cp.workers == cp.worker
+
+    def index_missing(self, obj):
+        """ Index obj if it isn't in the catalog and belongs to this worker.
+            Returns True if it was added.
+        """
+        path = resource_path(obj)
+        if path in self.root.document_map.address_to_docid or not self.is_mine(path):
+            return False
+        cataloger = self.registry.queryAdapter(obj, ICataloger)
+        if cataloger is None:
+            return False
+        cataloger.index_object()
+        return True
+
+    def save(self, names):
+        cp = self.checkpoint
+        cp.last_path = names
+        if self.commit:
+            transaction.commit()
+        else:
+            transaction.savepoint()
+
+    def walk(self, started, walked):
+        """ Walk from the checkpoint until the end. Returns the number of objects walked. """
+        cp = self.checkpoint
+        names = cp.last_path
+        pending = 0
+        for (names, obj) in walk_tree(self.root, after = cp.last_path):
+            if self.index_missing(obj):
+                cp.added += 1
+            cp.walked += 1
+            pending += 1
+            if pending >= self.chunk_size:
+                self.save(names)
+                walked += pending
+                pending = 0
+                self._cache_gc()
+                elapsed = time() - started
+                self.callback(self, elapsed and walked / elapsed or 0.0, None)
+        if pending:
+            self.save(names)
+        return walked + pending
+
+    def run(self):
+        """ Run until the whole tree has been walked. Conflicts restart the walk
+            from the last committed checkpoint.
+        """
+        cp = self.checkpoint
+        if cp.missing_done:
+            return
+        started = time()
+        walked = 0
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                walked = self.walk(started, walked)
+                break
+            except ConflictError:
+                if not self.commit or attempt >= self.retries:
+                    raise
+                logger.info("Conflict while looking for missing objects, retrying (attempt %s)", attempt)
+                transaction.abort()
+        cp.missing_done = True
+        if self.commit:
+            transaction.commit()
+
+    def _cache_gc(self):
+        jar = getattr(self.root, '_p_jar', None)
+        if jar is not None:
+            jar.cacheGC()
+
+
+def index_missing_objects(root, registry = None, chunk_size = 500, commit = True):
+    """ Index anything that isn't in the catalog yet, without keeping a checkpoint on root.
+        Returns the number of objects added. See MissingObjectsIndexer.
+    """
+    checkpoint = ReindexCheckpoint()
+    MissingObjectsIndexer(root, checkpoint, registry = registry, chunk_size = chunk_size,
+                          commit = commit).run()
+    return checkpoint.added
+
+
+def run_checkpoint(root, checkpoint, registry = None, chunk_size = 500, commit = True):
+    """ Do all work for one checkpoint: reindex cataloged objects and,
+        if the checkpoint says so, look for objects missing from the catalog.
+    """
+    CatalogReindexer(root, checkpoint, registry = registry, chunk_size = chunk_size, commit = commit).run()
+    if checkpoint.find_missing:
+        MissingObjectsIndexer(root, checkpoint, registry = registry, chunk_size = chunk_size,
+                              commit = commit).run()
+
+
+def _reindex_worker(config_uri, worker, chunk_size):
+    """ Entry point for a worker process. Opens its own connection to the database. """
+    from pyramid.paster import bootstrap
+    env = bootstrap(config_uri)
+    try:
+        checkpoint = get_checkpoints(env['root'])[worker]
+        run_checkpoint(env['root'], checkpoint, registry = env['registry'], chunk_size = chunk_size)
+    except Exception:
+        transaction.abort()
+        logger.exception("Reindex worker %s failed", worker)
+        raise
+    finally:
+        env['closer']()
+
+
+def run_reindex_workers(config_uri, workers, chunk_size = 500):
+    """ Start one process per checkpoint and wait for them to finish.
+        Note that the storage must allow several processes to connect to it at
+        the same time, for instance ZEO. Checkpoints must be committed before this is called.
+
+        Returns a list of worker numbers that failed.
+    """
+    procs = []
+    for i in range(workers):
+        proc = Process(target = _reindex_worker, args = (config_uri, i, chunk_size))
+        proc.start()
+        procs.append(proc)
+    failed = []
+    for (i, proc) in enumerate(procs):
+        proc.join()
+        if proc.exitcode != 0:
+            failed.append(i)
+    return failed
@@ -58,6 +58,12 @@ class Role(UserString):
         self.required = set(required)
 
 
+def _clear_principals_cache():
+    #Import here to avoid circular imports
+    from arche.security import clear_principals_cache
+    clear_principals_cache()
+
+
 @adapter(ILocalRoles)
 @implementer(IRoles)
 class Roles(IterableUserDict):
@@ -73,6 +79,7 @@ class Roles(IterableUserDict):
             self.data = self.context.__local_roles__
 
     def __setitem__(self, key, value):
+        _clear_principals_cache()
         if value:
             value = self._adjust_to_set(value)
             self._check_roles(value)
@@ -91,6 +98,7 @@ class Roles(IterableUserDict):
             del self[key]
 
     def __delitem__(self, key):
+        _clear_principals_cache()
         self._maybe_log(key, (), self.data[key])
         del self.data[key]
 
@@ -32,7 +32,7 @@ class ACLEntryTests(TestCase):
         obj.add('role:Admin', ('One', 'Three'))
         obj.add('role:Admin', 'Two')
         obj.add('role:Other', 'One')
-        self.assertEqual(obj()[:-1], [('Allow', 'role:Admin', set(['Two', 'Three', 'One'])), ('Allow', 'role:Other', set(['One']))])
+        self.assertEqual(obj()[:-1], (('Allow', 'role:Admin', set(['Two', 'Three', 'One'])), ('Allow', 'role:Other', set(['One']))))
 
     def test_remove(self):
         obj = self._cut()
@@ -41,7 +41,7 @@ class ACLEntryTests(TestCase):
         obj.add('role:Other', 'One')
         obj.remove('role:Admin', 'Two')
         obj.remove('role:Other', 'One')
-        self.assertEqual(obj()[:-1], [('Allow', 'role:Admin', set(['Three', 'One'])), ('Allow', 'role:Other', set([]))])
+        self.assertEqual(obj()[:-1], (('Allow', 'role:Admin', set(['Three', 'One'])), ('Allow', 'role:Other', set([]))))
 
     def test_remove_all_perms_object(self):
         obj = self._cut()
@@ -50,6 +50,24 @@ class ACLEntryTests(TestCase):
         obj.remove('role:Admin', ALL_PERMISSIONS)
         self.assertEqual(len(obj()), 1)
 
+    def test_compiled_once(self):
+        obj = self._cut()
+        obj.add('role:Admin', 'One')
+        self.assertIs(obj(), obj())
+        before = obj()
+        obj.add('role:Admin', 'Two')
+        self.assertIsNot(obj(), before)
+        self.assertEqual(obj()[0], ('Allow', 'role:Admin', set(['One', 'Two'])))
+        self.assertIsInstance(obj()[0][2], frozenset)
+
+    def test_permissions_immutable(self):
+        obj = self._cut()
+        obj.add('role:Admin', 'One')
+        self.assertRaises(AttributeError, getattr, obj['role:Admin'], 'add')
+        obj['role:Other'] = ['One', 'Two']
+        self.assertEqual(obj['role:Other'], frozenset(['One', 'Two']))
+        self.assertEqual(obj()[1], ('Allow', 'role:Other', set(['One', 'Two'])))
+
 
 
 class ACLRegistryTests(TestCase):
@@ -99,9 +117,23 @@ class ACLRegistryTests(TestCase):
         except TypeError:
             pass
 
+    def test_get_wf_acl(self):
+        obj = self._cut()
+        one = self._acl()
+        one.add('role:Hello', 'world')
+        obj['wf:one'] = one
+        obj['wf:linked'] = 'wf:one'
+        self.assertEqual(obj.get_wf_acl('wf', 'one'), one())
+        self.assertEqual(obj.get_wf_acl('wf', 'linked'), one())
+        self.assertEqual(obj.get_wf_acl('wf', 'other'), None)
+        obj['wf:other'] = 'wf:one'
+        self.assertEqual(obj.get_wf_acl('wf', 'other'), one())
+        del obj['wf:other']
+        self.assertEqual(obj.get_wf_acl('wf', 'other'), None)
+
     def test_get_acl(self):
         obj = self._cut()
         one = self._acl()
         one.add('role:Hello', 'world')
         obj['one'] = one
-        self.assertEqual(obj.get_acl('one'), [('Allow', 'role:Hello', set(['world'])), DENY_ALL,])
+        self.assertEqual(obj.get_acl('one'), (('Allow', 'role:Hello', set(['world'])), DENY_ALL,))
@@ -0,0 +1,112 @@
+from __future__ import unicode_literals
+
+from io import BytesIO
+from unittest import TestCase
+
+from pyramid import testing
+
+from arche.interfaces import IBlobs
+
+
+def _formdata(data):
+    return {'fp': BytesIO(data), 'filename': 'hello.txt', 'mimetype': 'text/plain'}
+
+
+class BlobStoreTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.models.blob')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def _fixture(self):
+        from arche.testing import barebone_fixture
+        return barebone_fixture(self.config)
+
+    def _mk_file(self, data = b'Hello world!'):
+        from arche.resources import File
+        return File(file_data = _formdata(data))
+
+    def _blobfile(self, context):
+        return IBlobs(context)['file']
+
+    def test_sha256_on_upload(self):
+        from hashlib import sha256
+        obj = self._mk_file()
+        self.assertEqual(self._blobfile(obj).sha256, sha256(b'Hello world!').hexdigest())
+
+    def test_identical_content_shared(self):
+        root = self._fixture()
+        root['a'] = self._mk_file()
+        root['b'] = self._mk_file()
+        root['c'] = self._mk_file(b'Other')
+        self.assertIs(self._blobfile(root['a']).blob, self._blobfile(root['b']).blob)
+        self.assertIsNot(self._blobfile(root['a']).blob, self._blobfile(root['c']).blob)
+        store = root.__blob_store__
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.data[self._blobfile(root['a']).sha256].refcount, 2)
+
+    def test_upload_to_attached(self):
+        root = self._fixture()
+        root['a'] = self._mk_file()
+        root['b'] = self._mk_file(b'Other')
+        root['b'].file_data = _formdata(b'Hello world!')
+        self.assertIs(self._blobfile(root['a']).blob, self._blobfile(root['b']).blob)
+        self.assertEqual(len(root.__blob_store__), 1)
+
+    def test_remove_releases(self):
+        root = self._fixture()
+        root['a'] = self._mk_file()
+        root['b'] = self._mk_file()
+        content_hash = self._blobfile(root['a']).sha256
+        del root['a']
+        self.assertEqual(root.__blob_store__.data[content_hash].refcount, 1)
+        del root['b']
+        self.assertNotIn(content_hash, root.__blob_store__)
+
+    def test_delete_blob_releases(self):
+        root = self._fixture()
+        root['a'] = self._mk_file()
+        del IBlobs(root['a'])['file']
+        self.assertEqual(len(root.__blob_store__), 0)
+
+    def test_copy_shares_blob(self):
+        from arche.utils import copy_recursive
+        self.config.include('arche.utils')
+        root = self._fixture()
+        root['a'] = self._mk_file()
+        root['b'] = copy_recursive(root['a'])
+        self.assertIsNot(self._blobfile(root['a']), self._blobfile(root['b']))
+        self.assertIs(self._blobfile(root['a']).blob, self._blobfile(root['b']).blob)
+        self.assertEqual(root.__blob_store__.data[self._blobfile(root['a']).sha256].refcount, 2)
+        with self._blobfile(root['b']).blob.open() as f:
+            self.assertEqual(f.read(), b'Hello world!')
+
+    def test_copy_without_hash_not_shared(self):
+        from arche.utils import copy_recursive
+        self.config.include('arche.utils')
+        root = self._fixture()
+        root['a'] = self._mk_file()
+        self._blobfile(root['a']).sha256 = None
+        root['b'] = copy_recursive(root['a'])
+        self.assertIsNot(self._blobfile(root['a']).blob, self._blobfile(root['b']).blob)
+
+    def test_create_overwrite_releases(self):
+        root = self._fixture()
+        root['a'] = self._mk_file()
+        root['b'] = self._mk_file()
+        content_hash = self._blobfile(root['a']).sha256
+        IBlobs(root['a']).create('file', overwrite = True)
+        self.assertEqual(root.__blob_store__.data[content_hash].refcount, 1)
+
+    def test_added_container_walked(self):
+        from arche.resources import Document
+        root = self._fixture()
+        doc = Document()
+        doc['f'] = self._mk_file()
+        self.assertEqual(len(root.__blob_store__), 0)
+        root['d'] = doc
+        self.assertEqual(len(root.__blob_store__), 1)
@@ -2,10 +2,13 @@
 from __future__ import unicode_literals
 from unittest import TestCase
 
+import transaction
 from pyramid import testing
 from pyramid.request import apply_request_extensions
 from repoze.catalog.indexes.field import CatalogFieldIndex
+from repoze.catalog.query import Any
 from repoze.catalog.query import Contains
+from repoze.catalog.query import Eq
 from zope.component import adapter
 from zope.interface import implementer
 from zope.interface.exceptions import BrokenMethodImplementation
@@ -167,6 +170,50 @@ class CatalogIntegrationTests(TestCase):
         self.assertEqual(cq(Contains("searchable_text", '您好'))[0], 1)
         self.assertEqual(cq(Contains("searchable_text", 'stuff'))[0], 0)
 
+    def test_body_text_parsed_when_body_changes(self):
+        from arche.models import catalog
+        calls = []
+        def _prep(html):
+            calls.append(html)
+            return html
+        root = self._fixture()
+        root['a'] = context = self._mk_context()
+        context.body = '<p>One</p>'
+        self.addCleanup(setattr, catalog, 'prep_html_for_search_indexing', catalog.prep_html_for_search_indexing)
+        catalog.prep_html_for_search_indexing = _prep
+        obj = self._cut(context)
+        obj.index_object()
+        obj.index_object()
+        self.assertEqual(calls, ['<p>One</p>'])
+        context.body = '<p>Two</p>'
+        obj.index_object()
+        self.assertEqual(calls, ['<p>One</p>', '<p>Two</p>'])
+
+    def test_searchable_text_linked_to_searchable_fields(self):
+        helper = self.config.registry.catalog_indexhelper
+        self.assertIn('searchable_text', helper.get_required(['body']))
+        self.assertIn('searchable_text', helper.get_required(['title']))
+        self.assertNotIn('searchable_text', helper.get_required(['wf_state']))
+        self.assertNotIn('searchable_text', helper.get_required(['local_roles']))
+
+    def test_discriminator_without_linked_reindexes_always(self):
+        def _dummy(context, default):
+            return 'Dummy'
+        self.config.add_searchable_text_discriminator(_dummy)
+        self.config.add_searchable_text_index('type_name')
+        helper = self.config.registry.catalog_indexhelper
+        self.assertIn('searchable_text', helper.get_required(['wf_state']))
+        root = self._fixture()
+        root['a'] = context = self._mk_context()
+        context.title = 'Hello'
+        self._cut(context).index_object()
+        self.assertEqual(root.catalog.query(Contains('searchable_text', 'hello'))[0], 1)
+
+    def test_body_text_empty(self):
+        from arche.models.catalog import get_body_text
+        context = self._mk_context()
+        self.assertEqual(get_body_text(context, ''), '')
+
     def test_wf_state_index(self):
         root = self._fixture()
         root['a'] = context = _wf_fixture(self.config)
@@ -199,6 +246,18 @@ class CatalogIntegrationTests(TestCase):
         res = obj.catalog.query("wf_state == 'public'")
         self.assertEqual(res[0], 1)
 
+    def test_workflow_subscriber_skips_searchable_text(self):
+        from arche.models.workflow import get_context_wf
+        root = self._fixture()
+        root['a'] = context = _wf_fixture(self.config)
+        context.title = 'hello'
+        obj = self._cut(context)
+        obj.index_object()
+        context.title = 'changed without event'
+        get_context_wf(context).do_transition('private:public', testing.DummyRequest())
+        self.assertEqual(obj.catalog.query("wf_state == 'public'")[0], 1)
+        self.assertEqual(obj.catalog.query(Contains('searchable_text', 'hello'))[0], 1)
+
     def test_subscribers(self):
         root = self._fixture()
         root['a'] = context = self._mk_context()
@@ -223,6 +282,99 @@ class CatalogIntegrationTests(TestCase):
         self.assertEqual(res[0], 1)
 
 
+class IndexQueueTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp(settings = {'arche.catalog_queue': True})
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+
+    def tearDown(self):
+        transaction.abort()
+        testing.tearDown()
+
+    def _fixture(self):
+        from arche.resources import Root
+        return Root()
+
+    def _mk_context(self):
+        from arche.resources import Base
+        @implementer(IIndexedContent)
+        class _DummyIndexedContent(Base):
+            title = u"hello"
+            description = u"world"
+            type_name = 'Dummy'
+        return _DummyIndexedContent()
+
+    def test_deferred_until_commit(self):
+        root = self._fixture()
+        root['a'] = self._mk_context()
+        self.assertEqual(root.catalog.query("title == 'hello'")[0], 0)
+        transaction.commit()
+        self.assertEqual(root.catalog.query("title == 'hello'")[0], 1)
+
+    def test_flush_index_queue(self):
+        from arche.models.catalog import flush_index_queue
+        root = self._fixture()
+        root['a'] = self._mk_context()
+        flush_index_queue()
+        self.assertEqual(root.catalog.query("title == 'hello'")[0], 1)
+
+    def test_abort_discards(self):
+        root = self._fixture()
+        root['a'] = self._mk_context()
+        transaction.abort()
+        transaction.commit()
+        self.assertEqual(root.catalog.query("title == 'hello'")[0], 0)
+
+    def test_coalesces_changed_indexes(self):
+        from arche.models.catalog import get_index_queue
+        root = self._fixture()
+        root['a'] = context = self._mk_context()
+        transaction.commit()
+        context.update(title = 'one')
+        context.update(description = 'two')
+        queue = get_index_queue()
+        self.assertEqual(len(queue), 1)
+        entry = tuple(queue.pending.values())[0]
+        self.assertTrue(set(['title', 'description']).issubset(entry['indexes']))
+        transaction.commit()
+        self.assertEqual(root.catalog.query("title == 'one'")[0], 1)
+        self.assertEqual(root.catalog.query("description == 'two'")[0], 1)
+
+    def test_unindex_wins(self):
+        root = self._fixture()
+        root['a'] = self._mk_context()
+        del root['a']
+        transaction.commit()
+        self.assertEqual(root.catalog.query("title == 'hello'")[0], 0)
+        self.assertNotIn('/a', root.document_map.address_to_docid)
+
+    def test_index_after_unindex_replaces(self):
+        root = self._fixture()
+        root['a'] = self._mk_context()
+        transaction.commit()
+        del root['a']
+        other = self._mk_context()
+        other.title = 'other'
+        root['a'] = other
+        transaction.commit()
+        self.assertEqual(root.catalog.query("title == 'hello'")[0], 0)
+        self.assertEqual(root.catalog.query("title == 'other'")[0], 1)
+
+    def test_moved_object(self):
+        from arche.resources import Document
+        root = self._fixture()
+        root['f'] = Document()
+        root['a'] = context = self._mk_context()
+        transaction.commit()
+        del root['a']
+        root['f']['a'] = context
+        transaction.commit()
+        self.assertNotIn('/a', root.document_map.address_to_docid)
+        self.assertIn('/f/a', root.document_map.address_to_docid)
+
+
 class MetadataTests(TestCase):
      
     def setUp(self):
@@ -325,6 +477,44 @@ class MetadataTests(TestCase):
             result = dict(v)
         self.assertEqual(result, {'dummy': 'Hello world'})
 
+    def test_linked_metadata_only_updated_when_linked_changes(self):
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        self.config.create_metadata_field('title', 'dummy', linked = 'title')
+        from arche.api import Root
+        root = Root(title = 'Hello')
+        cataloger = ICataloger(root)
+        cataloger.index_object()
+        docid = root.document_map.docid_for_address('/')
+        root.title = 'World'
+        self.assertEqual(cataloger.get_metadata(indexes = ['description']), {})
+        cataloger.index_object(indexes = ['description'])
+        self.assertEqual(dict(root.document_map.get_metadata(docid)), {'dummy': 'Hello'})
+        cataloger.index_object(indexes = ['title'])
+        self.assertEqual(dict(root.document_map.get_metadata(docid)), {'dummy': 'World'})
+
+    def test_unchanged_metadata_not_written(self):
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        self.config.add_metadata_field(self._dummy_metadata)
+        from arche.api import Root
+        root = Root()
+        cataloger = ICataloger(root)
+        cataloger.index_object()
+        writes = []
+        root.document_map.add_metadata = lambda docid, data: writes.append(data)
+        cataloger.index_object()
+        self.assertEqual(writes, [])
+
+    def test_metadata_factories_cleared_on_add(self):
+        from arche.models.catalog import get_metadata_factories
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        context = self._mk_context()
+        self.assertNotIn('dummy', [x[0] for x in get_metadata_factories(context)])
+        self.config.add_metadata_field(self._dummy_metadata)
+        self.assertIn('dummy', [x[0] for x in get_metadata_factories(context)])
+
 
 class CheckCatalogOnStartupTests(TestCase):
      
@@ -385,6 +575,111 @@ class CheckCatalogOnStartupTests(TestCase):
         self._fut(env = env)
 
 
+class AllowedToViewTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        self.config.include('arche.testing.workflow')
+        self.config.set_content_workflow('Document', 'simple_workflow')
+        request = testing.DummyRequest()
+        apply_request_extensions(request)
+        self.config.begin(request)
+
+    def tearDown(self):
+        transaction.abort()
+        testing.tearDown()
+
+    @property
+    def _fut(self):
+        from arche.models.catalog import get_allowed_to_view
+        return get_allowed_to_view
+
+    def _fixture(self):
+        from arche.resources import Document
+        from arche.resources import Link
+        from arche.testing import barebone_fixture
+        root = barebone_fixture(self.config)
+        root['a'] = Document()
+        root['a']['l'] = Link()
+        return root
+
+    def _indexed(self, root, name):
+        docids = root.catalog.query(Any('allowed_to_view', [name]))[1]
+        paths = set([root.document_map.address_for_docid(x) for x in docids])
+        return paths & set(['/a', '/a/l'])
+
+    def test_private_expands_local_roles(self):
+        root = self._fixture()
+        root['a'].local_roles['jane'] = ['role:Viewer']
+        root['a'].local_roles['group:reviewers'] = ['role:Reviewer']
+        result = self._fut(root['a'], None)
+        self.assertIn('jane', result)
+        self.assertNotIn('group:reviewers', result)
+        self.assertNotIn('system.Everyone', result)
+
+    def test_public(self):
+        root = self._fixture()
+        root['a'].workflow.do_transition('private:public', force=True)
+        self.assertIn('system.Everyone', self._fut(root['a'], None))
+
+    def test_inherited_roles_only(self):
+        root = self._fixture()
+        root.local_roles['bob'] = ['role:Editor']
+        root.local_roles['carl'] = ['role:Owner']
+        root['a'].local_roles['carl'] = ['role:Owner']
+        result = self._fut(root['a'], None)
+        self.assertIn('carl', result)
+        self.assertNotIn('carl', self._fut(root['a']['l'], None))
+        # Inheritable roles at the root stay as role principals
+        self.assertNotIn('bob', result)
+        self.assertIn('role:Editor', result)
+        root['a'].local_roles['bob'] = ['role:Editor']
+        self.assertIn('bob', self._fut(root['a']['l'], None))
+
+    def test_local_roles_change_updates_descendants(self):
+        from arche.models.catalog import get_index_queue
+        root = self._fixture()
+        self.assertEqual(self._indexed(root, 'jane'), set())
+        root['a'].local_roles.add('jane', 'role:Viewer')
+        self.assertEqual(self._indexed(root, 'jane'), set(['/a', '/a/l']))
+        self.assertEqual(len(get_index_queue()), 0)
+
+    def test_descendants_queued(self):
+        from arche.models.catalog import flush_index_queue
+        self.config.registry.settings['arche.catalog_queue'] = True
+        root = self._fixture()
+        flush_index_queue()
+        root['a'].local_roles.add('jane', 'role:Viewer')
+        self.assertEqual(self._indexed(root, 'jane'), set())
+        flush_index_queue()
+        self.assertEqual(self._indexed(root, 'jane'), set(['/a', '/a/l']))
+
+    def test_wf_transition_updates_descendants(self):
+        root = self._fixture()
+        self.assertEqual(self._indexed(root, 'system.Everyone'), set())
+        root['a'].workflow.do_transition('private:public', force=True)
+        self.assertEqual(self._indexed(root, 'system.Everyone'), set(['/a', '/a/l']))
+
+    def test_root_local_roles_not_expanded(self):
+        from arche.models.catalog import get_index_queue
+        root = self._fixture()
+        root.local_roles.add('jane', 'role:Viewer')
+        self.assertEqual(len(get_index_queue()), 0)
+        self.assertEqual(self._indexed(root, 'jane'), set())
+        self.assertEqual(self._indexed(root, 'role:Viewer'), set(['/a', '/a/l']))
+
+    def test_check_catalog_detects_acl_change(self):
+        from arche.models.catalog import check_catalog
+        root = self._fixture()
+        self.assertEqual(check_catalog(root, self.config.registry), ([], set()))
+        self.config.registry.acl['private'].add('role:Viewer', 'perm:View')
+        self.assertEqual(check_catalog(root, self.config.registry), ([], set()))
+        self.config.registry.acl['private'].add('role:Reviewer', 'perm:View')
+        self.assertEqual(check_catalog(root, self.config.registry), (['allowed_to_view'], set()))
+
+
 class CatalogIndexHelperTests(TestCase):
 
     def setUp(self):
@@ -425,23 +720,281 @@ class CatalogIndexHelperTests(TestCase):
         self.assertEqual(obj.get_required(['world']), set(['world']))
         self.assertEqual(obj.get_required(['hello', 'niceness']), set(['hello', 'niceness']))
 
-    # def test_get_required_3_steps(self):
-    #     obj = self._cut()
-    #     obj.update('one', linked='two')
-    #     obj.update('two', linked='three')
-    #     self.assertEqual(obj.get_required(['one']), set(['one']))
-    #     self.assertEqual(obj.get_required(['two']), set(['one', 'two']))
-    #     self.assertEqual(obj.get_required(['three']), set(['one', 'two', 'three']))
-    #
-    # def test_get_required_circular(self):
-    #     obj = self._cut()
-    #     obj.update('one', linked='two')
-    #     obj.update('two', linked='three')
-    #     obj.update('three', linked='one')
-    #     self.assertEqual(obj.get_required(['one']), set(['one', 'two', 'three']))
+    def test_get_required_3_steps(self):
+        obj = self._cut()
+        obj.update('one', linked='two')
+        obj.update('two', linked='three')
+        self.assertEqual(obj.get_required(['one']), set(['one']))
+        self.assertEqual(obj.get_required(['two']), set(['one', 'two']))
+        self.assertEqual(obj.get_required(['three']), set(['one', 'two', 'three']))
+
+    def test_get_required_circular(self):
+        obj = self._cut()
+        obj.update('one', linked='two')
+        obj.update('two', linked='three')
+        obj.update('three', linked='one')
+        for name in ('one', 'two', 'three'):
+            self.assertEqual(obj.get_required([name]), set(['one', 'two', 'three']))
+
+    def test_get_required_recompiles_on_update(self):
+        obj = self._cut()
+        obj.update('one')
+        self.assertEqual(obj.get_required(['two']), set(['two']))
+        obj.update('one', linked='two')
+        self.assertEqual(obj.get_required(['two']), set(['one', 'two']))
+
+    def test_get_required_follows_always(self):
+        obj = self._cut()
+        obj.update('tags', linked=None)
+        obj.update('one', linked='tags')
+        self.assertEqual(obj.get_required(['404']), set(['404', 'tags', 'one']))
 
     def test_setting_none_as_marker_for_always(self):
         obj = self._cut()
         obj.update('hello', linked=None, type_names=None)
         self.assertEqual(obj.get_limit_types(['404']), None)
         self.assertEqual(obj.get_required(['world']), set(['hello', 'world']))
+
+
+class SortedQueryTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    @property
+    def _fut(self):
+        from arche.models.catalog import sorted_query
+        return sorted_query
+
+    def _fixture(self):
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        root['a'] = Document(title = 'Apple banana cherry orange')
+        root['b'] = Document(title = 'Apple apple apple')
+        root['c'] = Document(title = 'Cherry')
+        return root
+
+    def _names(self, root, docids):
+        return [root.document_map.address_for_docid(x) for x in docids]
+
+    def test_relevance(self):
+        root = self._fixture()
+        res, docids = self._fut(root.catalog, Contains('searchable_text', 'apple'),
+                                sort_index = 'searchable_text')
+        self.assertEqual(self._names(root, docids), ['/b', '/a'])
+        self.assertEqual(res.total, 2)
+
+    def test_relevance_limit_and_reverse(self):
+        root = self._fixture()
+        query = Contains('searchable_text', 'apple') & Eq('type_name', 'Document')
+        res, docids = self._fut(root.catalog, query, sort_index = 'searchable_text', limit = 1)
+        self.assertEqual(self._names(root, docids), ['/b'])
+        self.assertEqual((int(res), res.total), (1, 2))
+        res, docids = self._fut(root.catalog, query, sort_index = 'searchable_text',
+                                limit = 1, reverse = True)
+        self.assertEqual(self._names(root, docids), ['/a'])
+
+    def test_text_sort_without_weights(self):
+        root = self._fixture()
+        res, docids = self._fut(root.catalog, Eq('type_name', 'Document'),
+                                sort_index = 'searchable_text', limit = 2)
+        self.assertEqual(len(docids), 2)
+        self.assertEqual(res.total, 3)
+
+    def test_field_index(self):
+        root = self._fixture()
+        res, docids = self._fut(root.catalog, Eq('type_name', 'Document'),
+                                sort_index = 'sortable_title', limit = 2)
+        self.assertEqual(self._names(root, docids), ['/b', '/a'])
+
+
+class SearchableTextSettingsTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp(settings = {'arche.search.boost': 'title:3'})
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def _fixture(self):
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        root['a'] = Document(title = 'Banana', description = 'Apple orange')
+        root['b'] = Document(title = 'Apple', description = 'Banana orange')
+        return root
+
+    def test_boost(self):
+        from arche.models.catalog import sorted_query
+        root = self._fixture()
+        for word in ('apple', 'banana'):
+            res, docids = sorted_query(root.catalog, Contains('searchable_text', word),
+                                       sort_index = 'searchable_text')
+            self.assertEqual(root.document_map.address_for_docid(docids[0]),
+                             word == 'apple' and '/b' or '/a')
+
+    def test_boost_within_query(self):
+        from arche.models.catalog import sorted_query
+        root = self._fixture()
+        query = "type_name == 'Document' and 'banana' in searchable_text and not 'kiwi' in searchable_text"
+        res, docids = sorted_query(root.catalog, Contains('searchable_text', 'banana') & Eq('type_name', 'Document'),
+                                   sort_index = 'searchable_text')
+        self.assertEqual(root.document_map.address_for_docid(docids[0]), '/a')
+        res, docids = sorted_query(root.catalog, query, sort_index = 'searchable_text')
+        self.assertEqual(root.document_map.address_for_docid(docids[0]), '/a')
+
+    def test_boosted_text_not_repeated(self):
+        root = self._fixture()
+        index = root.catalog['searchable_text']
+        docid = root.document_map.docid_for_address('/b')
+        self.assertEqual(index.index.documentCount(), 2)
+        self.assertEqual(index.index._docweight[docid], 3)
+        boosted = root.catalog['searchable_text_title']
+        self.assertEqual(set(boosted.applyContains('apple')), set([docid]))
+        self.assertEqual(set(boosted.applyContains('orange')), set())
+
+    def test_settings_change_rebuilds_index(self):
+        from zope.index.text.lexicon import StopWordRemover
+        from arche.models.catalog import check_catalog
+        root = self._fixture()
+        self.assertEqual(check_catalog(root, self.config.registry), ([], set()))
+        self.config.registry.settings['arche.search.lexicon'] = 'splitter case_normalizer stop_words'
+        old_index = root.catalog['searchable_text']
+        self.assertEqual(check_catalog(root, self.config.registry)[0],
+                         ['searchable_text', 'searchable_text_title'])
+        self.assertIsNot(root.catalog['searchable_text'], old_index)
+        self.assertIsInstance(root.catalog['searchable_text'].lexicon._pipeline[2], StopWordRemover)
+        self.assertEqual(check_catalog(root, self.config.registry), ([], set()))
+
+    def test_legacy_index_without_fingerprint(self):
+        from arche.models.catalog import check_catalog
+        root = self._fixture()
+        del root.catalog['searchable_text'].text_fingerprint
+        self.assertEqual(check_catalog(root, self.config.registry), ([], set()))
+
+
+class CatalogRowsTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    @property
+    def _fut(self):
+        from arche.models.catalog import catalog_rows
+        return catalog_rows
+
+    def _fixture(self):
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        root['a'] = Document(title = 'Apple', description = 'Red')
+        root['b'] = Document(title = 'Banana', description = 'Yellow')
+        return root
+
+    def _mk_request(self, root):
+        request = testing.DummyRequest()
+        request.root = root
+        apply_request_extensions(request)
+        return request
+
+    def test_rows_from_indexes_and_metadata(self):
+        self.config.create_metadata_field('title', 'upper_title')
+        root = self._fixture()
+        request = self._mk_request(root)
+        rows = self._fut(request, Eq('type_name', 'Document'), fields = ['title', 'upper_title', 'uid'],
+                         sort_index = 'sortable_title', perm = None)
+        self.assertEqual([x['title'] for x in rows], ['Apple', 'Banana'])
+        self.assertEqual(rows[0]['upper_title'], 'Apple')
+        self.assertEqual(rows[0]['uid'], root['a'].uid)
+        self.assertEqual(rows[0]['__name__'], 'a')
+        self.assertEqual(rows[0].path, '/a')
+
+    def test_limit_and_offset(self):
+        root = self._fixture()
+        request = self._mk_request(root)
+        rows = self._fut(request, "type_name == 'Document'", fields = ['title'],
+                         sort_index = 'sortable_title', limit = 1, offset = 1, perm = None)
+        self.assertEqual([x['title'] for x in rows], ['Banana'])
+
+    def test_objects_not_loaded(self):
+        root = self._fixture()
+        request = self._mk_request(root)
+        request.resolve_docids = None
+        root.document_map.docid_to_metadata = None
+        self.assertEqual(len(self._fut(request, Eq('type_name', 'Document'), fields = ['title'], perm = None)), 2)
+
+    def test_only_view_perm(self):
+        from arche.exceptions import CatalogConfigError
+        root = self._fixture()
+        request = self._mk_request(root)
+        self.assertRaises(CatalogConfigError, self._fut, request, Eq('type_name', 'Document'), perm = 'Edit')
+
+    def test_get_row_fields(self):
+        from arche.models.catalog import get_row_fields
+        self.config.create_metadata_field('title', 'upper_title')
+        root = self._fixture()
+        fields = get_row_fields(root.catalog, self.config.registry)
+        self.assertIn('upper_title', fields)
+        self.assertIn('description', fields)
+        self.assertNotIn('creator', fields)
+        self.assertIs(get_row_fields(root.catalog, self.config.registry), fields)
+        self.config.create_metadata_field('title', 'lower_title')
+        self.assertIn('lower_title', get_row_fields(root.catalog, self.config.registry))
+
+    def test_default_fields_for_json_data(self):
+        from arche.models.catalog import has_row_fields
+        from arche.models.jsondata import JSONRowData
+        root = self._fixture()
+        request = self._mk_request(root)
+        self.assertTrue(has_row_fields(request, JSONRowData.required_fields()))
+        self.assertTrue(has_row_fields(request, JSONRowData.required_fields(['userid', 'email_validated'])))
+        self.assertFalse(has_row_fields(request, JSONRowData.required_fields(['body'])))
+
+    def test_evolve_adds_metadata(self):
+        from arche.evolve.evolve2 import evolve
+        root = self._fixture()
+        docid = root.document_map.docid_for_address('/a')
+        # Set without events, like data from before the field was registered
+        root['a'].tags = ['fruit']
+        self.assertRaises(KeyError, root.document_map.get_metadata, docid)
+        evolve(root)
+        self.assertEqual(root.document_map.get_metadata(docid)['tags'], ('fruit',))
+
+    def test_row_url(self):
+        root = self._fixture()
+        request = self._mk_request(root)
+        rows = self._fut(request, Eq('type_name', 'Document'), perm = None, sort_index = 'sortable_title')
+        self.assertEqual(rows[0].url(request), request.resource_url(root['a']))
+
+    def test_json_data_from_row(self):
+        from arche.interfaces import IJSONData
+        from arche.models.catalog import get_catalog_rows
+        from arche.models.jsondata import JSONRowData
+        self.config.include('arche.models.jsondata')
+        self.config.include('arche.resources')
+        root = self._fixture()
+        request = self._mk_request(root)
+        fields = JSONRowData.required_fields()
+        docid = root.document_map.docid_for_address('/a')
+        row = next(get_catalog_rows(root, [docid], fields))
+        obj_data = IJSONData(root['a'])(request)
+        row_data = IJSONData(row)(request)
+        for attr in ('created', 'modified'):
+            self.assertEqual(row_data.pop(attr), obj_data.pop(attr).replace(microsecond = 0))
+        # Unset dates aren't indexed
+        self.assertFalse(row_data.pop('date'))
+        self.assertFalse(obj_data.pop('date'))
+        self.assertEqual(row_data, obj_data)
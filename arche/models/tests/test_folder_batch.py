@@ -0,0 +1,170 @@
+from __future__ import unicode_literals
+from unittest import TestCase
+
+import transaction
+from pyramid import testing
+from pyramid.request import apply_request_extensions
+
+
+class FolderBatchTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        self.config.include('arche.models.folder_batch')
+
+    def tearDown(self):
+        transaction.abort()
+        testing.tearDown()
+
+    @property
+    def _fut(self):
+        from arche.models.folder_batch import folder_batch
+        return folder_batch
+
+    def _fixture(self):
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        root['folder'] = folder = Document(title = 'Folder')
+        for (name, title) in (('c', 'Cherry'), ('a', 'Apple'), ('d', 'Date'), ('b', 'Banana')):
+            obj = Document(title = title)
+            obj.nav_visible = name != 'b'
+            folder[name] = obj
+        folder['a']['nested'] = Document(title = 'Nested')
+        return root
+
+    def _mk_request(self, root):
+        request = testing.DummyRequest()
+        request.root = root
+        apply_request_extensions(request)
+        return request
+
+    def _names(self, batch):
+        return [x.__name__ for x in batch]
+
+    def test_folder_order(self):
+        root = self._fixture()
+        request = self._mk_request(root)
+        batch = self._fut(request, root['folder'], start = 1, limit = 2, perm = None)
+        self.assertEqual(self._names(batch), ['a', 'd'])
+        self.assertEqual(batch.total, 4)
+        self.assertEqual(batch.next_start, 3)
+
+    def test_folder_walk_stops(self):
+        root = self._fixture()
+        folder = root['folder']
+        walked = []
+        def _keys():
+            for name in ('c', 'a', 'd', 'b'):
+                walked.append(name)
+                yield name
+        folder.keys = _keys
+        request = self._mk_request(root)
+        batch = self._fut(request, folder, limit = 2, perm = None)
+        self.assertEqual(self._names(batch), ['c', 'a'])
+        self.assertEqual(walked, ['c', 'a'])
+        del walked[:]
+        batch = self._fut(request, folder, filters = {'title': 'Apple'}, perm = None)
+        self.assertEqual(self._names(batch), ['a'])
+        self.assertEqual(walked, ['c', 'a'])
+
+    def test_custom_order(self):
+        root = self._fixture()
+        root['folder'].order = ['d', 'c', 'b', 'a']
+        request = self._mk_request(root)
+        batch = self._fut(request, root['folder'], limit = 3, perm = None)
+        self.assertEqual(self._names(batch), ['d', 'c', 'b'])
+
+    def test_sort_on(self):
+        root = self._fixture()
+        request = self._mk_request(root)
+        batch = self._fut(request, root['folder'], limit = 3, sort_on = 'sortable_title', perm = None)
+        self.assertEqual(self._names(batch), ['a', 'b', 'c'])
+        batch = self._fut(request, root['folder'], start = 2, limit = 3, sort_on = 'sortable_title',
+                          reverse = True, perm = None)
+        self.assertEqual(self._names(batch), ['b', 'a'])
+
+    def test_filters(self):
+        root = self._fixture()
+        request = self._mk_request(root)
+        batch = self._fut(request, root['folder'], filters = {'nav_visible': True}, perm = None)
+        self.assertEqual(self._names(batch), ['c', 'a', 'd'])
+        self.assertEqual(batch.total, 3)
+        batch = self._fut(request, root['folder'], filters = {'title': ['Apple', 'Date']}, perm = None)
+        self.assertEqual(self._names(batch), ['a', 'd'])
+
+    def test_objects_outside_batch_not_loaded(self):
+        root = self._fixture()
+        request = self._mk_request(root)
+        root['folder'].data['d'] = None
+        batch = self._fut(request, root['folder'], limit = 2, perm = None)
+        self.assertEqual(self._names(batch), ['c', 'a'])
+
+    def test_fallback_same_result(self):
+        root = self._fixture()
+        request = self._mk_request(root)
+        kw = {'start': 1, 'limit': 2, 'sort_on': 'sortable_title',
+              'filters': {'nav_visible': True}, 'perm': None}
+        from_catalog = self._fut(request, root['folder'], **kw)
+        del root.catalog['parent_path']
+        fallback = self._fut(request, root['folder'], **kw)
+        self.assertEqual(self._names(from_catalog), ['c', 'd'])
+        self.assertEqual(self._names(fallback), ['c', 'd'])
+        self.assertEqual(from_catalog.total, fallback.total)
+
+    def test_fallback_on_attribute_filter(self):
+        root = self._fixture()
+        request = self._mk_request(root)
+        root['folder']['a'].custom = 1
+        batch = self._fut(request, root['folder'], filters = {'custom': 1}, perm = None)
+        self.assertEqual(self._names(batch), ['a'])
+        self.assertEqual(batch.total, 1)
+
+    def test_index_queue_flushed(self):
+        from arche.resources import Document
+        self.config.registry.settings['arche.catalog_queue'] = True
+        root = self._fixture()
+        request = self._mk_request(root)
+        root['folder']['e'] = Document(title = 'Elderberry')
+        batch = self._fut(request, root['folder'], start = 4, perm = None)
+        self.assertEqual(self._names(batch), ['e'])
+
+    def test_view_permission_from_catalog(self):
+        from arche.resources import Document
+        from arche.testing import barebone_fixture
+        self.config.include('arche.testing.workflow')
+        self.config.set_content_workflow('Document', 'simple_workflow')
+        root = barebone_fixture(self.config)
+        for name in ('a', 'b', 'c'):
+            root[name] = Document()
+        request = self._mk_request(root)
+        self.config.begin(request)
+        root['b'].workflow.do_transition('private:public', force = True)
+        batch = self._fut(request, root, filters = {'type_name': 'Document'})
+        self.assertEqual(self._names(batch), ['b'])
+        self.assertEqual(batch.total, 1)
+
+    def test_request_method(self):
+        root = self._fixture()
+        request = self._mk_request(root)
+        self.assertEqual(request.folder_batch(root, perm = None).total, 1)
+
+
+class BatchParamsTests(TestCase):
+
+    @property
+    def _fut(self):
+        from arche.models.folder_batch import batch_params
+        return batch_params
+
+    def test_params(self):
+        request = testing.DummyRequest(params = {'start': '20', 'limit': '10'})
+        self.assertEqual(self._fut(request), (20, 10))
+
+    def test_offset_and_bad_values(self):
+        request = testing.DummyRequest(params = {'offset': '5', 'limit': 'many'})
+        self.assertEqual(self._fut(request, limit = 15), (5, 15))
+        request = testing.DummyRequest(params = {'start': '-1', 'limit': '1000'})
+        self.assertEqual(self._fut(request, max_limit = 100), (0, 100))
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from unittest import TestCase
+
+
+def _dummy_element(settings):
+    from arche.models.lexicon import AccentFolder
+    return AccentFolder()
+
+
+class AccentFolderTests(TestCase):
+
+    @property
+    def _cut(self):
+        from arche.models.lexicon import AccentFolder
+        return AccentFolder
+
+    def test_process(self):
+        self.assertEqual(self._cut().process(['café', 'Åre', 'plain']), ['cafe', 'Are', 'plain'])
+
+    def test_glob(self):
+        self.assertEqual(self._cut().processGlob(['caf*']), ['caf*'])
+
+
+class StopWordsTests(TestCase):
+
+    @property
+    def _fut(self):
+        from arche.models.lexicon import _stop_words
+        return _stop_words
+
+    def test_default_words(self):
+        self.assertEqual(self._fut({}).process(['the', 'apple']), ['apple'])
+
+    def test_custom_words(self):
+        remover = self._fut({'arche.search.stop_words': 'och'})
+        self.assertEqual(remover.process(['the', 'och', 'apple']), ['the', 'apple'])
+        self.assertEqual(self._fut({}).process(['och']), ['och'])
+
+
+class CreateLexiconTests(TestCase):
+
+    @property
+    def _fut(self):
+        from arche.models.lexicon import create_lexicon
+        return create_lexicon
+
+    def test_default(self):
+        from zope.index.text.lexicon import CaseNormalizer
+        from zope.index.text.lexicon import Splitter
+        lexicon = self._fut({})
+        self.assertEqual([type(x) for x in lexicon._pipeline], [Splitter, CaseNormalizer])
+
+    def test_configured(self):
+        from zope.index.text.lexicon import StopWordRemover
+        from arche.models.lexicon import AccentFolder
+        lexicon = self._fut({'arche.search.lexicon': 'splitter case_normalizer accent_folding stop_words',
+                             'arche.search.stop_words': 'och i'})
+        self.assertIsInstance(lexicon._pipeline[2], AccentFolder)
+        self.assertIsInstance(lexicon._pipeline[3], StopWordRemover)
+        self.assertEqual(lexicon.sourceToWordIds('Kaffe och Café'),
+                         lexicon.termToWordIds('kaffe cafe'))
+
+    def test_dotted_name(self):
+        from arche.models.lexicon import AccentFolder
+        lexicon = self._fut({'arche.search.lexicon': 'splitter arche.models.tests.test_lexicon._dummy_element'})
+        self.assertIsInstance(lexicon._pipeline[1], AccentFolder)
+
+
+class TextFingerprintTests(TestCase):
+
+    @property
+    def _fut(self):
+        from arche.models.lexicon import text_fingerprint
+        return text_fingerprint
+
+    def test_defaults_are_stable(self):
+        self.assertEqual(self._fut({}), self._fut({'arche.search.lexicon': 'splitter case_normalizer',
+                                                   'arche.search.language': 'swedish'}))
+
+    def test_changes(self):
+        default = self._fut({})
+        self.assertNotEqual(default, self._fut({'arche.search.lexicon': 'splitter'}))
+        self.assertEqual(default, self._fut({'arche.search.boost': 'title:2'}))
+
+    def test_get_boosts(self):
+        from arche.models.lexicon import get_boosts
+        self.assertEqual(get_boosts({'arche.search.boost': 'title:3 description:2'}),
+                         {'title': 3, 'description': 2})
+
+    def test_bad_boosts(self):
+        from arche.exceptions import CatalogConfigError
+        from arche.models.lexicon import get_boosts
+        for value in ('title:1.5', 'title', 'title:0', 'title:x:2'):
+            self.assertRaises(CatalogConfigError, get_boosts, {'arche.search.boost': value})
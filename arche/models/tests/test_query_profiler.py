@@ -0,0 +1,80 @@
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from pyramid import testing
+from repoze.catalog.query import Contains
+from repoze.catalog.query import Eq
+
+
+class QueryProfilerTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp(settings = {'arche.catalog_query_cache': 10,
+                                                'arche.catalog_profiler': True,
+                                                'arche.catalog_profiler.slow': 0})
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        self.config.include('arche.models.query_profiler')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def _fixture(self):
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        root['a'] = Document(title = 'Apple')
+        root['b'] = Document(title = 'Banana')
+        return root
+
+    @property
+    def profiler(self):
+        return self.config.registry.catalog_profiler
+
+    def test_parsed_queries_cached(self):
+        from arche.models.query_profiler import parse_query_cached
+        root = self._fixture()
+        query = parse_query_cached("type_name == 'Document'")
+        self.assertIs(parse_query_cached("type_name == 'Document'"), query)
+        self.assertEqual(root.catalog.query("type_name == 'Document'")[0].total, 2)
+        # Combining queries doesn't change the shared one
+        combined = query & Eq('title', 'Apple')
+        self.assertEqual(root.catalog.query(combined)[0].total, 1)
+        self.assertEqual(str(parse_query_cached("type_name == 'Document'")), "type_name == 'Document'")
+
+    def test_catalog_helpers_use_cache(self):
+        from arche.models.catalog import sorted_query
+        root = self._fixture()
+        sorted_query(root.catalog, "'apple' in searchable_text", sort_index = 'searchable_text')
+        self.assertIsNot(self.config.registry.catalog_query_cache.get("'apple' in searchable_text"), None)
+
+    def test_index_stats(self):
+        root = self._fixture()
+        self.profiler.reset()
+        query = Eq('type_name', 'Document') & Contains('searchable_text', 'apple')
+        root.catalog.query(query, sort_index = 'sortable_title')
+        stats = dict((x['name'], x) for x in self.profiler.index_stats())
+        self.assertEqual(set(stats), set(['type_name', 'searchable_text', 'sort:sortable_title']))
+        self.assertEqual(stats['type_name']['average_size'], 2)
+        self.assertEqual(stats['searchable_text']['average_size'], 1)
+        self.assertEqual(self.profiler.queries, 1)
+
+    def test_slowest(self):
+        root = self._fixture()
+        self.profiler.reset()
+        root.catalog.query("type_name == 'Document'")
+        root.catalog.search(type_name = 'Document')
+        slowest = self.profiler.slowest(1)
+        self.assertEqual(len(slowest), 1)
+        queries = sorted(x['query'] for x in self.profiler.slowest())
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(queries[0].startswith("search(type_name="))
+        self.assertEqual(queries[1], "type_name == 'Document'")
+
+    def test_query_repr(self):
+        from arche.models.query_profiler import query_repr
+        query = Eq('type_name', 'Document') & Eq('wf_state', 'public')
+        result = query_repr(query)
+        self.assertTrue(result.startswith("And(type_name == "))
+        self.assertIn(", wf_state == ", result)
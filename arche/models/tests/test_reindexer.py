@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from unittest import TestCase
+
+import transaction
+from pyramid import testing
+from ZODB.POSException import ConflictError
+
+from arche.interfaces import ICataloger
+
+
+class CatalogReindexerTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+
+    def tearDown(self):
+        transaction.abort()
+        testing.tearDown()
+
+    @property
+    def _cut(self):
+        from arche.models.reindexer import CatalogReindexer
+        return CatalogReindexer
+
+    def _fixture(self, num = 5):
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        for i in range(num):
+            root['d%s' % i] = Document(title = 'Doc %s' % i)
+        return root
+
+    def _checkpoint(self, root, **kw):
+        from arche.models.reindexer import create_checkpoints
+        return create_checkpoints(root, **kw)[0]
+
+    def _mk(self, root, checkpoint, **kw):
+        kw.setdefault('callback', lambda *args: None)
+        return self._cut(root, checkpoint, registry = self.config.registry, **kw)
+
+    def test_reindex_all(self):
+        root = self._fixture()
+        root.catalog['title'].clear()
+        obj = self._mk(root, self._checkpoint(root), chunk_size = 2)
+        obj.run()
+        self.assertEqual(root.catalog.query("title == 'Doc 3'")[0].total, 1)
+        self.assertEqual(obj.checkpoint.processed, len(root.document_map.docid_to_address))
+        self.assertTrue(obj.checkpoint.done)
+
+    def test_resume_from_checkpoint(self):
+        root = self._fixture()
+        docids = list(root.document_map.docid_to_address.keys())
+        cp = self._checkpoint(root)
+        cp.last_docid = docids[2]
+        obj = self._mk(root, cp)
+        self.assertEqual(obj.get_docids(), docids[3:])
+
+    def test_workers_split_docids(self):
+        from arche.models.reindexer import create_checkpoints
+        root = self._fixture()
+        checkpoints = create_checkpoints(root, workers = 3)
+        found = []
+        for cp in checkpoints.values():
+            found.extend(self._mk(root, cp).get_docids())
+        self.assertEqual(sorted(found), list(root.document_map.docid_to_address.keys()))
+
+    def test_limit_types(self):
+        root = self._fixture(num = 2)
+        self.config.registry.queryAdapter(root, ICataloger).index_object()
+        self.config.update_index_info('title', type_names = 'Root')
+        cp = self._checkpoint(root, indexes = ['title'])
+        docids = self._mk(root, cp).get_docids()
+        self.assertEqual(docids, [root.document_map.docid_for_address('/')])
+
+    def test_stale_docid_removed(self):
+        root = self._fixture()
+        cataloger = self.config.registry.queryAdapter(root['d1'], ICataloger)
+        docid = root.document_map.docid_for_address(cataloger.path)
+        # Remove without firing events so the catalog is out of sync
+        root.data.pop('d1')
+        self._mk(root, self._checkpoint(root)).run()
+        self.assertEqual(root.document_map.address_for_docid(docid), None)
+
+    def test_conflict_retry(self):
+        root = self._fixture()
+        obj = self._mk(root, self._checkpoint(root))
+        calls = []
+        def _flaky(docid, indexes):
+            calls.append(docid)
+            if len(calls) == 1:
+                raise ConflictError()
+        obj.index_docid = _flaky
+        obj.run()
+        self.assertEqual(len(calls), len(root.document_map.docid_to_address) + 1)
+
+    def test_conflict_gives_up(self):
+        root = self._fixture()
+        obj = self._mk(root, self._checkpoint(root), retries = 2)
+        def _fail(docid, indexes):
+            raise ConflictError()
+        obj.index_docid = _fail
+        self.assertRaises(ConflictError, obj.run)
+
+    def test_index_missing_objects(self):
+        from arche.models.reindexer import index_missing_objects
+        root = self._fixture()
+        root.catalog.clear()
+        root.document_map.docid_to_address.clear()
+        root.document_map.address_to_docid.clear()
+        self.assertEqual(index_missing_objects(root, registry = self.config.registry), 6)
+        self.assertEqual(index_missing_objects(root, registry = self.config.registry), 0)
+
+
+class MissingObjectsIndexerTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+
+    def tearDown(self):
+        transaction.abort()
+        testing.tearDown()
+
+    @property
+    def _cut(self):
+        from arche.models.reindexer import MissingObjectsIndexer
+        return MissingObjectsIndexer
+
+    def _fixture(self):
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        for name in ('a', 'b', 'c'):
+            root[name] = Document()
+            root[name]['x'] = Document()
+        root.catalog.clear()
+        root.document_map.docid_to_address.clear()
+        root.document_map.address_to_docid.clear()
+        return root
+
+    def _mk(self, root, checkpoint, **kw):
+        kw.setdefault('callback', lambda *args: None)
+        return self._cut(root, checkpoint, registry = self.config.registry, **kw)
+
+    def _paths(self, root):
+        return set(root.document_map.address_to_docid.keys())
+
+    def test_walk_tree_resume(self):
+        from arche.models.reindexer import walk_tree
+        root = self._fixture()
+        names = [x[0] for x in walk_tree(root)]
+        self.assertEqual(names, [(), ('a',), ('a', 'x'), ('b',), ('b', 'x'), ('c',), ('c', 'x')])
+        self.assertEqual([x[0] for x in walk_tree(root, after = ('b',))], [('b', 'x'), ('c',), ('c', 'x')])
+        self.assertEqual([x[0] for x in walk_tree(root, after = ('b', 'x'))], [('c',), ('c', 'x')])
+        # Removed objects restart their folder
+        self.assertEqual(len(list(walk_tree(root, after = ('404',)))), 6)
+
+    def test_index_missing(self):
+        from arche.models.reindexer import ReindexCheckpoint
+        root = self._fixture()
+        cp = ReindexCheckpoint()
+        self._mk(root, cp, chunk_size = 2).run()
+        self.assertEqual(cp.added, 7)
+        self.assertEqual(cp.walked, 7)
+        self.assertTrue(cp.missing_done)
+        self.assertEqual(len(self._paths(root)), 7)
+
+    def test_resume_from_checkpoint(self):
+        from arche.models.reindexer import ReindexCheckpoint
+        root = self._fixture()
+        cp = ReindexCheckpoint()
+        cp.last_path = ('b', 'x')
+        self._mk(root, cp).run()
+        self.assertEqual(self._paths(root), set(['/c', '/c/x']))
+
+    def test_workers_split_paths(self):
+        from arche.models.reindexer import create_checkpoints
+        root = self._fixture()
+        found = []
+        for cp in create_checkpoints(root, workers = 3, find_missing = True).values():
+            self._mk(root, cp).run()
+            found.append(cp.added)
+        self.assertEqual(sum(found), 7)
+        self.assertEqual(len(self._paths(root)), 7)
+
+    def test_conflict_restarts_from_checkpoint(self):
+        from arche.models.reindexer import ReindexCheckpoint
+        root = self._fixture()
+        cp = ReindexCheckpoint()
+        obj = self._mk(root, cp)
+        calls = []
+        _index_missing = obj.index_missing
+        def _flaky(item):
+            calls.append(item)
+            if len(calls) == 1:
+                raise ConflictError()
+            return _index_missing(item)
+        obj.index_missing = _flaky
+        obj.run()
+        self.assertEqual(len(calls), 8)
+        self.assertEqual(cp.added, 7)
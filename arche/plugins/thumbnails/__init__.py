@@ -2,3 +2,5 @@
 def includeme(config):
     config.include('.views')
     config.include('.models')
+    config.include('.workers')
+    config.include('.scripts')
@@ -1,15 +1,24 @@
+from hashlib import sha1
 from uuid import uuid4
+import errno
+import os
+import threading
 
 from zope.component import adapter
 from zope.interface import implementer
 from plone.scale.scale import scaleImage
 from repoze.lru import LRUCache
 from pyramid.threadlocal import get_current_registry
+from pyramid.traversal import quote_path_segment
 from PIL.Image import core as pilcore
 
+from arche import logger
 from arche.interfaces import IBlobs, IThumbnailsCache
+from arche.interfaces import ICatalogRow
 from arche.interfaces import IThumbnailedContent
 from arche.interfaces import IThumbnails
+from arche.interfaces import IThumbnailsStore
+from arche.interfaces import IThumbnailWorkers
 from arche.interfaces import IObjectUpdatedEvent
 from arche.utils import get_image_scales
 
@@ -22,8 +31,10 @@ class Thumbnails(object):
     def __init__(self, context):
         self.context = context
 
-    def get_thumb(self, scale, key = None, direction = "thumbnail"):
-        """ Return data from plone scale or None"""
+    def get_thumb(self, scale, key = None, direction = "thumbnail", create = True):
+        """ Return data from plone scale or None.
+            If create is False, only thumbnails that already exist will be returned.
+        """
         #Make cache optional
         if key is None:
             key = getattr(self.context, 'blob_key', 'image')
@@ -33,37 +44,60 @@ class Thumbnails(object):
             return cached
         if direction not in _ALLOWED_SCALE_DIRECTIONS:
             return
-        scales = get_image_scales()
-        maxwidth, maxheight = scales[scale]
+        blobfile = self._get_blobfile(key)
+        if blobfile is None:
+            return
+        size = get_image_scales()[scale]
+        store = self.thumb_store
+        if store is not None:
+            storekey = store.get_key(blobfile, scale, size, direction)
+            thumb = store.get(storekey)
+            if thumb:
+                self.thumb_cache.put(cachekey, thumb)
+                return thumb
+        if not create:
+            return
+        with blobfile.blob.open() as f:
+            thumb = create_thumbnail(f, size, direction = direction)
+        if thumb:
+            self.thumb_cache.put(cachekey, thumb)
+            if store is not None:
+                store.put(storekey, thumb)
+        return thumb
+
+    def is_pending(self, scale, key = None, direction = "thumbnail"):
+        """ Is a background worker creating this thumbnail right now? """
+        workers = get_current_registry().queryUtility(IThumbnailWorkers)
+        if workers is None:
+            return False
+        if key is None:
+            key = getattr(self.context, 'blob_key', 'image')
+        blobfile = self._get_blobfile(key)
+        if blobfile is None:
+            return False
+        size = get_image_scales()[scale]
+        return workers.is_pending(workers.store.get_key(blobfile, scale, size, direction))
+
+    def _get_blobfile(self, key):
         blobs = IBlobs(self.context)
         if key in blobs:
             registry = get_current_registry()
             if blobs[key].mimetype in registry.settings['supported_thumbnail_mimetypes']:
-                with blobs[key].blob.open() as f:
-                    try:
-                        thumb_data, image_type, size = scaleImage(
-                            f, width = maxwidth, height = maxheight, direction = direction
-                        )
-                    except IOError:
-                        #FIXME: Logging?
-                        return
-                thumb = Thumbnail(thumb_data, image_type = image_type, size = size)
-                self.thumb_cache.put(cachekey, thumb)
-                return thumb
+                return blobs[key]
 
     def invalidate_context_cache(self):
-        invalidate_keys = set()
-        for k in self.thumb_cache.data.keys():
-            if self.context.uid in k:
-                invalidate_keys.add(k)
-        for k in invalidate_keys:
-            self.thumb_cache.invalidate(k)
+        self.thumb_cache.invalidate_uid(self.context.uid)
 
     @property
     def thumb_cache(self):
         reg = get_current_registry()
         return reg.queryUtility(IThumbnailsCache)
 
+    @property
+    def thumb_store(self):
+        reg = get_current_registry()
+        return reg.queryUtility(IThumbnailsStore)
+
 
 class Thumbnail(object):
     """ Note that these are non-persistent objects usually created on the fly."""
@@ -82,8 +116,29 @@ class Thumbnail(object):
         return "image/%s" % self.image_type
 
 
+def create_thumbnail(f, size, direction = "thumbnail"):
+    """ Scale the image in the open file f to fit size, a tuple with width and height.
+        Returns a Thumbnail or None if the file couldn't be read as an image.
+    """
+    maxwidth, maxheight = size
+    try:
+        thumb_data, image_type, size = scaleImage(
+            f, width = maxwidth, height = maxheight, direction = direction
+        )
+    except IOError:
+        #FIXME: Logging?
+        return
+    return Thumbnail(thumb_data, image_type = image_type, size = size)
+
+
+def blob_changed(event):
+    """ Could the blob of the updated object have changed? """
+    return event.changed is None or bool(_BLOB_ATTRIBUTES & event.changed)
+
+
 def invalidate_thumbs_in_context(context, event):
-    IThumbnails(context).invalidate_context_cache()
+    if blob_changed(event):
+        IThumbnails(context).invalidate_context_cache()
 
 
 _pil_codecs_to_mimetypes = {
@@ -91,6 +146,8 @@ _pil_codecs_to_mimetypes = {
     'zip_encoder': ('image/png',),
     'gif_encoder': ('image/gif',),
 }
+#Attributes that set the blob thumbnails are created from
+_BLOB_ATTRIBUTES = frozenset(['image_data', 'file_data'])
 _ALLOWED_SCALE_DIRECTIONS = (
     'thumbnail',
     'down',
@@ -108,6 +165,11 @@ def _check_supported_thumbnail_mimetypes():
 
 
 def thumb_url(request, context, scale, key = None, direction = 'thumbnail'):
+    """ context may also be a catalog row with the 'thumb_key' field,
+        see arche.models.catalog.catalog_rows
+    """
+    if ICatalogRow.providedBy(context):
+        return _row_thumb_url(request, context, scale, key = key, direction = direction)
     if key is None:
         key = getattr(context, 'blob_key', 'image')
     scales = get_image_scales(request.registry)
@@ -115,6 +177,14 @@ def thumb_url(request, context, scale, key = None, direction = 'thumbnail'):
         return request.resource_url(context, 'thumbnail', key, scale, direction)
 
 
+def _row_thumb_url(request, row, scale, key = None, direction = 'thumbnail'):
+    thumb_key = row.get('thumb_key', None)
+    if key is None:
+        key = thumb_key
+    if key and key == thumb_key and scale in get_image_scales(request.registry):
+        return row.url(request) + '/'.join(quote_path_segment(x) for x in ('thumbnail', key, scale, direction))
+
+
 def thumb_tag(request, context, scale_name, default = u"", extra_cls = '', direction = "thumbnail", key = None, **kw):
     #FIXME: Default?
     if key is None:
@@ -125,14 +195,16 @@ def thumb_tag(request, context, scale_name, default = u"", extra_cls = '', direc
     thumbnails = request.registry.queryAdapter(context, IThumbnails)
     if thumbnails is None:
         return default
-    thumb = thumbnails.get_thumb(scale_name, direction = direction, key = key)
-    if thumb:
+    pending = thumbnails.is_pending(scale_name, direction = direction, key = key)
+    thumb = thumbnails.get_thumb(scale_name, direction = direction, key = key, create = not pending)
+    if thumb or pending:
         data = {'src': url,
-                'width': thumb.width,
-                'height': thumb.height,
                 'class': 'thumb-%s img-responsive' % scale_name,
                 'alt': context.title,
                 }
+        if thumb:
+            data['width'] = thumb.width
+            data['height'] = thumb.height
         if extra_cls:
             data['class'] += " %s" % extra_cls
         data.update(kw)
@@ -142,7 +214,166 @@ def thumb_tag(request, context, scale_name, default = u"", extra_cls = '', direc
 
 @implementer(IThumbnailsCache)
 class ThumbCache(LRUCache):
-    __doc__ = LRUCache.__doc__
+    """ LRU cache for thumbnails, with keys like (uid, scale, key, direction).
+        Keeps an index of uid -> keys so all thumbnails for an object
+        can be invalidated without scanning the cache.
+    """
+
+    def __init__(self, size):
+        self._uid_keys = {}
+        self._uid_lock = threading.Lock()
+        super(ThumbCache, self).__init__(size)
+
+    def clear(self):
+        super(ThumbCache, self).clear()
+        with self._uid_lock:
+            self._uid_keys = {}
+
+    def put(self, key, val):
+        super(ThumbCache, self).put(key, val)
+        with self._uid_lock:
+            self._uid_keys.setdefault(key[0], set()).add(key)
+            #Evicted keys aren't removed from the index, so rebuild it once in a while
+            if len(self._uid_keys) > self.size * 2:
+                self._rebuild_index()
+
+    def invalidate(self, key):
+        super(ThumbCache, self).invalidate(key)
+        with self._uid_lock:
+            keys = self._uid_keys.get(key[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._uid_keys[key[0]]
+
+    def invalidate_uid(self, uid):
+        with self._uid_lock:
+            keys = self._uid_keys.pop(uid, ())
+        for key in keys:
+            super(ThumbCache, self).invalidate(key)
+
+    def _rebuild_index(self):
+        index = {}
+        for key in list(self.data.keys()):
+            index.setdefault(key[0], set()).add(key)
+        self._uid_keys = index
+
+
+@implementer(IThumbnailsStore)
+class ThumbStore(object):
+    """ Stores thumbnails as files within a directory, so they can be shared between processes
+        and survive restarts. Each file starts with a header line containing
+        image type, width and height.
+
+        Reading a thumbnail touches the file, and when the store grows beyond max_size
+        the files that haven't been used for the longest time will be removed.
+    """
+
+    def __init__(self, path, max_size = 0):
+        self.path = path
+        self.max_size = max_size
+        self._size = None #Approximate size, since other processes write here too
+
+    def get_key(self, blobfile, scale, size, direction):
+        content_hash = blobfile.sha256 or blobfile.get_etag()
+        if not content_hash:
+            return
+        raw = "%s:%s:%sx%s:%s" % (content_hash, scale, size[0], size[1], direction)
+        return sha1(raw.encode('utf-8')).hexdigest()
+
+    def _path_for(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def __contains__(self, key):
+        return bool(key) and os.path.isfile(self._path_for(key))
+
+    def get(self, key, default = None):
+        if not key:
+            return default
+        fn = self._path_for(key)
+        try:
+            with open(fn, 'rb') as f:
+                header = f.readline().decode('ascii').split()
+                image = f.read()
+            os.utime(fn, None)
+        except (IOError, OSError):
+            return default
+        try:
+            image_type, width, height = header
+            return Thumbnail(image, size = (int(width), int(height)), image_type = image_type)
+        except ValueError:
+            logger.warning("Removing broken thumbnail %s", fn)
+            self._remove(fn)
+            return default
+
+    def put(self, key, thumb):
+        if not key:
+            return
+        fn = self._path_for(key)
+        dirname = os.path.dirname(fn)
+        try:
+            os.makedirs(dirname)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+        header = "%s %s %s\n" % (thumb.image_type, thumb.width, thumb.height)
+        tmp_fn = "%s.%s.tmp" % (fn, uuid4().hex)
+        with open(tmp_fn, 'wb') as f:
+            f.write(header.encode('ascii'))
+            f.write(thumb.image)
+        #Atomic, so other processes never read a partly written file
+        os.rename(tmp_fn, fn)
+        if self.max_size:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += len(thumb.image) + len(header)
+            if self._size > self.max_size:
+                self.evict()
+
+    def _files(self):
+        for (dirpath, dirnames, filenames) in os.walk(self.path):
+            for name in filenames:
+                if name.endswith('.tmp'):
+                    continue
+                fn = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(fn)
+                except OSError: #pragma: no coverage
+                    #Removed by another process
+                    continue
+                yield fn, stat
+
+    def size(self):
+        return sum(stat.st_size for (fn, stat) in self._files())
+
+    def evict(self):
+        """ Remove the least recently used files until the store is below 90% of max_size.
+            Return the number of removed files.
+        """
+        files = sorted(self._files(), key = lambda x: x[1].st_mtime)
+        total = sum(stat.st_size for (fn, stat) in files)
+        target = self.max_size * 0.9
+        removed = 0
+        for (fn, stat) in files:
+            if total <= target:
+                break
+            self._remove(fn)
+            total -= stat.st_size
+            removed += 1
+        self._size = total
+        return removed
+
+    def clear(self):
+        for (fn, stat) in list(self._files()):
+            self._remove(fn)
+        self._size = 0
+
+    def _remove(self, fn):
+        try:
+            os.remove(fn)
+        except OSError: #pragma: no coverage
+            pass
 
 
 def includeme(config):
@@ -153,3 +384,8 @@ def includeme(config):
     config.add_request_method(thumb_tag, name = 'thumb_tag')
     thumb_cache = ThumbCache(100)
     config.registry.registerUtility(thumb_cache)
+    settings = config.registry.settings
+    cache_dir = settings.get('arche.thumbnails.cache_dir', '')
+    if cache_dir:
+        max_size = int(settings.get('arche.thumbnails.cache_max_size', 0))
+        config.registry.registerUtility(ThumbStore(cache_dir, max_size = max_size * 1024 * 1024))
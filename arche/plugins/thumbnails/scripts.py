@@ -0,0 +1,59 @@
+from __future__ import unicode_literals
+
+import argparse
+
+from arche.interfaces import IThumbnailedContent
+from arche.interfaces import IThumbnails
+from arche.interfaces import IThumbnailsStore
+from arche.scripting import default_parser
+from arche.utils import find_all_db_objects
+from arche.utils import get_image_scales
+
+
+def pregenerate_thumbnails_script(env, parsed_ns):
+    """ Create thumbnails for all images in the thumbnail store.
+    """
+    root, registry = env['root'], env['registry']
+    if registry.queryUtility(IThumbnailsStore) is None:
+        print ("-- No thumbnail store configured. Set 'arche.thumbnails.cache_dir' first.")
+        return
+    scales = get_image_scales(registry)
+    if parsed_ns.scales:
+        scales = [x for x in parsed_ns.scales if x in scales]
+    directions = parsed_ns.directions or ['thumbnail']
+    print ("-- Creating thumbnails for scales: %s" % ", ".join(sorted(scales)))
+    objects = 0
+    created = 0
+    for obj in find_all_db_objects(root):
+        if not IThumbnailedContent.providedBy(obj):
+            continue
+        thumbnails = registry.queryAdapter(obj, IThumbnails)
+        if thumbnails is None:
+            continue
+        objects += 1
+        for scale in scales:
+            for direction in directions:
+                if thumbnails.get_thumb(scale, direction = direction):
+                    created += 1
+        if objects % 100 == 0:
+            print ("-- %s objects processed" % objects)
+    print ("-- Done. %s thumbnails for %s objects in the store." % (created, objects))
+
+
+def includeme(config):
+    config.include('arche.scripting')
+    parser = argparse.ArgumentParser(parents=[default_parser])
+    parser.add_argument("-s", "--scale", dest='scales',
+                        action='append',
+                        help="Scale to create. Defaults to all configured scales.")
+    parser.add_argument("--direction", dest='directions',
+                        action='append',
+                        choices=['thumbnail', 'down', 'up'],
+                        help="Scale direction to create. Defaults to 'thumbnail'.")
+    config.add_script(
+        pregenerate_thumbnails_script,
+        name='pregenerate_thumbnails',
+        title="Create thumbnails for existing images",
+        argparser=parser,
+        can_commit=False,
+    )
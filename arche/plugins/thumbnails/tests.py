@@ -41,6 +41,39 @@ class ThumbnailsTests(TestCase):
         self.assertIsInstance(obj, self._cut)
 
 
+class ThumbURLTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        self.config.include('arche.models.blob')
+        self.config.include('arche.models.folder')
+        self.config.include('arche.plugins.thumbnails')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def test_same_url_for_row(self):
+        from io import BytesIO
+        from pyramid.request import apply_request_extensions
+        from arche.models.catalog import get_catalog_rows
+        from arche.resources import File
+        from arche.resources import Root
+        root = Root()
+        data = {'fp': BytesIO(b'GIF89a'), 'filename': 'img.gif', 'mimetype': 'image/gif'}
+        root['img'] = File(file_data = data)
+        root['other'] = File(file_data = None)
+        request = testing.DummyRequest()
+        request.root = root
+        apply_request_extensions(request)
+        docids = [root.document_map.docid_for_address(x) for x in ('/img', '/other')]
+        (img_row, other_row) = get_catalog_rows(root, docids, ['thumb_key'])
+        self.assertEqual(request.thumb_url(img_row, 'col-1'), request.thumb_url(root['img'], 'col-1'))
+        self.assertTrue(request.thumb_url(img_row, 'col-1'))
+        self.assertEqual(request.thumb_url(other_row, 'col-1'), None)
+
+
 class ThumbnailsCacheTests(TestCase):
     """ Make sure integration with LRU-cache works
     """
@@ -61,3 +94,307 @@ class ThumbnailsCacheTests(TestCase):
     def test_iface(self):
         cache = self.config.registry.queryUtility(IThumbnailsCache)
         self.failUnless(verifyObject(IThumbnailsCache, cache))
+
+    def test_invalidate_uid(self):
+        from .models import ThumbCache
+        cache = ThumbCache(10)
+        cache.put(('a', 'col-1', 'image', 'thumbnail'), 1)
+        cache.put(('a', 'col-2', 'image', 'thumbnail'), 2)
+        cache.put(('b', 'col-1', 'image', 'thumbnail'), 3)
+        cache.invalidate_uid('a')
+        self.assertEqual(list(cache.data.keys()), [('b', 'col-1', 'image', 'thumbnail')])
+        self.assertEqual(list(cache._uid_keys), ['b'])
+        cache.invalidate(('b', 'col-1', 'image', 'thumbnail'))
+        self.assertEqual(cache._uid_keys, {})
+
+    def test_index_pruned_after_evictions(self):
+        from .models import ThumbCache
+        cache = ThumbCache(2)
+        for i in range(10):
+            cache.put((i, 'col-1', 'image', 'thumbnail'), i)
+        self.assertLessEqual(len(cache._uid_keys), 4)
+        self.assertTrue(set(k[0] for k in cache.data) <= set(cache._uid_keys))
+
+    def test_invalidate_only_when_blob_changed(self):
+        from arche.events import ObjectUpdatedEvent
+        from .models import invalidate_thumbs_in_context
+        @implementer(IThumbnailedContent)
+        class _Dummy(testing.DummyModel):
+            uid = 'a'
+        cache = self.config.registry.queryUtility(IThumbnailsCache)
+        context = _Dummy()
+        cache.put(('a', 'col-1', 'image', 'thumbnail'), 1)
+        invalidate_thumbs_in_context(context, ObjectUpdatedEvent(context, changed = ['title']))
+        self.assertEqual(len(cache.data), 1)
+        invalidate_thumbs_in_context(context, ObjectUpdatedEvent(context, changed = ['title', 'image_data']))
+        self.assertEqual(len(cache.data), 0)
+        cache.put(('a', 'col-1', 'image', 'thumbnail'), 1)
+        invalidate_thumbs_in_context(context, ObjectUpdatedEvent(context))
+        self.assertEqual(len(cache.data), 0)
+
+
+def _png_data(size = (200, 100)):
+    from io import BytesIO
+    from PIL import Image
+    out = BytesIO()
+    Image.new('RGB', size, (255, 0, 0)).save(out, 'PNG')
+    out.seek(0)
+    return out
+
+
+def _blobfile(context):
+    from arche.interfaces import IBlobs
+    return IBlobs(context)['file']
+
+
+class ThumbStoreTests(TestCase):
+
+    def setUp(self):
+        from tempfile import mkdtemp
+        self.path = mkdtemp()
+
+    def tearDown(self):
+        from shutil import rmtree
+        rmtree(self.path)
+
+    @property
+    def _cut(self):
+        from .models import ThumbStore
+        return ThumbStore
+
+    def _thumb(self, data = b'abc'):
+        from .models import Thumbnail
+        return Thumbnail(data, size = (20, 10), image_type = 'png')
+
+    def test_verify_obj(self):
+        from arche.interfaces import IThumbnailsStore
+        self.failUnless(verifyObject(IThumbnailsStore, self._cut(self.path)))
+
+    def test_get_key(self):
+        from arche.models.blob import BlobFile
+        obj = self._cut(self.path)
+        bf = BlobFile()
+        bf.sha256 = 'hash'
+        key = obj.get_key(bf, 'col-1', (60, 120), 'thumbnail')
+        self.assertEqual(key, obj.get_key(bf, 'col-1', (60, 120), 'thumbnail'))
+        self.assertNotEqual(key, obj.get_key(bf, 'col-1', (60, 120), 'down'))
+        self.assertNotEqual(key, obj.get_key(bf, 'col-1', (80, 120), 'thumbnail'))
+        bf.sha256 = 'other'
+        self.assertNotEqual(key, obj.get_key(bf, 'col-1', (60, 120), 'thumbnail'))
+
+    def test_put_get(self):
+        obj = self._cut(self.path)
+        obj.put('abcdef', self._thumb())
+        thumb = obj.get('abcdef')
+        self.assertEqual(thumb.image, b'abc')
+        self.assertEqual((thumb.width, thumb.height), (20, 10))
+        self.assertEqual(thumb.mimetype, 'image/png')
+        self.assertEqual(obj.get('404'), None)
+
+    def test_shared_between_instances(self):
+        self._cut(self.path).put('abcdef', self._thumb())
+        self.assertEqual(self._cut(self.path).get('abcdef').image, b'abc')
+
+    def test_evict_least_recently_used(self):
+        import os
+        obj = self._cut(self.path, max_size = 0)
+        for (i, key) in enumerate(['aa1', 'aa2', 'aa3']):
+            obj.put(key, self._thumb(b'x' * 100))
+            fn = obj._path_for(key)
+            os.utime(fn, (1000 + i, 1000 + i))
+        #Reading makes it the most recently used
+        obj.get('aa1')
+        obj.max_size = obj.size() - 1
+        self.assertEqual(obj.evict(), 1)
+        self.assertEqual(obj.get('aa2'), None)
+        self.assertTrue(obj.get('aa1'))
+        self.assertTrue(obj.get('aa3'))
+
+    def test_put_evicts(self):
+        obj = self._cut(self.path, max_size = 250)
+        for key in ['aa1', 'aa2', 'aa3']:
+            obj.put(key, self._thumb(b'x' * 100))
+        self.assertLessEqual(obj.size(), 250)
+
+    def test_clear(self):
+        obj = self._cut(self.path)
+        obj.put('abcdef', self._thumb())
+        obj.clear()
+        self.assertEqual(obj.size(), 0)
+
+
+class ThumbnailsStoreIntegrationTests(TestCase):
+
+    def setUp(self):
+        from tempfile import mkdtemp
+        self.path = mkdtemp()
+        self.config = testing.setUp(settings = {'arche.thumbnails.cache_dir': self.path,
+                                                'arche.thumbnails.cache_max_size': '10'})
+        self.config.include('arche.testing')
+        self.config.include('arche.models.blob')
+        self.config.include('arche.models.folder')
+        self.config.include('arche.plugins.thumbnails')
+
+    def tearDown(self):
+        from shutil import rmtree
+        testing.tearDown()
+        rmtree(self.path)
+
+    def _fixture(self):
+        from arche.interfaces import IBase
+        from arche.interfaces import IBlobs
+        @implementer(IThumbnailedContent, IBase)
+        class _Dummy(testing.DummyModel):
+            blob_key = 'file'
+        context = _Dummy(uid = 'uid')
+        IBlobs(context).create_from_formdata('file', {
+            'fp': _png_data(), 'filename': 'img.png', 'mimetype': 'image/png'})
+        return context
+
+    def test_store_registered(self):
+        from arche.interfaces import IThumbnailsStore
+        store = self.config.registry.queryUtility(IThumbnailsStore)
+        self.assertEqual(store.path, self.path)
+        self.assertEqual(store.max_size, 10 * 1024 * 1024)
+
+    def test_get_thumb_uses_store(self):
+        from arche.interfaces import IThumbnailsStore
+        context = self._fixture()
+        thumbs = IThumbnails(context)
+        thumb = thumbs.get_thumb('col-1')
+        self.assertEqual(thumb.width, 60)
+        store = self.config.registry.queryUtility(IThumbnailsStore)
+        self.assertEqual(len(list(store._files())), 1)
+        thumbs.thumb_cache.clear()
+        store.put = None #Shouldn't be called again
+        self.assertEqual(thumbs.get_thumb('col-1').image, thumb.image)
+
+    def test_pregenerate_script(self):
+        from argparse import Namespace
+        from arche.interfaces import IThumbnailsStore
+        from .scripts import pregenerate_thumbnails_script
+        root = testing.DummyModel()
+        root['img'] = self._fixture()
+        env = {'root': root, 'registry': self.config.registry}
+        pregenerate_thumbnails_script(env, Namespace(scales = ['mini', 'col-1'], directions = ['thumbnail', 'down']))
+        store = self.config.registry.queryUtility(IThumbnailsStore)
+        self.assertEqual(len(list(store._files())), 4)
+
+
+class ThumbnailWorkersTests(TestCase):
+
+    def setUp(self):
+        from tempfile import mkdtemp
+        self.path = mkdtemp()
+        self.config = testing.setUp(settings = {'arche.thumbnails.cache_dir': self.path + '/thumbs',
+                                                'arche.thumbnails.workers': '1'})
+        self.config.include('arche.testing')
+        self.config.include('arche.models.blob')
+        self.config.include('arche.models.folder')
+        self.config.include('arche.plugins.thumbnails')
+
+    def tearDown(self):
+        from shutil import rmtree
+        import transaction
+        transaction.abort()
+        testing.tearDown()
+        rmtree(self.path)
+
+    @property
+    def workers(self):
+        from arche.interfaces import IThumbnailWorkers
+        return self.config.registry.queryUtility(IThumbnailWorkers)
+
+    def _committed_fixture(self):
+        from ZODB import DB
+        from ZODB.MappingStorage import MappingStorage
+        from ZODB.blob import BlobStorage
+        from arche.resources import File
+        import transaction
+        db = DB(BlobStorage(self.path + '/blobs', MappingStorage()))
+        self.addCleanup(db.close)
+        conn = db.open()
+        self.addCleanup(conn.close)
+        context = File(file_data = {'fp': _png_data(), 'filename': 'img.png', 'mimetype': 'image/png'})
+        conn.root()['img'] = context
+        transaction.commit()
+        return context
+
+    def test_verify_obj(self):
+        from arche.interfaces import IThumbnailWorkers
+        self.failUnless(verifyObject(IThumbnailWorkers, self.workers))
+
+    def test_not_registered_without_store(self):
+        from arche.interfaces import IThumbnailWorkers
+        testing.tearDown()
+        self.config = testing.setUp(settings = {'arche.thumbnails.workers': '1'})
+        self.config.include('arche.testing')
+        self.config.include('arche.models.folder')
+        self.config.include('arche.plugins.thumbnails')
+        self.assertEqual(self.config.registry.queryUtility(IThumbnailWorkers), None)
+
+    def test_enqueue_thumbnails(self):
+        from .workers import enqueue_thumbnails
+        from arche.utils import get_image_scales
+        context = self._committed_fixture()
+        workers = self.workers
+        self.assertEqual(enqueue_thumbnails(context, workers), len(get_image_scales()))
+        workers.join()
+        self.assertFalse(workers.pending)
+        self.assertEqual(len(list(workers.store._files())), len(get_image_scales()))
+        #Already created
+        self.assertEqual(enqueue_thumbnails(context, workers), 0)
+
+    def test_enqueue_uncommitted(self):
+        from .workers import enqueue_thumbnails
+        from arche.interfaces import IBase
+        from arche.interfaces import IBlobs
+        @implementer(IThumbnailedContent, IBase)
+        class _Dummy(testing.DummyModel):
+            blob_key = 'file'
+        context = _Dummy()
+        IBlobs(context).create_from_formdata('file', {
+            'fp': _png_data(), 'filename': 'img.png', 'mimetype': 'image/png'})
+        self.assertEqual(enqueue_thumbnails(context, self.workers), 0)
+
+    def test_subscriber_enqueues_after_commit(self):
+        from arche.events import ObjectUpdatedEvent
+        from zope.component.event import objectEventNotify
+        import transaction
+        context = self._committed_fixture()
+        objectEventNotify(ObjectUpdatedEvent(context))
+        self.assertFalse(self.workers.pending)
+        transaction.commit()
+        self.workers.join()
+        self.assertTrue(IThumbnails(context).get_thumb('col-1', create = False))
+
+    def test_subscriber_ignores_other_changes(self):
+        from arche.events import ObjectUpdatedEvent
+        from zope.component.event import objectEventNotify
+        import transaction
+        context = self._committed_fixture()
+        objectEventNotify(ObjectUpdatedEvent(context, changed = ['title']))
+        transaction.commit()
+        self.assertFalse(self.workers.threads)
+
+    def test_pending(self):
+        context = self._committed_fixture()
+        thumbs = IThumbnails(context)
+        self.assertFalse(thumbs.is_pending('col-1'))
+        storekey = self.workers.store.get_key(_blobfile(context), 'col-1', (60, 120), 'thumbnail')
+        self.workers.pending.add(storekey)
+        self.assertTrue(thumbs.is_pending('col-1'))
+        self.assertEqual(thumbs.get_thumb('col-1', create = False), None)
+
+    def test_thumb_view_placeholder(self):
+        from .views import thumb_view
+        context = self._committed_fixture()
+        storekey = self.workers.store.get_key(_blobfile(context), 'col-1', (60, 120), 'thumbnail')
+        self.workers.pending.add(storekey)
+        request = testing.DummyRequest()
+        response = thumb_view(context, request, subpath = ('file', 'col-1', 'thumbnail'))
+        self.assertEqual(response.content_type, 'image/gif')
+        self.assertTrue(response.cache_control.no_cache)
+        self.workers.pending.clear()
+        response = thumb_view(context, request, subpath = ('file', 'col-1', 'thumbnail'))
+        self.assertEqual(response.content_type.lower(), 'image/png')
@@ -1,3 +1,4 @@
+from base64 import b64decode
 import datetime
 
 from pyramid.httpexceptions import HTTPNotFound
@@ -12,6 +13,19 @@ from arche.utils import get_image_scales
 from arche.views.base import ContentView
 
 
+#A transparent 1x1 gif
+_PLACEHOLDER = b64decode(b'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+
+def placeholder_response():
+    """ Returned while a thumbnail is being created in the background. It must never be cached. """
+    response = Response(body=_PLACEHOLDER, content_type='image/gif')
+    response.cache_control.no_cache = True
+    response.cache_control.prevent_auto = True
+    response.headers['Retry-After'] = '1'
+    return response
+
+
 def thumb_view(context, request, subpath=None):
     if subpath is None:
         subpath = request.subpath
@@ -31,7 +45,8 @@ def thumb_view(context, request, subpath=None):
     if not thumbnails:
         # Log?
         raise HTTPNotFound()
-    thumb = thumbnails.get_thumb(scale_name, key=key, direction=direction)
+    pending = thumbnails.is_pending(scale_name, key=key, direction=direction)
+    thumb = thumbnails.get_thumb(scale_name, key=key, direction=direction, create=not pending)
     if thumb:
         response =  Response(
             body=thumb.image,
@@ -43,6 +58,8 @@ def thumb_view(context, request, subpath=None):
         if response.etag is None:
             response.md5_etag()
         return response
+    if pending:
+        return placeholder_response()
     raise HTTPNotFound()
 
 
@@ -0,0 +1,133 @@
+import threading
+
+from six.moves.queue import Queue
+from ZODB.interfaces import BlobError
+from pyramid.threadlocal import get_current_registry
+from zope.interface import implementer
+import transaction
+
+from arche import logger
+from arche.interfaces import IBlobs
+from arche.interfaces import IObjectAddedEvent
+from arche.interfaces import IObjectUpdatedEvent
+from arche.interfaces import IThumbnailedContent
+from arche.interfaces import IThumbnailsStore
+from arche.interfaces import IThumbnailWorkers
+from arche.plugins.thumbnails.models import blob_changed
+from arche.plugins.thumbnails.models import create_thumbnail
+from arche.utils import get_image_scales
+
+
+@implementer(IThumbnailWorkers)
+class ThumbnailWorkers(object):
+    """ A pool of threads that create thumbnails in the background.
+        Threads are started the first time something is queued, so they'll work with
+        servers that fork.
+
+        Workers read committed blob files directly from disk and never touch the database.
+    """
+
+    def __init__(self, store, workers = 2):
+        self.store = store
+        self.workers = workers
+        self.queue = Queue()
+        self.pending = set()
+        self.threads = []
+        self._lock = threading.Lock()
+
+    def enqueue(self, storekey, filename, size, direction = "thumbnail"):
+        with self._lock:
+            if storekey in self.pending:
+                return False
+            self.pending.add(storekey)
+            if not self.threads:
+                self._start()
+        self.queue.put((storekey, filename, size, direction))
+        return True
+
+    def is_pending(self, storekey):
+        return storekey in self.pending
+
+    def join(self):
+        self.queue.join()
+
+    def process(self, storekey, filename, size, direction):
+        try:
+            if storekey in self.store:
+                return
+            with open(filename, 'rb') as f:
+                thumb = create_thumbnail(f, size, direction = direction)
+            if thumb:
+                self.store.put(storekey, thumb)
+        finally:
+            self.pending.discard(storekey)
+
+    def _start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target = self._run, name = "thumbnail-worker-%s" % i)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self.process(*job)
+            except Exception:
+                logger.exception("Thumbnail worker failed to process %s", job[1])
+            finally:
+                self.queue.task_done()
+
+
+def enqueue_thumbnails(context, workers, registry = None):
+    """ Queue all configured scales for the blob within context.
+        The blob must be committed. Returns the number of queued thumbnails.
+    """
+    if registry is None:
+        registry = get_current_registry()
+    blobfile = IBlobs(context, {}).get(getattr(context, 'blob_key', 'image'), None)
+    if blobfile is None or blobfile.mimetype not in registry.settings['supported_thumbnail_mimetypes']:
+        return 0
+    try:
+        filename = blobfile.blob.committed()
+    except BlobError:
+        return 0
+    queued = 0
+    for (scale, size) in get_image_scales(registry).items():
+        storekey = workers.store.get_key(blobfile, scale, size, "thumbnail")
+        if storekey in workers.store:
+            continue
+        if workers.enqueue(storekey, filename, size):
+            queued += 1
+    return queued
+
+
+def enqueue_thumbnails_subscriber(context, event):
+    """ Create thumbnails in the background when the transaction has been committed.
+    """
+    if IObjectUpdatedEvent.providedBy(event) and not blob_changed(event):
+        return
+    registry = get_current_registry()
+    workers = registry.queryUtility(IThumbnailWorkers)
+    if workers is None:
+        return
+    def hook(success):
+        if success:
+            enqueue_thumbnails(context, workers, registry = registry)
+    transaction.get().addAfterCommitHook(hook)
+
+
+def includeme(config):
+    settings = config.registry.settings
+    workers = int(settings.get('arche.thumbnails.workers', 0))
+    if not workers:
+        return
+    store = config.registry.queryUtility(IThumbnailsStore)
+    if store is None:
+        logger.warning("'arche.thumbnails.workers' requires 'arche.thumbnails.cache_dir' - "
+                       "thumbnails will be created when they're requested instead.")
+        return
+    config.registry.registerUtility(ThumbnailWorkers(store, workers = workers))
+    config.add_subscriber(enqueue_thumbnails_subscriber, [IThumbnailedContent, IObjectAddedEvent])
+    config.add_subscriber(enqueue_thumbnails_subscriber, [IThumbnailedContent, IObjectUpdatedEvent])
@@ -19,6 +19,7 @@ from arche.interfaces import IContent
 from arche.interfaces import IPortlet
 from arche.interfaces import IPortletManager
 from arche.interfaces import IPortletType
+from arche.portlets.cache import render_cached
 from arche.utils import get_content_factories
 
 
@@ -29,6 +30,7 @@ class PortletType(object):
     schema_factory = None
     title = ""
     tpl = ""
+    cacheable = False #Output only depends on the portlet, context and principals. See arche.portlets.cache
     
     def __init__(self, portlet):
         self.portlet = portlet
@@ -70,6 +72,7 @@ class Portlet(Persistent):
     portlet_type = u""
     add_permission = "Add %s" % type_name
     enabled = True
+    cache_version = 0
 
     def __init__(self, portlet_type, **kw):
         self.uid = text_type(uuid4())
@@ -96,6 +99,7 @@ class Portlet(Persistent):
     def settings(self, value):
         self.__settings__.clear()
         self.__settings__.update(value)
+        self.cache_version += 1
 
     @property
     def schema_factory(self):
@@ -118,7 +122,7 @@ class Portlet(Persistent):
 
     def render(self, context, request, view, **kw):
         try:
-            return self.portlet_adapter.render(context, request, view, **kw)
+            return render_cached(self, self.portlet_adapter, context, request, view, **kw)
         except ComponentLookupError:
             logger.error("portlet %r not found for context %r" % (self.portlet_type, context))
         return ""
@@ -224,6 +228,22 @@ def get_portlet_manager(context, registry = None):
     return registry.queryAdapter(context, IPortletManager)    
 
 
+def get_slot_portlets(context, registry = None):
+    """ Walk the lineage of context once and collect enabled portlets per slot.
+        Portlets from context come first, then the ones from its parents.
+    """
+    if registry is None:
+        registry = get_current_registry()
+    results = {}
+    while context:
+        manager = get_portlet_manager(context, registry)
+        if manager:
+            for (slot, portlets) in manager.items():
+                results.setdefault(slot, []).extend(x for x in portlets.values() if x.enabled)
+        context = getattr(context, '__parent__', None)
+    return results
+
+
 def get_available_portlets(registry = None):
     if registry is None:
         registry = get_current_registry()
@@ -246,6 +266,7 @@ def includeme(config):
     config.add_directive('add_portlet_slot', add_portlet_slot)
     config.registry.portlet_slots = {}
     config.registry.registerAdapter(PortletManager, provided=IPortletManager)
+    config.include('.cache')
     config.add_portlet_slot('left', title = _("Left"), layout = 'vertical')
     config.add_portlet_slot('right', title = _("Right"), layout = 'vertical')
     config.add_portlet_slot('top', title = _("Top"), layout = 'horizontal')
@@ -18,7 +18,7 @@ class BylinePortlet(PortletType):
 
     def render(self, context, request, view, **kwargs):
         if not getattr(context, 'show_byline', False):
-            return
+            return ""
         creator = getattr(context, 'creator', ())
         out = ""
         for userid in creator:
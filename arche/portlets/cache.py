@@ -0,0 +1,83 @@
+""" Cache for rendered portlets. Enabled with 'arche.portlet_cache'.
+
+    Output is cached per portlet, context, the users principals, locale and
+    application url, along with a version counter on the context. Content events bump the counter
+    on the object and its parent, since portlets like navigation and contents
+    show the children of their context. Only portlet types with cacheable set
+    are cached, since the counters can't track everything a portlet might show.
+"""
+from __future__ import unicode_literals
+
+from BTrees.Length import Length
+from pyramid.traversal import resource_path
+from repoze.lru import LRUCache
+
+from arche.interfaces import IBase
+from arche.interfaces import IObjectAddedEvent
+from arche.interfaces import IObjectUpdatedEvent
+from arche.interfaces import IObjectWillBeRemovedEvent
+from arche.interfaces import IWorkflowAfterTransition
+
+
+_marker = object()
+
+
+def get_portlet_version(context):
+    """ Returns the version of context as a tuple.
+        The serial of the counter makes sure versions from aborted transactions can't be reused.
+    """
+    counter = getattr(context, '__portlet_version__', None)
+    if counter is None:
+        return (0, None)
+    return (counter(), counter._p_serial)
+
+
+def bump_portlet_version(context):
+    try:
+        counter = context.__portlet_version__
+    except AttributeError:
+        # Length resolves conflicts, so concurrent changes within a folder are fine
+        counter = context.__portlet_version__ = Length()
+    counter.change(1)
+
+
+def portlet_cache_key(portlet, context, request):
+    if request.authenticated_userid is None:
+        principals = 'anonymous'
+    else:
+        principals = tuple(sorted(request.effective_principals))
+    context_id = getattr(context, 'uid', None) or resource_path(context)
+    return (portlet.uid, portlet.cache_version, context_id, get_portlet_version(context),
+            principals, request.locale_name, request.application_url)
+
+
+def render_cached(portlet, portlet_type, context, request, view, **kw):
+    """ Render the portlet, or return the cached output if the portlet type is cacheable. """
+    cache = getattr(request.registry, 'portlet_cache', None)
+    if cache is None or kw or not portlet_type.cacheable:
+        return portlet_type.render(context, request, view, **kw)
+    key = portlet_cache_key(portlet, context, request)
+    output = cache.get(key, _marker)
+    if output is _marker:
+        output = portlet_type.render(context, request, view)
+        cache.put(key, output)
+    return output
+
+
+def bump_versions_subscriber(context, event):
+    """ Bump the parent, and the object itself if it was changed. """
+    if IObjectUpdatedEvent.providedBy(event) or IWorkflowAfterTransition.providedBy(event):
+        bump_portlet_version(context)
+    parent = getattr(context, '__parent__', None)
+    if parent is not None:
+        bump_portlet_version(parent)
+
+
+def includeme(config):
+    size = int(config.registry.settings.get('arche.portlet_cache', 0))
+    config.registry.portlet_cache = None
+    if size > 0:
+        config.registry.portlet_cache = LRUCache(size)
+        for iface in (IObjectAddedEvent, IObjectUpdatedEvent,
+                      IObjectWillBeRemovedEvent, IWorkflowAfterTransition):
+            config.add_subscriber(bump_versions_subscriber, [IBase, iface])
@@ -8,7 +8,6 @@ from pyramid.renderers import render
 
 from arche.portlets import PortletType
 from arche import _
-from arche.security import PERM_VIEW
 
 
 @colander.deferred
@@ -61,6 +60,13 @@ class ContentsPortletSchema(colander.Schema):
         title = _("Only show these states"),
         widget=limit_states_widget,
     )
+    limit = colander.SchemaNode(
+        colander.Int(),
+        title = _("Max number of items"),
+        default = 20,
+        missing = 20,
+        validator = colander.Range(min = 1),
+    )
 
 
 class ContentsPortlet(PortletType):
@@ -68,25 +74,38 @@ class ContentsPortlet(PortletType):
     schema_factory = ContentsPortletSchema
     title = _(u"Contents")
     tpl = "arche:templates/portlets/contents.pt"
+    cacheable = True
 
     def get_contents(self, context, request):
         if self.portlet.settings.get('limit_to_this_context', False):
             if context != self.context:
-                raise StopIteration()
-        # FIXME: Implement batching on really large folders
+                return
+        filters = {}
         limit_types = self.portlet.settings.get('limit_types', ())
+        if limit_types:
+            filters['type_name'] = limit_types
         limit_states = self.portlet.settings.get('limit_states', ())
-        for obj in context.values():
-            if not request.has_permission(PERM_VIEW, obj):
-                continue
-            if limit_types and obj.type_name not in limit_types:
-                continue
-            if limit_states:
-                wf = getattr(obj, 'workflow', '')
-                wf_st_name = "%s:%s" % (getattr(wf, 'name', ''), getattr(obj, 'wf_state', ''))
-                if wf_st_name not in limit_states:
-                    continue
-            yield obj
+        if limit_states:
+            # Narrow down on workflows and states in the query, the combination is checked below
+            filters['workflow'] = set(x.split(':', 1)[0] for x in limit_states)
+            filters['wf_state'] = set(x.split(':', 1)[-1] for x in limit_states)
+        limit = self.portlet.settings.get('limit', 20)
+        found = 0
+        start = 0
+        while start is not None:
+            batch = request.folder_batch(context, start = start, limit = limit, filters = filters)
+            for obj in batch:
+                if limit_states:
+                    wf = getattr(obj, 'workflow', '')
+                    wf_st_name = "%s:%s" % (getattr(wf, 'name', ''), getattr(obj, 'wf_state', ''))
+                    if wf_st_name not in limit_states:
+                        continue
+                yield obj
+                found += 1
+                if found >= limit:
+                    return
+            # Keep going until limit objects with the right combination are found
+            start = batch.next_start
 
     def visible(self, context, request, view, **kwargs):
         # Just get one to check if this should be visible
@@ -103,6 +122,7 @@ class ContentsPortlet(PortletType):
             return render(self.tpl,
                           values,
                           request = request)
+        return ""
 
 
 def includeme(config):
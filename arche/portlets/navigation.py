@@ -14,6 +14,7 @@ class NavigationPortlet(PortletType):
     schema_factory = NavSchema
     title = _(u"Navigation")
     tpl = "arche:templates/portlets/navigation.pt"
+    cacheable = True
 
     def visible(self, context, request, view, **kwargs):
         if context is view.root:
@@ -24,11 +25,14 @@ class NavigationPortlet(PortletType):
         return False
 
     def render(self, context, request, view, **kwargs):
+        if context is view.root:
+            return u""
         contents = tuple(view.get_local_nav_objects(context))
         if contents:
             return render(self.tpl,
                           {'title': self.title, 'contents': contents, 'portlet': self.portlet},
                           request = request)
+        return u""
 
 
 def includeme(config):
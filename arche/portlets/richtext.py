@@ -46,6 +46,7 @@ class RichtextPortlet(PortletType):
     schema_factory = RichtextPortletSchema
     title = _("Richtext")
     tpl = "arche:templates/portlets/richtext.pt"
+    cacheable = True
 
     def visible(self, context, request, view, **kwargs):
         settings = self.portlet.settings
@@ -63,6 +64,7 @@ class RichtextPortlet(PortletType):
             return render(self.tpl,
                           values,
                           request = request)
+        return ""
 
 
 def includeme(config):
@@ -0,0 +1,108 @@
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from pyramid import testing
+from pyramid.request import apply_request_extensions
+from zope.component.event import objectEventNotify
+
+
+class PortletCacheTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp(settings = {'arche.portlet_cache': 10})
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.portlets')
+        from arche.portlets import PortletType
+        self.rendered = rendered = []
+        class _CachedPortlet(PortletType):
+            name = 'cached'
+            cacheable = True
+            def render(self, context, request, view, **kw):
+                rendered.append(context)
+                return self.portlet.settings.get('output', 'Hello')
+        class _UncachedPortlet(_CachedPortlet):
+            name = 'uncached'
+            cacheable = False
+        self.config.add_portlet(_CachedPortlet)
+        self.config.add_portlet(_UncachedPortlet)
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def _fixture(self, portlet_type = 'cached'):
+        from arche.portlets import get_portlet_manager
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        root['doc'] = Document()
+        self.portlet = get_portlet_manager(root).add('left', portlet_type)
+        return root
+
+    def _render(self, context, userid = None):
+        from arche.testing import setup_auth
+        setup_auth(self.config, userid = userid)
+        request = testing.DummyRequest()
+        request.context = context
+        apply_request_extensions(request)
+        return self.portlet.render(context, request, None)
+
+    def test_cached(self):
+        root = self._fixture()
+        self.assertEqual(self._render(root['doc']), 'Hello')
+        self.assertEqual(self._render(root['doc']), 'Hello')
+        self.assertEqual(len(self.rendered), 1)
+        self._render(root)
+        self.assertEqual(len(self.rendered), 2)
+
+    def test_not_cacheable(self):
+        root = self._fixture('uncached')
+        self._render(root['doc'])
+        self._render(root['doc'])
+        self.assertEqual(len(self.rendered), 2)
+
+    def test_principals(self):
+        root = self._fixture()
+        self._render(root['doc'])
+        self._render(root['doc'], userid = 'jane')
+        self._render(root['doc'], userid = 'jane')
+        self._render(root['doc'], userid = 'john')
+        self.assertEqual(len(self.rendered), 3)
+
+    def test_added_child_invalidates(self):
+        from arche.resources import Document
+        root = self._fixture()
+        self._render(root['doc'])
+        root['doc']['child'] = Document()
+        self._render(root['doc'])
+        self.assertEqual(len(self.rendered), 2)
+
+    def test_updated_child_invalidates_parent(self):
+        from arche.events import ObjectUpdatedEvent
+        root = self._fixture()
+        self._render(root)
+        self._render(root['doc'])
+        objectEventNotify(ObjectUpdatedEvent(root['doc']))
+        self._render(root)
+        self._render(root['doc'])
+        self.assertEqual(len(self.rendered), 4)
+
+    def test_removed_child_invalidates(self):
+        root = self._fixture()
+        self._render(root)
+        del root['doc']
+        self._render(root)
+        self.assertEqual(len(self.rendered), 2)
+
+    def test_settings_invalidate(self):
+        root = self._fixture()
+        self._render(root['doc'])
+        self.portlet.settings = {'output': 'Changed'}
+        self.assertEqual(self._render(root['doc']), 'Changed')
+
+    def test_disabled(self):
+        self.config.registry.portlet_cache = None
+        root = self._fixture()
+        self._render(root['doc'])
+        self._render(root['doc'])
+        self.assertEqual(len(self.rendered), 2)
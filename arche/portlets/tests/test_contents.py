@@ -0,0 +1,61 @@
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from pyramid import testing
+from pyramid.request import apply_request_extensions
+
+from arche.resources import Document
+from arche.security import ROLE_ADMIN
+
+
+class _Reviewed(Document):
+    type_name = 'Reviewed'
+
+
+class ContentsPortletTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        self.config.include('arche.testing.workflow')
+        self.config.include('arche.testing.portlets')
+        self.config.include('arche.portlets.contents')
+        self.config.include('arche.models.folder_batch')
+        self.config.set_content_workflow('Document', 'simple_workflow')
+        self.config.add_content_factory(_Reviewed)
+        self.config.set_content_workflow('Reviewed', 'review_workflow')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def _fixture(self):
+        from arche.portlets import get_portlet_manager
+        from arche.testing import barebone_fixture
+        from arche.testing import setup_auth
+        setup_auth(self.config, userid = 'admin')
+        root = barebone_fixture(self.config)
+        root.local_roles['admin'] = [ROLE_ADMIN]
+        for name in ('a', 'b', 'c'):
+            root[name] = Document()
+        root['r'] = _Reviewed()
+        self.portlet = get_portlet_manager(root).add('left', 'contents')
+        return root
+
+    def _mk_request(self, root):
+        request = testing.DummyRequest()
+        request.root = root
+        apply_request_extensions(request)
+        self.config.begin(request)
+        return request
+
+    def test_limit_states_exact_combinations(self):
+        root = self._fixture()
+        request = self._mk_request(root)
+        root['c'].workflow.do_transition('private:public', force = True)
+        # Document has private state too, but not within review_workflow
+        self.portlet.settings = {'limit': 2,
+                                 'limit_states': set(['simple_workflow:public', 'review_workflow:private'])}
+        contents = list(self.portlet.portlet_adapter.get_contents(root, request))
+        self.assertEqual([x.__name__ for x in contents], ['c', 'r'])
@@ -51,6 +51,7 @@ class WorkflowHistoryPortlet(PortletType):
     schema_factory = WorkflowHistoryPortletSchema
     title = _("Workflow history")
     tpl = "arche:templates/portlets/workflow_history.pt"
+    cacheable = True
 
     def visible(self, context, request, view, **kwargs):
         if not ITrackRevisions.providedBy(context):
@@ -79,6 +80,7 @@ class WorkflowHistoryPortlet(PortletType):
                 return render(self.tpl,
                               values,
                               request = request)
+        return ""
 
     def get_state_title(self, workflow, data):
         state = data.get('wf_state', '')
@@ -19,6 +19,7 @@ from zope.component.event import objectEventNotify
 from zope.interface import implementer
 
 from arche import _
+from arche.compat import MutableSet
 from arche.models.catalog import create_catalog
 from arche.events import EmailValidatedEvent
 from arche.events import ObjectUpdatedEvent
@@ -200,9 +201,9 @@ class ContextACLMixin(object):
         wf = self.workflow
         if wf:
             state = wf.state in wf.states and wf.state or wf.initial_state
-            wf_state = "%s:%s" % (wf.name, state)
-            if wf_state in acl_reg:
-                return acl_reg.get_acl(wf_state)
+            acl = acl_reg.get_wf_acl(wf.name, state)
+            if acl is not None:
+                return acl
         if self.type_name in acl_reg:
             return acl_reg.get_acl(self.type_name)
         return acl_reg.get_acl('default')
@@ -554,24 +555,150 @@ class Groups(Content, LocalRolesMixin, ContextACLMixin):
     title = _(u"Groups")
     is_permanent = True
     add_permission = "Add %s" % type_name
+    __member_index__ = None #userid -> OOSet of group names. Built by evolve step for old databases
+
+    def __init__(self, **kwargs):
+        self.__member_index__ = OOBTree()
+        super(Groups, self).__init__(**kwargs)
+
+    def add(self, name, other, send_events = True):
+        super(Groups, self).add(name, other, send_events = send_events)
+        if IGroup.providedBy(other):
+            for userid in other.members:
+                self._index_member(userid, name)
+
+    def remove(self, name, send_events = True):
+        other = self[name]
+        if IGroup.providedBy(other):
+            for userid in other.members:
+                self._unindex_member(userid, name)
+        return super(Groups, self).remove(name, send_events = send_events)
+
+    def _index_member(self, userid, name):
+        if self.__member_index__ is None:
+            return
+        if userid not in self.__member_index__:
+            self.__member_index__[userid] = OOSet()
+        self.__member_index__[userid].add(name)
+        security.clear_principals_cache()
+
+    def _unindex_member(self, userid, name):
+        if self.__member_index__ is None:
+            return
+        names = self.__member_index__.get(userid, None)
+        if names is not None and name in names:
+            names.remove(name)
+            if not names:
+                del self.__member_index__[userid]
+        security.clear_principals_cache()
+
+    def rebuild_member_index(self):
+        self.__member_index__ = OOBTree()
+        for group in self.values():
+            if IGroup.providedBy(group):
+                for userid in group.members:
+                    self._index_member(userid, group.__name__)
 
     def get_users_group_principals(self, userid):
-        groups = set()
-        for group in self.get_users_groups(userid):
-            groups.add(group.principal_name)
-        return groups
+        if self.__member_index__ is None:
+            return set([group.principal_name for group in self.get_users_groups(userid)])
+        return set([Group.principal_format % name for name in self.__member_index__.get(userid, ())])
 
     def get_users_groups(self, userid):
-        #Cache memberships? Needed on sites with many groups
-        for group in self.values():
-            if userid in group.members:
-                yield group
+        if self.__member_index__ is None:
+            for group in self.values():
+                if userid in group.members:
+                    yield group
+        else:
+            for name in self.__member_index__.get(userid, ()):
+                yield self[name]
 
     def get_group_principals(self):
         for group in self.values():
             yield group.principal_name
 
 
+class GroupMembers(MutableSet):
+    """ Wraps the members of a group to keep the member index
+        of the parent Groups object updated.
+        Behaves like a set. Anything else is passed on to the stored OOSet.
+    """
+
+    def __init__(self, group):
+        self.group = group
+        self.data = group.__members__
+
+    @classmethod
+    def _from_iterable(cls, it):
+        # Results of operators like | are regular sets
+        return set(it)
+
+    def __getattr__(self, name):
+        if name in ('group', 'data'):
+            raise AttributeError(name)
+        return getattr(self.data, name)
+
+    def _groups(self):
+        parent = getattr(self.group, '__parent__', None)
+        if IGroups.providedBy(parent) and self.group.__name__ in parent:
+            return parent
+
+    def add(self, userid):
+        if userid not in self.data:
+            self.data.add(userid)
+            groups = self._groups()
+            if groups is not None:
+                groups._index_member(userid, self.group.__name__)
+
+    def insert(self, userid):
+        """ Like OOSet.insert: add userid and return True if it wasn't a member. """
+        if userid in self.data:
+            return False
+        self.add(userid)
+        return True
+
+    def remove(self, userid):
+        self.data.remove(userid)
+        groups = self._groups()
+        if groups is not None:
+            groups._unindex_member(userid, self.group.__name__)
+
+    def discard(self, userid):
+        if userid in self.data:
+            self.remove(userid)
+
+    def update(self, userids):
+        for userid in userids:
+            self.add(userid)
+
+    def clear(self):
+        for userid in tuple(self.data):
+            self.remove(userid)
+
+    def __contains__(self, userid):
+        return userid in self.data
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __eq__(self, other):
+        try:
+            return set(self) == set(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self): #pragma: no coverage
+        return '<%s %r>' % (self.__class__.__name__, tuple(self.data))
+
+
 @implementer(IGroup)
 class Group(Content, LocalRolesMixin, ContextACLMixin):
     type_name = u"Group"
@@ -580,6 +707,7 @@ class Group(Content, LocalRolesMixin, ContextACLMixin):
     title = u""
     description = u""
     css_icon = "glyphicon glyphicon-user" #FIXME no group icon!?
+    principal_format = u"group:%s"
 
     def __init__(self, **kwargs):
         #Things like created, creator etc...
@@ -592,16 +720,21 @@ class Group(Content, LocalRolesMixin, ContextACLMixin):
         """ The way the security system likes to check names
             to avoid collisions with userids.
         """
-        return u"group:%s" % self.__name__
+        return self.principal_format % self.__name__
 
     @property
     def members(self):
-        return self.__members__
+        return GroupMembers(self)
 
     @members.setter
     def members(self, value):
-        self.__members__.clear()
-        self.__members__.update(value)
+        members = GroupMembers(self)
+        value = set(value)
+        for userid in tuple(members):
+            if userid not in value:
+                members.remove(userid)
+        members.update(value)
+        security.clear_principals_cache()
 
 
 @implementer(IToken)
@@ -1,5 +1,6 @@
 
 def includeme(config):
+    config.include('.benchmark')
     config.include('.catalog')
     config.include('.evolver')
     config.include('.passwd')
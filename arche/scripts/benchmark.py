@@ -0,0 +1,29 @@
+from __future__ import unicode_literals
+
+import argparse
+import sys
+
+from arche.benchmarks import benchmark_parser
+from arche.benchmarks import report
+from arche.benchmarks import run_benchmarks
+from arche.scripting import default_parser
+
+
+def benchmark_script(env, parsed_ns):
+    print ("-- Running benchmarks. Nothing will be committed.")
+    results = run_benchmarks(env['root'], env['registry'], names = parsed_ns.names,
+                             rounds = parsed_ns.rounds, sample = parsed_ns.sample,
+                             cold = parsed_ns.cold)
+    if not report(results, parsed_ns):
+        sys.exit(1)
+
+
+def includeme(config):
+    parser = argparse.ArgumentParser(parents=[default_parser, benchmark_parser])
+    config.add_script(
+        benchmark_script,
+        name='benchmark',
+        title="Time the catalog, traversal and security hot paths",
+        argparser=parser,
+        can_commit=False,
+    )
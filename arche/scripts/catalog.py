@@ -1,18 +1,64 @@
 from __future__ import unicode_literals
 
 import argparse
+from json import loads
+from logging import FileHandler
+from operator import itemgetter
+
+import transaction
 
 from arche.exceptions import CatalogNeedsUpdate
 from arche.models.catalog import check_catalog
 from arche.models.catalog import create_catalog
-from arche.models.catalog import reindex_catalog
-from arche.models.catalog import quick_reindex
+from arche.models.catalog import rebuild_index
+from arche.models.query_profiler import profile_logger
+from arche.models.reindexer import clear_checkpoints
+from arche.models.reindexer import create_checkpoints
+from arche.models.reindexer import get_checkpoints
+from arche.models.reindexer import run_checkpoint
+from arche.models.reindexer import run_reindex_workers
 from arche.scripting import default_parser
 
 
-def reindex_catalog_script(env, *args):
-    print ("-- Reindexing catalog without clearing it.")
-    reindex_catalog(env['root'])
+def _run_reindexer(env, parsed_ns, indexes = None, find_missing = False):
+    """ Reindex objects that already exist in the catalog, committing after each chunk.
+        If find_missing is set, objects that aren't cataloged will be added afterwards.
+        Returns False if any worker failed, otherwise True.
+    """
+    root, registry = env['root'], env['registry']
+    commit = not parsed_ns.dry_run
+    checkpoints = get_checkpoints(root)
+    if parsed_ns.resume and checkpoints is not None:
+        print ("-- Resuming previous reindex with %s worker(s)" % len(checkpoints))
+        if indexes is not None and set(checkpoints[0].indexes or ()) != set(indexes):
+            print ("-- NOTE: Using the indexes from the previous run: %s" % (checkpoints[0].indexes,))
+    else:
+        checkpoints = create_checkpoints(root, indexes = indexes, workers = parsed_ns.workers,
+                                         find_missing = find_missing)
+    if len(checkpoints) > 1:
+        if not commit:
+            print ("-- Dry-run can't be used with several workers")
+            return False
+        transaction.commit()
+        failed = run_reindex_workers(parsed_ns.config_uri, len(checkpoints), chunk_size = parsed_ns.chunk_size)
+        # Fetch the workers results
+        transaction.abort()
+        if failed:
+            print ("-- Worker(s) %s failed. Rerun with --resume to continue." % ", ".join(str(x) for x in failed))
+            return False
+    else:
+        run_checkpoint(root, checkpoints[0], registry = registry,
+                       chunk_size = parsed_ns.chunk_size, commit = commit)
+    if checkpoints[0].find_missing:
+        added = sum(cp.added for cp in checkpoints.values())
+        print ("-- %s objects added to the catalog" % added)
+    clear_checkpoints(root)
+    return True
+
+
+def reindex_catalog_script(env, parsed_ns):
+    print ("-- Reindexing catalog without clearing it, then adding objects that aren't cataloged.")
+    _run_reindexer(env, parsed_ns, find_missing = True)
 
 
 def create_catalog_script(env, *args):
@@ -26,8 +72,18 @@ def quick_reindex_script(env, parsed_ns):
         print ("-- Reindexing everything that already exists in the catalog.")
     else:
         print ("-- Reindexing specified indexes")
-    request = env['request']
-    quick_reindex(request, parsed_ns.indexes)
+    if not bool(len(env['root'].document_map.docid_to_address)):
+        raise Exception("There's nothing in the catalog, so quick reindex won't work. "
+                        "Use reindex_catalog command instead.")
+    if parsed_ns.rebuild:
+        if parsed_ns.indexes is None:
+            raise Exception("Specify which indexes to rebuild.")
+        if parsed_ns.resume:
+            raise Exception("Can't resume a rebuild, since that would empty the indexes again.")
+        for name in parsed_ns.indexes:
+            print ("-- Emptying index %s" % name)
+            rebuild_index(env['root'].catalog, name, env['registry'])
+    _run_reindexer(env, parsed_ns, indexes = parsed_ns.indexes)
 
 
 def check_catalog_script(env, *args):
@@ -41,11 +97,57 @@ def check_catalog_script(env, *args):
         raise CatalogNeedsUpdate("The folllowing indexes should be removed: '%s'" % "', '".join(indexes_to_remove))
 
 
+def _profile_log_filename():
+    for handler in profile_logger.handlers:
+        if isinstance(handler, FileHandler):
+            return handler.baseFilename
+
+
+def catalog_profile_script(env, parsed_ns):
+    """ Print the slowest queries logged by the catalog profiler.
+    """
+    filename = parsed_ns.filename or _profile_log_filename()
+    if not filename:
+        print ("-- No file specified, and no FileHandler configured for the logger '%s'" % profile_logger.name)
+        return
+    samples = []
+    with open(filename) as f:
+        for line in f:
+            # The json data may be prefixed by the log format
+            if '{' not in line:
+                continue
+            try:
+                samples.append(loads(line[line.index('{'):]))
+            except ValueError:
+                continue
+    samples.sort(key=itemgetter('time'), reverse=True)
+    print ("-- %s slow queries in %s" % (len(samples), filename))
+    for sample in samples[:parsed_ns.limit]:
+        print ("%.4fs %s results: %s" % (sample['time'], sample['total'], sample['query']))
+        for (name, index_time, size) in sample['indexes']:
+            print ("    %.4fs %s (%s)" % (index_time, name, size))
+
+
+reindex_parser = argparse.ArgumentParser(add_help=False)
+reindex_parser.add_argument("--chunk-size", dest='chunk_size',
+                            type=int, default=500,
+                            help="Objects to process before each commit.")
+reindex_parser.add_argument("--workers", dest='workers',
+                            type=int, default=1,
+                            help="Number of processes to use. Requires a storage that "
+                                 "allows several connections, like ZEO.")
+reindex_parser.add_argument("--resume", dest='resume',
+                            action='store_true',
+                            help="Continue an interrupted reindex from the last commit.")
+
+
 def includeme(config):
+    parser = argparse.ArgumentParser(parents=[default_parser, reindex_parser])
     config.add_script(
         reindex_catalog_script,
         name='reindex_catalog',
         title="Reindex catalog without clearing it first",
+        argparser=parser,
         can_commit=True,
     )
     config.add_script(
@@ -54,10 +156,14 @@ def includeme(config):
         title="Create and reindex catalog",
         can_commit=True,
     )
-    parser = argparse.ArgumentParser(parents=[default_parser])
+    parser = argparse.ArgumentParser(parents=[default_parser, reindex_parser])
     parser.add_argument("-i", dest='indexes',
                         action='append',
                         help="Index names to do quick reindex on.")
+    parser.add_argument("--rebuild", dest='rebuild',
+                        action='store_true',
+                        help="Empty the indexes before reindexing. 'searchable_text' will be "
+                             "recreated with the current search lexicon settings.")
     config.add_script(
         quick_reindex_script,
         name='quick_reindex',
@@ -65,6 +171,20 @@ def includeme(config):
         argparser=parser,
         can_commit=True,
     )
+    parser = argparse.ArgumentParser(parents=[default_parser])
+    parser.add_argument("-f", "--file", dest='filename',
+                        help="Log file with slow queries. Defaults to the file of the "
+                             "'arche.catalog_profiler' logger, if it has one.")
+    parser.add_argument("-n", "--limit", dest='limit',
+                        type=int, default=10,
+                        help="Number of queries to show.")
+    config.add_script(
+        catalog_profile_script,
+        name='catalog_profile',
+        title="Show the slowest catalog queries logged by the profiler",
+        argparser=parser,
+        can_commit=False,
+    )
     config.add_script(
         check_catalog_script,
         name='check_catalog',
@@ -11,12 +11,14 @@ from pyramid.security import (NO_PERMISSION_REQUIRED,
                               ALL_PERMISSIONS,
                               AllPermissionsList)
 from pyramid.threadlocal import get_current_registry
+from pyramid.threadlocal import get_current_request
 from pyramid.traversal import find_root
 from pyramid.interfaces import IAuthenticationPolicy
 from pyramid.interfaces import IAuthorizationPolicy
 
 from arche import _
 from arche import logger
+from arche.interfaces import ILocalRoles
 from arche.interfaces import IRoles
 from arche.models.roles import Role
 
@@ -133,49 +135,139 @@ def context_effective_principals(request, context = None):
         return authn_policy.effective_principals(request)
 
 
+def catalog_principals(request):
+    """ Principals to match against the 'allowed_to_view' catalog index.
+        Local roles below the root are already expanded into userids and groups within
+        the index. Inheritable roles held at the root apply everywhere, so they're kept
+        as roles in the index and the users roles at the root are added here.
+
+        Also available as the reified request property request.catalog_principals
+    """
+    principals = [Everyone]
+    userid = request.authenticated_userid
+    if userid:
+        principals.extend([Authenticated, userid])
+        root = getattr(request, 'root', None)
+        if root is not None and 'groups' in root:
+            principals.extend(root['groups'].get_users_group_principals(userid))
+        if ILocalRoles.providedBy(root):
+            inheritable = get_roles(registry = request.registry, inheritable = True)
+            local_roles = root.local_roles
+            for principal in list(principals):
+                for role in local_roles.get(principal, ()):
+                    if role in inheritable and role not in principals:
+                        principals.append(role)
+    return principals
+
+
+_principals_cache_key = 'arche.principals_cache'
+
+
+def _get_principals_cache(request):
+    try:
+        return request.environ.setdefault(_principals_cache_key, {})
+    except AttributeError:
+        # No environ, for instance some unittests
+        return {}
+
+
+def clear_principals_cache(request = None):
+    """ Clear cached groupfinder results for this request.
+        Needed when local roles or group memberships change during a request.
+    """
+    if request is None:
+        request = get_current_request()
+    try:
+        request.environ.pop(_principals_cache_key, None)
+    except AttributeError:
+        pass
+
+
 def groupfinder(name, request):
     """ This method is called on each request to determine which
         principals a user has.
         Principals are groups, roles, userid and perhaps Authenticated or similar.
 
         This method also calls itself to fetch any local roles for groups.
+
+        Results are cached on the request, per name and context. Since inheritable
+        local roles are cached per ancestor too, objects within the same folder
+        only need to check their own local roles.
     """
     if name is None: #Abort for unauthenticated - no reason to use CPU
         return ()
-    result = set()
     context = request.environ.get(
         'authz_context', getattr(request, 'context', None))
     if not context:
         return ()
-    inherited_roles = get_roles(registry = request.registry, inheritable = True)
+    cache = _get_principals_cache(request)
+    key = (name, id(context))
+    try:
+        # The context is kept within the cache so its id can't be reused during the request
+        return set(cache[key][1])
+    except KeyError:
+        pass
+    try:
+        inherited_roles = cache['inherited_roles']
+    except KeyError:
+        inherited_roles = cache['inherited_roles'] = get_roles(registry = request.registry, inheritable = True)
+    result = set()
     if not name.startswith('group:'):
-        try:
-            root = find_root(context)
-        except AttributeError:
-            #For instance broken objects doesn't have __parent__
-            root = None
-        groups = ()
-        #FIXME: We may want to add the groups to the catalog instead for easier lookup
-        if root and 'groups' in root:
-            groups = root['groups'].get_users_group_principals(name)
-            result.update(groups)
+        groups = _get_group_principals(name, context, cache)
+        result.update(groups)
         #Fetch any local roles for group
         for group in groups:
             result.update(groupfinder(group, request))
-    initial_context = context
-    while context:
-        try:
-            if context == initial_context:
-                result.update([x for x in context.local_roles.get(name, ())])
-            else:
-                result.update([x for x in context.local_roles.get(name, ()) if x in inherited_roles])
-        except AttributeError:
-            pass
-        try:
-            context = context.__parent__
-        except AttributeError:
-            #For instance broken objects
-            context = None
+    try:
+        result.update(context.local_roles.get(name, ()))
+    except AttributeError:
+        pass
+    result.update(_inherited_local_roles(name, getattr(context, '__parent__', None),
+                                         inherited_roles, cache))
+    cache[key] = (context, frozenset(result))
+    return result
+
+
+def _get_group_principals(name, context, cache):
+    key = ('groups', name)
+    try:
+        return cache[key]
+    except KeyError:
+        pass
+    try:
+        root = find_root(context)
+    except AttributeError:
+        #For instance broken objects doesn't have __parent__
+        root = None
+    groups = frozenset()
+    #FIXME: We may want to add the groups to the catalog instead for easier lookup
+    if root and 'groups' in root:
+        groups = frozenset(root['groups'].get_users_group_principals(name))
+    cache[key] = groups
+    return groups
+
+
+def _inherited_local_roles(name, context, inherited_roles, cache):
+    """ Inheritable local roles for name within context and all of its parents. """
+    if not context:
+        return frozenset()
+    key = ('inherited', name, id(context))
+    try:
+        return cache[key][1]
+    except KeyError:
+        pass
+    try:
+        result = set([x for x in context.local_roles.get(name, ()) if x in inherited_roles])
+    except AttributeError:
+        result = set()
+    try:
+        parent = context.__parent__
+    except AttributeError:
+        #For instance broken objects
+        parent = None
+    result.update(_inherited_local_roles(name, parent, inherited_roles, cache))
+    result = frozenset(result)
+    cache[key] = (context, result)
     return result
 
 
@@ -278,6 +370,7 @@ def includeme(config):
     #Our version takes care of context as well
     config.add_request_method(has_permission, name = 'has_permission')
     config.add_request_method(context_effective_principals)
+    config.add_request_method(catalog_principals, reify = True)
     #ACL registry must be created first
     config.include('arche.models.acl')
     config.include('arche.models.roles')
@@ -40,6 +40,7 @@ function update_table_from_response(response) {
             }
         }
     };
+    update_pager(response);
     $("#sortable [data-load-msg]").remove();
     $('#sortable').render(response, directive);
 
@@ -58,10 +59,27 @@ function update_table_from_response(response) {
 }
 
 
+function update_pager(response) {
+    /* Only one batch is shown. Keep track of where it starts, so actions return the same batch. */
+    $('#contents-form [name="start"]').attr('value', response.start || 0);
+    $('[data-contents-start]').each(function() {
+        var start = response[$(this).data('contents-start')];
+        $(this).data('start', start);
+        $(this).toggleClass('hidden', start === null || typeof(start) === 'undefined');
+    });
+}
+
+
 $(function () {
     var request = arche.do_request('./contents.json');
     request.done(update_table_from_response);
 
+    $('[data-contents-start]').on('click', function(event) {
+        event.preventDefault();
+        var request = arche.do_request('./contents.json', {data: {start: $(this).data('start')}});
+        request.done(update_table_from_response);
+    });
+
     $('[data-delete-button]').on('click', function(event) {
         var form = $('#contents-form');
         event.preventDefault();
@@ -0,0 +1,96 @@
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+import transaction
+from pyramid import testing
+
+
+def _results(**kw):
+    results = {}
+    for (name, per_operation) in kw.items():
+        results[name] = {'operations': 10, 'min': per_operation * 10, 'per_operation': per_operation}
+    return {'meta': {}, 'results': results}
+
+
+class GenerateSiteTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        self.config.include('arche.models.blob')
+
+    def tearDown(self):
+        transaction.abort()
+        testing.tearDown()
+
+    def _fixture(self, **kw):
+        from arche.benchmarks.site import generate_site
+        from arche.resources import Root
+        root = Root()
+        return root, generate_site(root, **kw)
+
+    def test_generate_site(self):
+        root, created = self._fixture(users = 4, groups = 2, folders = 2, depth = 2,
+                                      documents = 3, blobs = 1)
+        self.assertEqual(created, {'User': 4, 'Group': 2, 'Document': 16, 'File': 4})
+        self.assertIn('file-0.txt', root['folder-1-0']['folder-1-1'])
+        self.assertEqual(set(root['groups']['group1'].members), set(['user1', 'user3']))
+        self.assertEqual(root['folder-1-0'].local_roles['group:group1'], set(['role:Editor']))
+        self.assertIn('<p>', root['folder-0-0']['document-0'].body)
+
+    def test_same_text_for_seed(self):
+        from arche.benchmarks.site import SiteGenerator
+        self.assertEqual(SiteGenerator(None, seed = 1).html(), SiteGenerator(None, seed = 1).html())
+        self.assertNotEqual(SiteGenerator(None, seed = 1).html(), SiteGenerator(None, seed = 2).html())
+
+    def test_run_benchmarks(self):
+        from arche.benchmarks import benchmarks
+        from arche.benchmarks import run_benchmarks
+        self.config.include('arche.models.workflow')
+        root = self._fixture(users = 2, groups = 1, folders = 1, depth = 2, documents = 1)[0]
+        results = run_benchmarks(root, self.config.registry, rounds = 2, sample = 10)
+        self.assertEqual(list(results['results']), list(benchmarks))
+        self.assertEqual(results['meta']['sample'], 10)
+        self.assertEqual(results['results']['groupfinder']['operations'], 20)
+        # Not limited by the sample
+        self.assertEqual(results['results']['find_all_db_objects']['operations'], 12)
+        self.assertTrue(results['results']['index_object']['min'] > 0)
+
+    def test_unknown_benchmark(self):
+        from arche.benchmarks import run_benchmarks
+        root = self._fixture()[0]
+        self.assertRaises(KeyError, run_benchmarks, root, self.config.registry, names = ['404'])
+
+
+class CompareTests(TestCase):
+
+    @property
+    def _fut(self):
+        from arche.benchmarks import compare
+        return compare
+
+    def test_regression(self):
+        comparison = self._fut(_results(acl = 1.0, groupfinder = 2.0),
+                               _results(acl = 1.05, groupfinder = 3.0), threshold = 0.1)
+        comparison = dict((x['name'], x) for x in comparison)
+        self.assertFalse(comparison['acl']['regression'])
+        self.assertTrue(comparison['groupfinder']['regression'])
+        self.assertAlmostEqual(comparison['groupfinder']['change'], 0.5)
+
+    def test_only_common_benchmarks(self):
+        comparison = self._fut(_results(acl = 1.0), _results(acl = 1.0, groupfinder = 2.0))
+        self.assertEqual([x['name'] for x in comparison], ['acl'])
+
+    def test_read_write(self):
+        from os import remove
+        from tempfile import mkstemp
+        from arche.benchmarks import read_results
+        from arche.benchmarks import write_results
+        fd, fn = mkstemp()
+        try:
+            write_results(_results(acl = 1.0), fn)
+            self.assertEqual(read_results(fn), _results(acl = 1.0))
+        finally:
+            remove(fn)
@@ -252,3 +252,83 @@ class TokenTests(TestCase):
         self.assertNotEqual(obj1, '2')
         self.assertFalse(obj1 != '1')
         self.assertTrue(obj1 != '2')
+
+
+class GroupsTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+
+    def tearDown(self):
+        testing.tearDown()
+
+    @property
+    def _cut(self):
+        from arche.resources import Groups
+        return Groups
+
+    def _fixture(self):
+        from arche.resources import Group
+        obj = self._cut()
+        obj['one'] = Group(members = ['jane', 'john'])
+        obj['two'] = Group(members = ['jane'])
+        return obj
+
+    def test_get_users_group_principals(self):
+        obj = self._fixture()
+        self.assertEqual(obj.get_users_group_principals('jane'), set(['group:one', 'group:two']))
+        self.assertEqual(obj.get_users_group_principals('john'), set(['group:one']))
+        self.assertEqual(obj.get_users_group_principals('nobody'), set())
+
+    def test_members_changes_update_index(self):
+        obj = self._fixture()
+        obj['two'].members.add('john')
+        self.assertEqual(obj.get_users_group_principals('john'), set(['group:one', 'group:two']))
+        obj['one'].members.remove('john')
+        self.assertEqual(obj.get_users_group_principals('john'), set(['group:two']))
+        obj['one'].members = ['john']
+        self.assertEqual(obj.get_users_group_principals('john'), set(['group:one', 'group:two']))
+        self.assertEqual(obj.get_users_group_principals('jane'), set(['group:two']))
+
+    def test_members_set_api(self):
+        from BTrees.OOBTree import OOSet
+        obj = self._fixture()
+        members = obj['two'].members
+        members |= ['john']
+        self.assertEqual(obj.get_users_group_principals('john'), set(['group:one', 'group:two']))
+        self.assertEqual(members, OOSet(['jane', 'john']))
+        self.assertEqual(members | set(['carl']), set(['jane', 'john', 'carl']))
+        self.assertEqual(set(OOSet(members)), set(['jane', 'john']))
+        self.assertEqual(members.maxKey(), 'john')
+        self.assertFalse(members.insert('jane'))
+        members -= ['jane']
+        members.discard('nobody')
+        self.assertEqual(obj.get_users_group_principals('jane'), set(['group:one']))
+        self.assertEqual(len(members), 1)
+        members.clear()
+        self.assertEqual(obj.get_users_group_principals('john'), set(['group:one']))
+
+    def test_remove_group(self):
+        obj = self._fixture()
+        del obj['one']
+        self.assertEqual(obj.get_users_group_principals('jane'), set(['group:two']))
+        self.assertNotIn('john', obj.__member_index__)
+
+    def test_get_users_groups(self):
+        obj = self._fixture()
+        self.assertEqual(list(obj.get_users_groups('john')), [obj['one']])
+
+    def test_without_index(self):
+        obj = self._fixture()
+        obj.__member_index__ = None
+        self.assertEqual(obj.get_users_group_principals('jane'), set(['group:one', 'group:two']))
+        obj.rebuild_member_index()
+        self.assertEqual(set(obj.__member_index__['jane']), set(['one', 'two']))
+
+    def test_evolve(self):
+        from arche.evolve.evolve1 import evolve
+        root = barebone_fixture()
+        root['groups'] = self._fixture()
+        root['groups'].__member_index__ = None
+        evolve(root)
+        self.assertEqual(root['groups'].get_users_group_principals('john'), set(['group:one']))
@@ -78,6 +78,51 @@ class ContextPermIntegrationTests(TestCase):
         self.failIf(security.has_permission(request, security.PERM_EDIT, root['b']))
 
 
+    def test_groupfinder_cached(self):
+        root = self._fixture()
+        from arche.security import groupfinder
+        request = testing.DummyRequest(context = root['a'])
+        self.assertEqual(groupfinder('tester', request), set([security.ROLE_ADMIN]))
+        cache = request.environ['arche.principals_cache']
+        self.assertIn(('tester', id(root['a'])), cache)
+        self.assertIn(('inherited', 'tester', id(root)), cache)
+        # Changing the cache changes the result
+        cache[('tester', id(root['a']))] = (root['a'], frozenset(['role:Cached']))
+        self.assertEqual(groupfinder('tester', request), set(['role:Cached']))
+
+    def test_groupfinder_cache_cleared_on_local_roles_change(self):
+        root = self._fixture()
+        from arche.security import groupfinder
+        request = testing.DummyRequest(context = root['b'])
+        self.config.begin(request)
+        self.assertEqual(groupfinder('tester', request), set())
+        root['b'].local_roles['tester'] = [security.ROLE_EDITOR]
+        self.assertEqual(groupfinder('tester', request), set([security.ROLE_EDITOR]))
+
+    def test_groupfinder_reuses_parents(self):
+        root = self._fixture()
+        from arche.security import groupfinder
+        root.local_roles['tester'] = [security.ROLE_EDITOR, security.ROLE_OWNER]
+        request = testing.DummyRequest(context = root['a'])
+        self.assertEqual(groupfinder('tester', request), set([security.ROLE_ADMIN, security.ROLE_EDITOR]))
+        request.environ['arche.principals_cache'][('inherited', 'tester', id(root))] = (root, frozenset())
+        request.context = root['b']
+        self.assertEqual(groupfinder('tester', request), set())
+
+    def test_catalog_principals(self):
+        root = self._fixture()
+        request = testing.DummyRequest(context = root['a'])
+        request.root = root
+        self.assertEqual(set(security.catalog_principals(request)),
+                         set(['system.Everyone', 'system.Authenticated', 'tester']))
+        setup_auth(self.config, userid = 'admin', debug = False)
+        request = testing.DummyRequest(context = root['a'])
+        request.root = root
+        self.assertEqual(set(security.catalog_principals(request)),
+                         set(['system.Everyone', 'system.Authenticated', 'admin', 'group:administrators',
+                              'role:Administrator']))
+
+
 class GetRolesTests(TestCase):
 
     def setUp(self):
@@ -170,6 +170,45 @@ class ResolveDocIDsTests(TestCase):
         docids = self._docids(root)
         self.assertEqual(tuple(self._cut(request, docids[0], perm = None)), (root['a'],))
 
+    def test_limit_and_offset(self):
+        root, request = self._fixture()
+        docids = self._docids(root)
+        self.assertEqual(tuple(self._cut(request, docids, perm = None, limit = 1)), (root['a'],))
+        self.assertEqual(tuple(self._cut(request, docids, perm = None, offset = 1)), (root['b'],))
+        self.assertEqual(tuple(self._cut(request, docids, perm = None, limit = 0)), ())
+
+    def test_limit_stops_resolving(self):
+        root, request = self._fixture()
+        docids = self._docids(root) + [-1]
+        # -1 doesn't exist and would fail if it was resolved
+        self.assertEqual(tuple(self._cut(request, docids, perm = None, limit = 2)), (root['a'], root['b']))
+
+    def test_offset_counts_permitted_only(self):
+        self.config.include('arche.testing.setup_auth')
+        root, request = self._fixture()
+        root['b'].workflow.state = 'public'
+        docids = self._docids(root)
+        self.assertEqual(tuple(self._cut(request, docids, offset = 1)), ())
+        self.assertEqual(tuple(self._cut(request, docids, limit = 1)), (root['b'],))
+
+
+class PathResolverTests(TestCase):
+
+    @property
+    def _cut(self):
+        from arche.utils import PathResolver
+        return PathResolver
+
+    def test_resolve(self):
+        root = testing.DummyResource()
+        root['a b'] = testing.DummyResource()
+        root['a b']['c'] = testing.DummyResource()
+        resolver = self._cut(root)
+        self.assertIs(resolver('/'), root)
+        self.assertIs(resolver('/a%20b/c'), root['a b']['c'])
+        self.assertIs(resolver._containers[('a b',)], root['a b'])
+        self.assertRaises(KeyError, resolver, '/a%20b/nothing')
+
 
 class ResolveUIDTests(TestCase):
     def setUp(self):
@@ -194,6 +233,19 @@ class ResolveUIDTests(TestCase):
         request.root = root
         self.assertEqual(self._cut(request, 'hello'), obj)
 
+    def test_resolve_uids(self):
+        from arche.utils import resolve_uids
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        root = barebone_fixture(self.config)
+        from arche.api import Content
+        root['a'] = Content(uid = 'a')
+        root['b'] = Content(uid = "b'quoted")
+        request = testing.DummyRequest()
+        request.root = root
+        result = resolve_uids(request, ["b'quoted", '404', 'a'], perm = None)
+        self.assertEqual(list(result), [root['b'], root['a']])
+
 
 class FailMarkerTests(TestCase):
 
@@ -258,6 +310,41 @@ class CopyRecursiveTests(TestCase):
         self.assertNotEqual(target['a'].uid, root['source']['a'].uid)
 
 
+class BatchTests(TestCase):
+
+    @property
+    def _cut(self):
+        from arche.utils import Batch
+        return Batch
+
+    def test_iter_and_len(self):
+        obj = self._cut(iter([1, 2]), start = 0, limit = 2, total = 5)
+        self.assertEqual(list(obj), [1, 2])
+        self.assertEqual(len(obj), 2)
+        self.assertTrue(obj)
+        self.assertFalse(self._cut([], total = 0))
+
+    def test_starts(self):
+        obj = self._cut([], start = 0, limit = 10, total = 25)
+        self.assertEqual((obj.previous_start, obj.next_start), (None, 10))
+        obj = self._cut([], start = 5, limit = 10, total = 25)
+        self.assertEqual((obj.previous_start, obj.next_start), (0, 15))
+        obj = self._cut([], start = 20, limit = 10, total = 25)
+        self.assertEqual((obj.previous_start, obj.next_start), (10, None))
+
+    def test_urls(self):
+        from six.moves.urllib.parse import parse_qs
+        request = testing.DummyRequest(params = {'query': 'hello', 'offset': '3'})
+        request.path_url = 'http://example.com/search'
+        obj = self._cut([], start = 10, limit = 10, total = 25, request = request)
+        url, qs = obj.next_url.split('?')
+        self.assertEqual(url, 'http://example.com/search')
+        self.assertEqual(parse_qs(qs), {'query': ['hello'], 'start': ['20']})
+        self.assertEqual(parse_qs(obj.previous_url.split('?')[1])['start'], ['0'])
+        obj = self._cut([], start = 0, limit = 10, total = 5, request = request)
+        self.assertEqual(obj.next_url, None)
+
+
 class PrepHTMLForSearchTests(TestCase):
 
     def setUp(self):
@@ -0,0 +1,61 @@
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+import colander
+import deform
+from pyramid import testing
+from pyramid.request import apply_request_extensions
+
+
+class ReferenceWidgetTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    @property
+    def _cut(self):
+        from arche.widgets import ReferenceWidget
+        return ReferenceWidget
+
+    def _fixture(self):
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        root['a'] = Document(title = 'A')
+        root['b'] = Document(title = 'B')
+        return root
+
+    def _mk_field(self, root):
+        from arche.views.base import BaseView
+        request = testing.DummyRequest()
+        request.root = root
+        apply_request_extensions(request)
+        class _Schema(colander.Schema):
+            ref = colander.SchemaNode(colander.List(), widget = self._cut())
+        schema = _Schema().bind(view = BaseView(root, request), request = request, context = root)
+        return deform.Form(schema)['ref']
+
+    def test_items_from_rows(self):
+        root = self._fixture()
+        field = self._mk_field(root)
+        cstruct = [root['b'].uid, root['a'].uid]
+        url = field.schema.bindings['request'].resource_url(root['b'])
+        # Objects aren't loaded
+        for name in root.keys():
+            root.data[name] = None
+        items = field.widget._fetch_referenced_items(field, cstruct)
+        self.assertEqual([(x['id'], x['title']) for x in items], [(cstruct[0], 'B'), (cstruct[1], 'A')])
+        self.assertEqual(items[0]['url'], url)
+
+    def test_items_from_objects(self):
+        root = self._fixture()
+        field = self._mk_field(root)
+        del root.catalog['title']
+        items = field.widget._fetch_referenced_items(field, [root['a'].uid])
+        self.assertEqual([(x['title'], x['name']) for x in items], [('A', 'a')])
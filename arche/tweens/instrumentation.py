@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+""" Opt-in instrumentation of requests. Include 'arche.tweens.instrumentation' to enable it.
+
+    Time is recorded per named phase: catalog queries, permission checks, portlet slots,
+    template rendering and Fanstatic injection. Objects loaded and stored by the ZODB
+    connection are counted too. The results are added as a Server-Timing header,
+    logged as json to 'arche.instrumentation' and the slowest recent requests are
+    shown in the view 'request_timings' on the site root.
+"""
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from collections import deque
+from json import dumps
+from logging import getLogger
+from operator import itemgetter
+from threading import Lock
+from time import time
+from timeit import default_timer
+
+from pyramid.tweens import INGRESS
+from pyramid_zodbconn import ZODBConnectionOpened
+
+from arche.utils import TIMINGS_KEY
+from arche.utils import _Phase
+from arche.utils import get_request_timings
+from arche.utils import timed_phase
+
+
+timings_logger = getLogger('arche.instrumentation')
+
+
+class RequestTimings(object):
+    """ Calls and time spent per phase for one request. """
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.running = set()
+        self.connection = None
+        self.start = default_timer()
+        self.total = None
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def connection_opened(self, connection):
+        self.connection = connection
+        # Connections are reused, so clear what previous requests did
+        connection.getTransferCounts(True)
+
+    def stop(self):
+        self.total = default_timer() - self.start
+
+    def transfer_counts(self):
+        """ Returns (loads, stores) for the ZODB connection, if one was opened. """
+        if self.connection is None:
+            return (0, 0)
+        return self.connection.getTransferCounts()
+
+    def server_timing(self):
+        """ Value for the Server-Timing header. """
+        metrics = []
+        for (name, (calls, elapsed)) in self.phases.items():
+            metrics.append('%s;dur=%.1f;desc="%s calls"' % (name, elapsed * 1000, calls))
+        if self.connection is not None:
+            metrics.append('zodb;desc="%s loads, %s stores"' % self.transfer_counts())
+        metrics.append('total;dur=%.1f' % (self.total * 1000))
+        return ", ".join(metrics)
+
+    def as_dict(self, request, response = None):
+        loads, stores = self.transfer_counts()
+        return {'method': request.method,
+                'url': request.path_qs,
+                'status': response is not None and response.status_int or 500,
+                'time': self.total,
+                'phases': [(name, calls, elapsed) for (name, (calls, elapsed)) in self.phases.items()],
+                'loads': loads,
+                'stores': stores,
+                'timestamp': time()}
+
+
+class RequestTimingsLog(object):
+    """ Keeps the timings of the most recent requests. Shared by all threads. """
+
+    def __init__(self, size = 100):
+        self._lock = Lock()
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.entries = deque(maxlen = self.size)
+
+    def add(self, entry):
+        with self._lock:
+            self.entries.append(entry)
+
+    def slowest(self, limit = 10):
+        with self._lock:
+            entries = list(self.entries)
+        return sorted(entries, key = itemgetter('time'), reverse = True)[:limit]
+
+
+class InstrumentationTween(object):
+
+    def __init__(self, handler, registry):
+        self.handler = handler
+        self.log = registry.request_timings_log
+        self.server_timing = registry.settings.get('arche.instrumentation.server_timing', True)
+
+    def __call__(self, request):
+        timings = request.environ[TIMINGS_KEY] = RequestTimings()
+        response = None
+        try:
+            response = self.handler(request)
+        finally:
+            timings.stop()
+            entry = timings.as_dict(request, response)
+            self.log.add(entry)
+            timings_logger.info(dumps(entry))
+        if self.server_timing:
+            response.headers['Server-Timing'] = timings.server_timing()
+        return response
+
+
+def instrumentation_tween_factory(handler, registry):
+    return InstrumentationTween(handler, registry)
+
+
+def zodb_connection_opened(event):
+    timings = get_request_timings(event.request)
+    if timings is not None:
+        timings.connection_opened(event.conn)
+
+
+_installed = []
+
+
+def install_instrumentation():
+    """ Wrap the instrumented functions. They only record anything within instrumented requests,
+        so other applications in the same process won't be affected.
+    """
+    if _installed:
+        return
+    from pyramid.renderers import RendererHelper
+    from arche import security
+    from arche.models.query_profiler import install_query_wrappers
+    from arche.views.base import BaseView
+
+    # Catalog queries are recorded by the query wrappers
+    install_query_wrappers()
+
+    _has_permission = security._has_permission
+    def timed_has_permission(request, *args, **kw):
+        with timed_phase('permission', request):
+            return _has_permission(request, *args, **kw)
+    security._has_permission = timed_has_permission
+
+    _render_portlet_slot = BaseView.render_portlet_slot
+    _portlet_slot_visible = BaseView.portlet_slot_visible
+    def timed_render_portlet_slot(self, slot, **kw):
+        with timed_phase('portlets', self.request):
+            return _render_portlet_slot(self, slot, **kw)
+    def timed_portlet_slot_visible(self, slot, **kw):
+        with timed_phase('portlets', self.request):
+            return _portlet_slot_visible(self, slot, **kw)
+    BaseView.render_portlet_slot = timed_render_portlet_slot
+    BaseView.portlet_slot_visible = timed_portlet_slot_visible
+
+    _render = RendererHelper.render
+    def timed_render(self, value, system_values, request = None):
+        with timed_phase('templates', request):
+            return _render(self, value, system_values, request = request)
+    RendererHelper.render = timed_render
+    _installed.append(True)
+
+
+def includeme(config):
+    settings = config.registry.settings
+    size = int(settings.get('arche.instrumentation.requests', 100))
+    config.registry.request_timings_log = RequestTimingsLog(size = size)
+    install_instrumentation()
+    config.add_tween('arche.tweens.instrumentation.instrumentation_tween_factory', under = INGRESS)
+    config.add_subscriber(zodb_connection_opened, ZODBConnectionOpened)
+    config.include('arche.views.request_timings')
@@ -5,6 +5,8 @@ import fanstatic
 import wsgiref.util
 from pyramid.settings import asbool
 
+from arche.utils import timed_phase
+
 
 def fanstatic_config(config, prefix='fanstatic.'):
     cfg = {
@@ -66,16 +68,17 @@ class FanstaticTween(object):
             return response
 
         if needed.has_resources():
-            if self.injector is not None:
-                result = self.injector(response.body,
-                                       needed, request, response)
-            else:
-                result = needed.render_topbottom_into_html(response.body)
-            try:
-                response.text = ''
-            except TypeError:
-                response.body = ''
-            response.write(result)
+            with timed_phase('fanstatic', request):
+                if self.injector is not None:
+                    result = self.injector(response.body,
+                                           needed, request, response)
+                else:
+                    result = needed.render_topbottom_into_html(response.body)
+                try:
+                    response.text = ''
+                except TypeError:
+                    response.body = ''
+                response.write(result)
         fanstatic.del_needed()
         return response
 
@@ -0,0 +1,122 @@
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from pyramid import testing
+from pyramid.request import apply_request_extensions
+from pyramid.response import Response
+
+
+class RequestTimingsTests(TestCase):
+
+    @property
+    def _cut(self):
+        from arche.tweens.instrumentation import RequestTimings
+        return RequestTimings
+
+    def test_nested_phase_counted_once(self):
+        timings = self._cut()
+        with timings.phase('templates'):
+            with timings.phase('templates'):
+                pass
+            with timings.phase('catalog'):
+                pass
+        self.assertEqual(timings.phases['templates'][0], 2)
+        self.assertEqual(timings.phases['catalog'][0], 1)
+        self.assertTrue(timings.phases['templates'][1] >= timings.phases['catalog'][1])
+        self.assertEqual(timings.running, set())
+
+    def test_server_timing(self):
+        timings = self._cut()
+        timings.phases['catalog'] = [3, 0.0123]
+        timings.total = 0.5
+        self.assertEqual(timings.server_timing(),
+                         'catalog;dur=12.3;desc="3 calls", total;dur=500.0')
+
+    def test_connection_counts(self):
+        class _Conn(object):
+            counts = (5, 1)
+            def getTransferCounts(self, clear = False):
+                counts = self.counts
+                if clear:
+                    self.counts = (0, 0)
+                return counts
+        timings = self._cut()
+        conn = _Conn()
+        timings.connection_opened(conn)
+        self.assertEqual(timings.transfer_counts(), (0, 0))
+        conn.counts = (2, 1)
+        self.assertEqual(timings.transfer_counts(), (2, 1))
+
+
+class InstrumentationTweenTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.tweens.instrumentation')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def _mk_tween(self, handler):
+        from arche.tweens.instrumentation import instrumentation_tween_factory
+        return instrumentation_tween_factory(handler, self.config.registry)
+
+    def _mk_request(self):
+        from pyramid.request import Request
+        request = Request.blank('/page?a=1')
+        request.registry = self.config.registry
+        apply_request_extensions(request)
+        request.context = testing.DummyResource()
+        return request
+
+    def test_phases_recorded(self):
+        from arche.security import PERM_VIEW
+        from arche.tweens.instrumentation import timed_phase
+        def _handler(request):
+            with timed_phase('catalog', request):
+                pass
+            request.has_permission(PERM_VIEW)
+            request.has_permission(PERM_VIEW)
+            return Response('Hello')
+        request = self._mk_request()
+        response = self._mk_tween(_handler)(request)
+        self.assertIn('catalog;dur=', response.headers['Server-Timing'])
+        self.assertIn('permission;dur=', response.headers['Server-Timing'])
+        entry = self.config.registry.request_timings_log.slowest()[0]
+        self.assertEqual(entry['url'], '/page?a=1')
+        self.assertEqual(entry['status'], 200)
+        self.assertEqual([x[:2] for x in entry['phases']], [('catalog', 1), ('permission', 2)])
+
+    def test_failed_request_logged(self):
+        def _handler(request):
+            raise ValueError()
+        self.assertRaises(ValueError, self._mk_tween(_handler), self._mk_request())
+        self.assertEqual(self.config.registry.request_timings_log.slowest()[0]['status'], 500)
+
+    def test_server_timing_disabled(self):
+        self.config.registry.settings['arche.instrumentation.server_timing'] = False
+        response = self._mk_tween(lambda request: Response('Hello'))(self._mk_request())
+        self.assertNotIn('Server-Timing', response.headers)
+
+    def test_not_instrumented(self):
+        from arche.tweens.instrumentation import get_request_timings
+        from arche.tweens.instrumentation import timed_phase
+        request = testing.DummyRequest()
+        with timed_phase('catalog', request):
+            pass
+        self.assertEqual(get_request_timings(request), None)
+
+
+class RequestTimingsLogTests(TestCase):
+
+    def test_ring_buffer(self):
+        from arche.tweens.instrumentation import RequestTimingsLog
+        log = RequestTimingsLog(size = 3)
+        for i in range(5):
+            log.add({'time': i})
+        self.assertEqual([x['time'] for x in log.slowest()], [4, 3, 2])
+        self.assertEqual([x['time'] for x in log.slowest(1)], [4])
+        log.reset()
+        self.assertEqual(log.slowest(), [])
@@ -2,6 +2,7 @@ import inspect
 import warnings
 from collections import deque
 from datetime import datetime
+from timeit import default_timer
 from uuid import uuid4
 
 import pytz
@@ -9,6 +10,7 @@ from BTrees.OOBTree import OOBTree
 from html2text import HTML2Text
 from persistent import IPersistent
 from pyramid.compat import map_
+from pyramid.encode import urlencode
 from pyramid.httpexceptions import HTTPUnauthorized
 from pyramid.i18n import TranslationString
 from pyramid.interfaces import IView
@@ -18,6 +20,7 @@ from pyramid.threadlocal import get_current_registry
 from pyramid.threadlocal import get_current_request
 from pyramid.traversal import find_resource
 from pyramid.traversal import find_root
+from pyramid.traversal import traversal_path
 from pyramid_mailer import get_mailer
 from pyramid_mailer.message import Message
 from six import string_types
@@ -446,24 +449,133 @@ def get_profile(request):
         return request.root.get('users', {}).get(request.authenticated_userid, None)
 
 
-def resolve_docids(request, docids, perm = PERM_VIEW):
+class PathResolver(object):
+    """ Turn catalog paths into objects. Containers that have been traversed
+        once are kept, so objects within the same folder only cost one lookup each.
+        Like find_resource, a KeyError is raised if the path doesn't exist.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._containers = {(): root}
+
+    def __call__(self, path):
+        names = traversal_path(path)
+        if not names:
+            return self.root
+        return self._container(names[:-1])[names[-1]]
+
+    def _container(self, names):
+        try:
+            return self._containers[names]
+        except KeyError:
+            obj = self._containers[names] = self._container(names[:-1])[names[-1]]
+            return obj
+
+
+def resolve_docids(request, docids, perm = PERM_VIEW, limit = None, offset = 0):
+    """ Generator that returns objects for docids, in the same order.
+        Objects the user isn't allowed to see won't count towards offset and limit.
+        Nothing after limit will be loaded, so pass limit whenever
+        a batch of a large result is needed.
+    """
     if isinstance(docids, int):
         docids = (docids,)
+    if limit is not None and limit <= 0:
+        return
+    address_for_docid = request.root.document_map.address_for_docid
+    resolve_path = PathResolver(request.root)
+    found = 0
     for docid in docids:
-        path = request.root.document_map.address_for_docid(docid)
-        obj = find_resource(request.root, path)
-        #FIXME: Have perm check here?
+        obj = resolve_path(address_for_docid(docid))
         if perm and not request.has_permission(perm, obj):
             continue
+        if offset > 0:
+            offset -= 1
+            continue
         yield obj
+        found += 1
+        if found == limit:
+            return
+
+
+def get_docids_for_uids(catalog, uids):
+    """ Returns docids for uids, in the same order. Uids that aren't in the catalog are skipped.
+        This reads the uid index directly, which is a lot faster than a query.
+    """
+    if isinstance(uids, string_types):
+        uids = (uids,)
+    fwd_index = catalog['uid']._fwd_index
+    docids = []
+    for uid in uids:
+        docids.extend(fwd_index.get(uid, ()))
+    return docids
+
+
+def resolve_uids(request, uids, perm = PERM_VIEW):
+    """ Generator that returns objects for uids, in the same order.
+        Objects that don't exist or that the user isn't allowed to see are skipped.
+    """
+    docids = get_docids_for_uids(request.root.catalog, uids)
+    return resolve_docids(request, docids, perm = perm)
 
 
 def resolve_uid(request, uid, perm = PERM_VIEW):
-    docids = request.root.catalog.query("uid == '%s'" % uid)[1]
-    for obj in resolve_docids(request, docids, perm = perm):
+    for obj in resolve_uids(request, (uid,), perm = perm):
         return obj
 
 
+class Batch(object):
+    """ A page of a larger result. Iterate over it to get the items.
+        If a request is passed, next_url and previous_url will link to the
+        same page with the 'start' parameter changed.
+    """
+
+    def __init__(self, items, start = 0, limit = 15, total = 0, request = None):
+        self.items = list(items)
+        self.start = start
+        self.limit = limit
+        self.total = total
+        self.request = request
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    __nonzero__ = __bool__ #Py2
+
+    @property
+    def next_start(self):
+        if self.start + self.limit < self.total:
+            return self.start + self.limit
+
+    @property
+    def previous_start(self):
+        if self.start > 0:
+            return max(self.start - self.limit, 0)
+
+    @property
+    def next_url(self):
+        return self.url_for(self.next_start)
+
+    @property
+    def previous_url(self):
+        return self.url_for(self.previous_start)
+
+    def url_for(self, start):
+        if start is None or self.request is None:
+            return
+        params = self.request.GET.copy()
+        params.pop('offset', None)
+        params['start'] = start
+        return "%s?%s" % (self.request.path_url, urlencode(list(params.items())))
+
+
 class _FailMarker(object):
     def __contains__(self, other):
         return False
@@ -625,6 +737,63 @@ def authdebug_message(request):
     )
 
 
+#Request instrumentation, see arche.tweens.instrumentation
+TIMINGS_KEY = 'arche.request_timings'
+
+
+class _Phase(object):
+    """ Context manager that times one call. Calls nested within the same phase,
+        like templates rendering other templates, are counted but not timed again.
+    """
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        stats = self.timings.phases.setdefault(self.name, [0, 0.0])
+        stats[0] += 1
+        self.outer = self.name not in self.timings.running
+        if self.outer:
+            self.timings.running.add(self.name)
+            self.start = default_timer()
+
+    def __exit__(self, *args):
+        if self.outer:
+            self.timings.phases[self.name][1] += default_timer() - self.start
+            self.timings.running.discard(self.name)
+
+
+class _NoPhase(object):
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+_no_phase = _NoPhase()
+
+
+def get_request_timings(request = None):
+    """ Returns RequestTimings for the request, or None if it isn't instrumented. """
+    if request is None:
+        request = get_current_request()
+    environ = getattr(request, 'environ', None)
+    if environ is not None:
+        return environ.get(TIMINGS_KEY, None)
+
+
+def timed_phase(name, request = None):
+    """ Context manager that records time spent as the phase name,
+        if the request is instrumented.
+    """
+    timings = get_request_timings(request)
+    if timings is None:
+        return _no_phase
+    return timings.phase(name)
+
+
 def includeme(config):
     config.registry.registerAdapter(RegistrationTokens, provided=IRegistrationTokens)
     config.registry.registerAdapter(EmailValidationTokens, provided=IEmailValidationTokens)
@@ -642,6 +811,7 @@ def includeme(config):
     config.add_request_method(send_email)
     config.add_request_method(resolve_docids)
     config.add_request_method(resolve_uid)
+    config.add_request_method(resolve_uids)
     config.add_request_method(content_factories, property = True)
     config.add_request_method(validate_appstruct)
     config.add_request_method(get_schema)
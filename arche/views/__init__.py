@@ -5,6 +5,7 @@ def includeme(config):
     config.include('.actions')
     config.include('.auth')
     config.include('.base')
+    config.include('.catalog_profiler')
     config.include('.contents')
     config.include('.customize_addable_content')
     config.include('.cut_copy_paste')
@@ -36,7 +36,7 @@ from arche.interfaces import IBaseForm
 from arche.interfaces import IBaseView
 from arche.interfaces import IContentView
 from arche.interfaces import IFolder
-from arche.portlets import get_portlet_manager
+from arche.portlets import get_slot_portlets
 from arche.utils import generate_slug
 from arche.utils import get_addable_content
 from arche.utils import get_content_schemas
@@ -44,6 +44,8 @@ from arche.utils import get_content_views
 from arche.utils import get_flash_messages
 from arche.utils import get_view
 from arche.utils import resolve_docids
+from arche.utils import resolve_uid
+from arche.utils import resolve_uids
 
 
 @implementer(IBaseView)
@@ -81,40 +83,43 @@ class BaseView(object):
     def flash_messages(self):
         return get_flash_messages(self.request)
 
+    @reify
+    def slot_portlets(self):
+        """ Enabled portlets per slot, from the context and its parents. """
+        return get_slot_portlets(self.context, self.request.registry)
+
+    @reify
+    def _rendered_slots(self):
+        return {}
+
     def portlet_slot_visible(self, slot, **kw):
-        """ Check for any reason to reserve space to render portlets. """
-        context = self.context
-        while context:
-            manager = get_portlet_manager(context, self.request.registry)
-            if manager:
-                # Use the view context when calling the portlets!
-                try:
-                    visible = manager.visible(slot, self.context, self.request, self, **kw)
-                except Exception as exc:
-                    if self.request.registry.settings['arche.debug']:
-                        raise exc
-                    else:
-                        warnings.warn(str(exc))
-                if visible:
-                    return True
-            context = getattr(context, '__parent__', None)
-        return False
+        """ Check for any reason to reserve space to render portlets.
+            A slot is visible when any portlet within it renders something,
+            and the result is kept for render_portlet_slot.
+        """
+        return bool(self.render_portlet_slot(slot, **kw))
 
     def render_portlet_slot(self, slot, **kw):
+        """ Render the portlets within slot. Each slot is only rendered once per view,
+            unless keywords are passed on to the portlets.
+        """
+        if not kw and slot in self._rendered_slots:
+            return self._rendered_slots[slot]
         results = []
-        context = self.context
-        while context:
-            manager = get_portlet_manager(context, self.request.registry)
-            if manager:
-                #Use the view context when calling the portlets!
-                try:
-                    results.extend(manager.render_slot(slot, self.context, self.request, self, **kw))
-                except Exception as exc:
-                    if self.request.registry.settings['arche.debug']:
-                        results.append(str(exc))
-                    else:
-                        warnings.warn(str(exc))
-            context = getattr(context, '__parent__', None)
+        for portlet in self.slot_portlets.get(slot, ()):
+            #Use the view context when calling the portlets!
+            try:
+                output = portlet.render(self.context, self.request, self, **kw)
+            except Exception as exc:
+                if self.request.registry.settings['arche.debug']:
+                    results.append(str(exc))
+                else:
+                    warnings.warn(str(exc))
+                continue
+            if output:
+                results.append(output)
+        if not kw:
+            self._rendered_slots[slot] = results
         return results
 
     def catalog_search(self, resolve = False, perm = security.PERM_VIEW, **kwargs):
@@ -129,15 +134,20 @@ class BaseView(object):
             results = self.resolve_docids(results, perm = perm)
         return results
 
-    def resolve_docids(self, docids, perm = security.PERM_VIEW):
+    def resolve_docids(self, docids, perm = security.PERM_VIEW, limit = None, offset = 0):
         """ Also available as a request method, like:
-            request.resolve_docids(docids, perm = perm)
+            request.resolve_docids(docids, perm = perm, limit = limit, offset = offset)
         """
-        return resolve_docids(self.request, docids, perm = perm)
+        return resolve_docids(self.request, docids, perm = perm, limit = limit, offset = offset)
 
     def resolve_uid(self, uid, perm = security.PERM_VIEW):
-        for obj in self.catalog_search(resolve = True, uid = uid, perm = perm):
-            return obj
+        return resolve_uid(self.request, uid, perm = perm)
+
+    def resolve_uids(self, uids, perm = security.PERM_VIEW):
+        """ Also available as a request method, like:
+            request.resolve_uids(uids, perm = perm)
+        """
+        return resolve_uids(self.request, uids, perm = perm)
 
     def breadcrumbs(self):
         items = []
@@ -179,13 +189,17 @@ class BaseView(object):
         #None will in some cases be changed to a string...
         return ''
 
-    def get_local_nav_objects(self, context):
+    def get_local_nav_objects(self, context, start = 0, limit = None):
         #FIXME: Conditions for navigation!
         if IFolder.providedBy(context):
-            for obj in context.values():
-                if getattr(obj, 'nav_visible', False):
-                    if self.request.has_permission(security.PERM_VIEW, obj):
-                        yield obj
+            if limit is None:
+                limit = self.request.registry.settings.get('arche.nav_limit', 0)
+            if not limit:
+                limit = max(len(context), 1)
+            batch = self.request.folder_batch(context, start = start, limit = limit,
+                                              filters = {'nav_visible': True})
+            for obj in batch:
+                yield obj
 
     def query_view(self, context, name = '', default = ''):
         result = get_view(context, self.request, view_name = name)
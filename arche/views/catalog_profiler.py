@@ -0,0 +1,34 @@
+from pyramid.httpexceptions import HTTPFound
+
+from arche import _
+from arche.security import PERM_MANAGE_SYSTEM
+from arche.views.base import BaseView
+
+
+class CatalogProfilerView(BaseView):
+    """ Where time is spent in catalog queries, and the slowest queries.
+        Only registered when 'arche.catalog_profiler' is enabled.
+    """
+
+    @property
+    def profiler(self):
+        return self.request.registry.catalog_profiler
+
+    def __call__(self):
+        if self.request.POST.get('reset', None):
+            self.profiler.reset()
+            self.flash_messages.add(_("Catalog profiler data cleared"), require_commit = False)
+            return HTTPFound(location = self.request.resource_url(self.context, 'catalog_profiler'))
+        try:
+            limit = int(self.request.GET.get('limit', 20))
+        except ValueError:
+            limit = 20
+        return {'index_stats': self.profiler.index_stats(),
+                'slowest': self.profiler.slowest(limit)}
+
+
+def includeme(config):
+    if getattr(config.registry, 'catalog_profiler', None) is not None:
+        config.add_view(CatalogProfilerView, context = 'arche.interfaces.IRoot',
+                        name = 'catalog_profiler', permission = PERM_MANAGE_SYSTEM,
+                        renderer = 'arche:templates/system/catalog_profiler.pt')
@@ -5,6 +5,7 @@ from arche.fanstatic_lib import touchpunch_js
 from arche.fanstatic_lib import folderish_contents_js
 from arche.interfaces import IJSONData
 from arche.interfaces import IFolder
+from arche.models.folder_batch import batch_params
 from arche.views.base import BaseView
 
 
@@ -19,7 +20,10 @@ class ContentsView(BaseView):
 
 
 class JSONContents(BaseView):
-    """ Batch get generic object data. Good for listings and similar. """
+    """ Batch get generic object data. Good for listings and similar.
+        Returns one batch, see the 'start' and 'limit' params.
+    """
+    limit = 100
 
     def __call__(self):
         response = {}
@@ -31,18 +35,25 @@ class JSONContents(BaseView):
                     del self.context[item]
         if action == 'sort':
             content_keys = self.request.POST.getall('content_name')
-            keys = set(self.context.keys())
+            keys = list(self.context.keys())
+            # Only one batch is posted, so reorder the positions those items had
+            positions = {}
+            for (i, key) in enumerate(keys):
+                positions[key] = i
             for item in content_keys:
-                if item not in keys:
+                if item not in positions:
                     return HTTPForbidden("You tried to set a value that doesn't exist.")
-                keys.remove(item)
-            content_keys.extend(keys)
-            self.context.order = content_keys
-        results = []
-        for obj in self.context.values():
-            if self.request.has_permission(security.PERM_VIEW, obj):
-                results.append(obj)
-        response['items'] = self.json_format_objects(results)
+            for (i, item) in zip(sorted(positions[x] for x in content_keys), content_keys):
+                keys[i] = item
+            self.context.order = keys
+        start, limit = batch_params(self.request, limit = self.limit)
+        batch = self.request.folder_batch(self.context, start = start, limit = limit)
+        response['items'] = self.json_format_objects(batch)
+        response['total'] = batch.total
+        response['start'] = batch.start
+        response['limit'] = batch.limit
+        response['next_start'] = batch.next_start
+        response['previous_start'] = batch.previous_start
         return response
 
     def json_format_objects(self, items):
@@ -1,3 +1,4 @@
+from os import fstat
 from os.path import isfile
 
 import deform
@@ -12,6 +13,7 @@ from pyramid.response import FileResponse
 from arche.models.mimetype_views import get_mimetype_views
 from arche import security
 from arche.interfaces import IBlobs
+from arche.models.blob import BlobIter
 from arche.schemas import AddFileSchema
 from arche.utils import generate_slug
 from arche.utils import image_mime_to_title
@@ -33,30 +35,35 @@ class AddFileForm(DefaultAddForm):
 
 
 def file_data_response(context, request, disposition = 'inline', blob_key = None):
+    """ Stream a blob to the client. The response handles If-None-Match,
+        If-Modified-Since and Range headers when it's served.
+    """
     filename = getattr(context, 'filename', context.uid).encode('ascii', 'ignore')
     if blob_key is None:
         blob_key = getattr(context, 'blob_key', 'file')
-    body = None
-    mimetype = ""
     try:
         blobfile = IBlobs(context)[blob_key]
-        with blobfile.blob.open() as f:
-            body = f.read()
-        mimetype = blobfile.mimetype
     except KeyError:
-        pass
-    if not body:
+        raise HTTPNotFound("No such key")
+    f = blobfile.open_read()
+    size = fstat(f.fileno()).st_size
+    if not size:
+        f.close()
         raise HTTPNotFound("No such key")
     headerslist = [
         ('Content-Disposition', '%s;filename="%s"' % (
             disposition, filename)),
-        ('Content-Type', str(mimetype)),
+        ('Content-Type', str(blobfile.mimetype)),
         # Might be a good idea to make this configurable
         ('Cache-Control', 'private, max-age=%s' % (60*60)),
     ]
-    response = Response(headerlist=headerslist, body=body)
-    if response.etag is None:
-        response.md5_etag()
+    response = Response(headerlist=headerslist, conditional_response=True)
+    response.app_iter = BlobIter(f)
+    response.content_length = size
+    response.accept_ranges = 'bytes'
+    response.etag = blobfile.get_etag()
+    if blobfile.modified is not None:
+        response.last_modified = blobfile.modified
     return response
 
 
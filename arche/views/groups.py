@@ -13,6 +13,7 @@ from repoze.catalog.query import Any
 
 from arche.fanstatic_lib import users_groups_js
 from arche.interfaces import IJSONData
+from arche.models.folder_batch import batch_params
 from arche.views.base import DefaultEditForm
 from arche.views.base import BaseView
 from arche import security
@@ -22,7 +23,9 @@ from arche import _
 class GroupsView(BaseView):
 
     def __call__(self):
-        return {'contents': [x for x in self.context.values()]}
+        start, limit = batch_params(self.request, limit = 50)
+        batch = self.request.folder_batch(self.context, start = start, limit = limit, perm = None)
+        return {'contents': batch, 'batch': batch}
 
 
 @view_defaults(context="arche.interfaces.IGroup",
@@ -73,7 +76,7 @@ class GroupView(BaseView):
 class JSONUsers(BaseView):
 
     def __call__(self):
-        query = Eq('type_name', 'User') & Any('userid', self.context.members)
+        query = Eq('type_name', 'User') & Any('userid', tuple(self.context.members))
         q = self.request.GET.get('q')
         if q:
             q = ' '.join([w+'*' for w in q.split()])
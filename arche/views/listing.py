@@ -1,3 +1,4 @@
+from arche.models.folder_batch import batch_params
 from arche.views.base import ContentView
 from arche import security
 from arche import _
@@ -7,7 +8,10 @@ class ListingView(ContentView):
     title = _('Content listing')
 
     def __call__(self):
-        return {'contents': [x for x in self.context.values() if getattr(x, 'listing_visible', False)]}
+        start, limit = batch_params(self.request, limit = 20)
+        batch = self.request.folder_batch(self.context, start = start, limit = limit,
+                                          filters = {'listing_visible': True})
+        return {'contents': batch, 'batch': batch}
 
 
 def includeme(config):
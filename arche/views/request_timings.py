@@ -0,0 +1,32 @@
+from pyramid.httpexceptions import HTTPFound
+
+from arche import _
+from arche.security import PERM_MANAGE_SYSTEM
+from arche.views.base import BaseView
+
+
+class RequestTimingsView(BaseView):
+    """ The slowest recent requests and where the time was spent.
+        Included by arche.tweens.instrumentation.
+    """
+
+    @property
+    def timings_log(self):
+        return self.request.registry.request_timings_log
+
+    def __call__(self):
+        if self.request.POST.get('reset', None):
+            self.timings_log.reset()
+            self.flash_messages.add(_("Request timings cleared"), require_commit = False)
+            return HTTPFound(location = self.request.resource_url(self.context, 'request_timings'))
+        try:
+            limit = int(self.request.GET.get('limit', 20))
+        except ValueError:
+            limit = 20
+        return {'slowest': self.timings_log.slowest(limit)}
+
+
+def includeme(config):
+    config.add_view(RequestTimingsView, context = 'arche.interfaces.IRoot',
+                    name = 'request_timings', permission = PERM_MANAGE_SYSTEM,
+                    renderer = 'arche:templates/system/request_timings.pt')
@@ -1,3 +1,6 @@
+from itertools import islice
+
+from arche.interfaces import ICatalogRow
 from arche.interfaces import IJSONData
 from pyramid.decorator import reify
 from pyramid.httpexceptions import HTTPFound
@@ -10,10 +13,16 @@ from repoze.catalog.query import Any
 from repoze.catalog.query import Contains
 from repoze.catalog.query import Eq
 from six import string_types
+from zope.index.interfaces import IIndexSort
 from zope.index.text.parsetree import ParseError
 
 from arche import _
 from arche import security
+from arche.models.catalog import get_catalog_rows
+from arche.models.catalog import has_row_fields
+from arche.models.catalog import sorted_query
+from arche.models.jsondata import JSONRowData
+from arche.utils import Batch
 from arche.views.base import BaseView
 
 
@@ -26,21 +35,79 @@ def logic_wrap(word):
 @view_defaults(permission = security.PERM_VIEW, context = 'arche.interfaces.IRoot')
 class SearchView(BaseView):
     result = None
+    # Fetched for catalog rows when they exist, see arche.plugins.thumbnails
+    row_extra_fields = ('thumb_key',)
 
     @reify
     def limit(self):
         limit = self.request.params.get('limit', 15)
         try:
             limit = int(limit)
-        except TypeError:
+        except (TypeError, ValueError):
             limit = 15
-        return limit
+        return max(limit, 1)
+
+    @reify
+    def start(self):
+        #'offset' is the old name
+        start = self.request.params.get('start', self.request.params.get('offset', 0))
+        try:
+            return max(int(start), 0)
+        except (TypeError, ValueError):
+            return 0
+
+    @property
+    def offset(self):
+        return self.start
+
+    @reify
+    def sort_on(self):
+        """ Index to sort on. Text queries are sorted by relevance unless something else is specified.
+        """
+        sort_on = self.request.params.get('sort_on', None)
+        if sort_on and IIndexSort.providedBy(self.root.catalog.get(sort_on, None)):
+            return sort_on
+        if self.request.GET.get('query', None) and 'searchable_text' in self.root.catalog:
+            return 'searchable_text'
+
+    @reify
+    def reverse(self):
+        return self.request.params.get('reverse', '').lower() in ('1', 'true', 'on')
+
+    @property
+    def total(self):
+        return self.result and self.result.total or 0
+
+    def get_batch(self):
+        """ Resolve objects for the current page of the result. """
+        items = self.resolve_docids(self.docids, limit = self.limit, offset = self.start)
+        return Batch(items, start = self.start, limit = self.limit,
+                     total = self.total, request = self.request)
+
+    def get_row_batch(self, fields):
+        """ Catalog rows for the current page of the result, if the catalog has fields.
+            Otherwise resolve objects like get_batch.
+        """
+        if not has_row_fields(self.request, fields):
+            return self.get_batch()
+        # The view permission is already part of the query
+        docids = islice(self.docids, self.start, self.start + self.limit)
+        items = get_catalog_rows(self.root, docids, set(fields) | set(self.row_extra_fields))
+        return Batch(items, start = self.start, limit = self.limit,
+                     total = self.total, request = self.request)
+
+    def item_url(self, item):
+        if ICatalogRow.providedBy(item):
+            return item.url(self.request)
+        return self.request.resource_url(item)
 
     def _mk_query(self):
         self.docids = ()
         query_objs = []
         if not self.request.GET.get('show_hidden', False):
             query_objs.append(Eq('search_visible', True))
+        if 'allowed_to_view' in self.root.catalog:
+            query_objs.append(Any('allowed_to_view', self.request.catalog_principals))
         query = self.request.GET.get('query', None)
         perform_query = False
         if query:
@@ -73,8 +140,11 @@ class SearchView(BaseView):
             except TypeError:
                 query_obj = obj
         try:
-            #Limit kw is only used by the catalog if a sort index is specified
-            self.result, self.docids = self.root.catalog.query(query_obj)
+            #Only the hits up to the end of the requested page need to be sorted
+            self.result, self.docids = sorted_query(self.root.catalog, query_obj,
+                                                    sort_index = self.sort_on,
+                                                    reverse = self.reverse,
+                                                    limit = self.start + self.limit)
         except ParseError:
             if not self.request.is_xhr:
                 msg = _(u"Invalid search query - try something else!")
@@ -83,8 +153,10 @@ class SearchView(BaseView):
     @view_config(name = 'search', renderer = 'arche:templates/search.pt')
     def search_page(self):
         self._mk_query()
-        return {'results': tuple(self.resolve_docids(self.docids)),
-                'total': self.result and self.result.total or 0,
+        batch = self.get_batch()
+        return {'results': batch,
+                'batch': batch,
+                'total': self.total,
                 'query': self.request.GET.get('query', ''),}
 
     @view_config(name = 'search.json', renderer = 'json')
@@ -92,26 +164,28 @@ class SearchView(BaseView):
         self._mk_query()
         scale = self.request.params.get('scale', 'mini')
         output = []
-        limit = self.limit
-        for obj in self.resolve_docids(self.docids):
-            if limit > 0:
-                try:
-                    thumb_url = self.request.thumb_url(obj, scale)
-                except AttributeError:
-                    thumb_url = ''
-                json_data = IJSONData(obj)
-                item = json_data(self.request, dt_formater=self.request.dt_handler.format_dt)
-                item['thumb_url'] = thumb_url
-                item['url'] = self.request.resource_url(obj)
-                output.append(item)
-                limit -= 1
-        total = self.result and self.result.total or 0
-        response = {'results': output, 'total': total}
+        batch = self.get_row_batch(JSONRowData.required_fields())
+        for obj in batch:
+            try:
+                thumb_url = self.request.thumb_url(obj, scale)
+            except AttributeError:
+                thumb_url = ''
+            json_data = IJSONData(obj)
+            item = json_data(self.request, dt_formater=self.request.dt_handler.format_dt)
+            item['thumb_url'] = thumb_url
+            item['url'] = self.item_url(obj)
+            output.append(item)
+        total = self.total
+        response = {'results': output,
+                    'total': total,
+                    'start': self.start,
+                    'next_start': batch.next_start,
+                    'previous_start': batch.previous_start}
         if total == 0:
             response['msg'] = self.request.localizer.translate(_("No results"))
-        elif total > self.limit:
+        elif total > self.start + self.limit:
             msg = _("${num} more results...",
-                    mapping = {'num': total - self.limit})
+                    mapping = {'num': total - self.start - self.limit})
             response['msg'] = self.request.localizer.translate(msg)
         return response
 
@@ -122,24 +196,37 @@ class SearchView(BaseView):
             raise HTTPBadRequest()
         self._mk_query()
         output = []
-        limit = self.limit
-        for obj in self.resolve_docids(self.docids):
-            if limit > 0:
+        batch = self.get_row_batch(['title', 'type_name', id_attr])
+        factories = self.request.content_factories
+        for item in batch:
+            if ICatalogRow.providedBy(item):
+                values = item
+                factory = factories.get(item.get('type_name'), None)
+                type_title = getattr(factory, 'type_title', item.get('type_name', "(Unknown)"))
+                obj = None
+                if item.get('thumb_key'):
+                    # Only content with an image needs to be loaded for the thumbnail
+                    obj = next(self.request.resolve_docids(item.docid, perm = None), None)
+            else:
+                obj = item
+                values = dict((x, getattr(obj, x, None)) for x in ('title', 'type_name', id_attr))
                 type_title = getattr(obj, 'type_title', getattr(obj, 'type_name', "(Unknown)"))
-                if isinstance(type_title, TranslationString):
-                    type_title = self.request.localizer.translate(type_title)
+            if isinstance(type_title, TranslationString):
+                type_title = self.request.localizer.translate(type_title)
+            tag = ''
+            if obj is not None:
                 try:
                     tag = self.request.thumb_tag(obj, 'mini')
                 except AttributeError:
-                    tag = ''
-                user_extra = id_attr == 'userid' and ' ({})'.format(obj.userid) or ''
-                output.append({'text': obj.title + user_extra,
-                               'id': getattr(obj, id_attr),
-                               'type_name': obj.type_name,
-                               'img_tag': tag,
-                               'type_title': '' if user_extra else type_title})
-                limit -= 1
-        return {'results': output}
+                    pass
+            user_extra = id_attr == 'userid' and ' ({})'.format(values.get('userid')) or ''
+            output.append({'text': (values.get('title') or '') + user_extra,
+                           'id': values.get(id_attr),
+                           'type_name': values.get('type_name'),
+                           'img_tag': tag,
+                           'type_title': '' if user_extra else type_title})
+        return {'results': output,
+                'pagination': {'more': batch.next_start is not None}}
 
     @view_config(route_name='resolve_uid')
     def redirect_resolve_uid(self):
@@ -1,5 +1,8 @@
 import colander
+from repoze.catalog.query import Any
 
+from arche.interfaces import ICatalogRow
+from arche.models.catalog import has_row_fields
 from arche.views.base import ContentView
 from arche.widgets import ReferenceWidget
 from arche import security
@@ -17,16 +20,39 @@ class SelectContentSchema(colander.Schema):
 
 
 class SelectedContentView(ContentView):
+    """ Content is read from catalog rows, unless the body should be shown.
+        Only content with a thumbnail is loaded then.
+    """
     title = _('Selected content')
     settings_schema = SelectContentSchema
+    row_fields = ('title', 'description', 'uid', 'thumb_key')
 
     def __call__(self):
-        contents = []
-        for uid in self.settings.get('selected_content', ()):
-            #Generator
-            for res in self.catalog_search(resolve = True, uid = uid):
-                contents.append(res)
-        return {'contents': contents}
+        uids = self.settings.get('selected_content', ())
+        if self.settings.get('show_body', False) or not has_row_fields(self.request, self.row_fields):
+            items = self.resolve_uids(uids)
+        else:
+            rows = self.request.catalog_rows(Any('uid', list(uids)), fields = self.row_fields)
+            rows = dict((row['uid'], row) for row in rows)
+            items = [rows[uid] for uid in uids if uid in rows]
+        return {'contents': [self.content_data(x) for x in items]}
+
+    def content_data(self, item):
+        """ Values for the template, from an object or a catalog row. """
+        if ICatalogRow.providedBy(item):
+            obj = None
+            if item.get('thumb_key'):
+                obj = self.request.resolve_uid(item['uid'], perm = None)
+            return {'title': item.get('title', ''),
+                    'description': item.get('description', ''),
+                    'url': item.url(self.request),
+                    'thumb_tag': obj is not None and self.thumb_tag(obj, 'col-2', extra_cls = 'media-object') or '',
+                    'body': ''}
+        return {'title': item.title,
+                'description': getattr(item, 'description', ''),
+                'url': self.request.resource_url(item),
+                'thumb_tag': self.thumb_tag(item, 'col-2', extra_cls = 'media-object'),
+                'body': getattr(item, 'body', '')}
 
 
 def includeme(config):
@@ -76,3 +76,124 @@ class BaseFormTests(TestCase):
         del form.request.POST['text']  # Will cause validation error
         form()
         self.assertFalse(form.initial)
+
+
+class PortletSlotTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp(settings = {'arche.debug': False})
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.portlets')
+        from arche.portlets import PortletType
+        self.rendered = rendered = []
+        class _CountingPortlet(PortletType):
+            name = 'counting'
+            def render(self, context, request, view, **kw):
+                rendered.append(self.portlet.uid)
+                return self.portlet.settings.get('output', '')
+        self.config.add_portlet(_CountingPortlet)
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def _fixture(self):
+        from arche.portlets import get_portlet_manager
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        root['doc'] = Document()
+        manager = get_portlet_manager(root)
+        self.root_portlet = manager.add('left', 'counting', settings = {'output': 'Root'})
+        manager.add('right', 'counting')
+        manager = get_portlet_manager(root['doc'])
+        self.doc_portlet = manager.add('left', 'counting', settings = {'output': 'Doc'})
+        return root
+
+    def _mk_view(self, context):
+        from arche.views.base import BaseView
+        request = testing.DummyRequest()
+        apply_request_extensions(request)
+        return BaseView(context, request)
+
+    def test_slot_portlets(self):
+        root = self._fixture()
+        view = self._mk_view(root['doc'])
+        self.assertEqual([x.uid for x in view.slot_portlets['left']],
+                         [self.doc_portlet.uid, self.root_portlet.uid])
+        self.root_portlet.enabled = False
+        self.assertEqual(len(self._mk_view(root['doc']).slot_portlets['left']), 1)
+
+    def test_visible_and_render_use_same_result(self):
+        root = self._fixture()
+        view = self._mk_view(root['doc'])
+        self.assertTrue(view.portlet_slot_visible('left'))
+        self.assertEqual(view.render_portlet_slot('left'), ['Doc', 'Root'])
+        self.assertEqual(len(self.rendered), 2)
+
+    def test_visible_from_rendered_result(self):
+        root = self._fixture()
+        view = self._mk_view(root['doc'])
+        self.assertFalse(view.portlet_slot_visible('right'))
+        self.assertFalse(view.portlet_slot_visible('top'))
+        self.assertEqual(view.render_portlet_slot('right'), [])
+
+    def test_empty_output_not_visible(self):
+        root = self._fixture()
+        self.root_portlet.settings = {'output': ''}
+        view = self._mk_view(root['doc'])
+        self.assertEqual(view.render_portlet_slot('left'), ['Doc'])
+        self.assertEqual(len(self.rendered), 2)
+
+    def test_navigation_hidden_at_root(self):
+        from arche.portlets import get_portlet_manager
+        self.config.include('pyramid_chameleon')
+        self.config.include('arche.portlets.navigation')
+        root = self._fixture()
+        get_portlet_manager(root).add('top', 'navigation')
+        view = self._mk_view(root)
+        view.request.root = root
+        view.get_local_nav_objects = lambda context: [root['doc']]
+        self.assertFalse(view.portlet_slot_visible('top'))
+        view = self._mk_view(root['doc'])
+        view.request.root = root
+        view.get_local_nav_objects = lambda context: [root['doc']]
+        self.assertTrue(view.portlet_slot_visible('top'))
+
+
+class LocalNavTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        self.config.include('arche.models.folder_batch')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def _fixture(self):
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        for i in range(5):
+            root['d%s' % i] = Document(nav_visible = True)
+        return root
+
+    def _mk_view(self, root):
+        from arche.views.base import BaseView
+        request = testing.DummyRequest()
+        request.root = root
+        apply_request_extensions(request)
+        return BaseView(root, request)
+
+    def test_all_by_default(self):
+        root = self._fixture()
+        view = self._mk_view(root)
+        self.assertEqual(len(list(view.get_local_nav_objects(root))), 5)
+
+    def test_limit_setting(self):
+        root = self._fixture()
+        view = self._mk_view(root)
+        self.config.registry.settings['arche.nav_limit'] = 2
+        self.assertEqual(len(list(view.get_local_nav_objects(root))), 2)
+        self.assertEqual(len(list(view.get_local_nav_objects(root, limit = 3))), 3)
@@ -0,0 +1,64 @@
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from pyramid import testing
+from pyramid.request import apply_request_extensions
+from webob.multidict import MultiDict
+
+
+class JSONContentsTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        self.config.include('arche.models.datetime_handler')
+        self.config.include('arche.models.folder_batch')
+        self.config.include('arche.models.jsondata')
+        self.config.include('arche.resources')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    @property
+    def _cut(self):
+        from arche.views.contents import JSONContents
+        return JSONContents
+
+    def _fixture(self):
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        for name in ('a', 'b', 'c', 'd', 'e'):
+            root[name] = Document(title = name.upper())
+        return root
+
+    def _mk_request(self, root, params = None, post = None):
+        request = testing.DummyRequest(params = params, post = post)
+        request.root = root
+        apply_request_extensions(request)
+        return request
+
+    def test_batch(self):
+        root = self._fixture()
+        request = self._mk_request(root, params = {'start': '2', 'limit': '2'})
+        response = self._cut(root, request)()
+        self.assertEqual([x['__name__'] for x in response['items']], ['c', 'd'])
+        self.assertEqual(response['total'], 5)
+        self.assertEqual(response['next_start'], 4)
+        self.assertEqual(response['previous_start'], 0)
+
+    def test_sort_within_batch(self):
+        root = self._fixture()
+        post = MultiDict([('action', 'sort'), ('content_name', 'd'), ('content_name', 'b')])
+        request = self._mk_request(root, post = post)
+        self._cut(root, request)()
+        self.assertEqual(list(root.keys()), ['a', 'd', 'c', 'b', 'e'])
+
+    def test_sort_bad_name(self):
+        from pyramid.httpexceptions import HTTPForbidden
+        root = self._fixture()
+        post = MultiDict([('action', 'sort'), ('content_name', '404')])
+        request = self._mk_request(root, post = post)
+        self.assertIsInstance(self._cut(root, request)(), HTTPForbidden)
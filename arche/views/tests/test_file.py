@@ -0,0 +1,98 @@
+from __future__ import unicode_literals
+
+from io import BytesIO
+from unittest import TestCase
+
+from pyramid import testing
+from pyramid.httpexceptions import HTTPNotFound
+from webob import Request
+
+from arche.interfaces import IBlobs
+
+
+class FileDataResponseTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.models.blob')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    @property
+    def _fut(self):
+        from arche.views.file import file_data_response
+        return file_data_response
+
+    def _fixture(self, data = b'Hello world!'):
+        from arche.resources import Base
+        context = Base()
+        context.filename = 'hello.txt'
+        IBlobs(context).create_from_formdata('file', {'fp': BytesIO(data),
+                                                      'filename': 'hello.txt',
+                                                      'mimetype': 'text/plain'})
+        return context
+
+    def _serve(self, context, **headers):
+        request = Request.blank('/', headers = headers)
+        response = self._fut(context, testing.DummyRequest())
+        return request.get_response(response)
+
+    def test_full_body(self):
+        context = self._fixture()
+        response = self._serve(context)
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.body, b'Hello world!')
+        self.assertEqual(response.content_length, 12)
+        self.assertEqual(response.etag, IBlobs(context)['file'].etag)
+
+    def test_etag_stored_on_upload(self):
+        from hashlib import md5
+        context = self._fixture()
+        self.assertEqual(IBlobs(context)['file'].etag, md5(b'Hello world!').hexdigest())
+        self.assertTrue(IBlobs(context)['file'].modified)
+
+    def test_if_none_match(self):
+        context = self._fixture()
+        etag = IBlobs(context)['file'].etag
+        response = self._serve(context, **{'If-None-Match': '"%s"' % etag})
+        self.assertEqual(response.status_int, 304)
+        self.assertEqual(response.body, b'')
+
+    def test_if_modified_since(self):
+        from webob.datetime_utils import serialize_date
+        context = self._fixture()
+        modified = IBlobs(context)['file'].modified
+        response = self._serve(context, **{'If-Modified-Since': serialize_date(modified)})
+        self.assertEqual(response.status_int, 304)
+
+    def test_range(self):
+        context = self._fixture()
+        response = self._serve(context, Range = 'bytes=6-10')
+        self.assertEqual(response.status_int, 206)
+        self.assertEqual(response.body, b'world')
+        self.assertEqual(response.content_range.start, 6)
+
+    def test_empty_blob(self):
+        context = self._fixture(data = b'')
+        self.assertRaises(HTTPNotFound, self._fut, context, testing.DummyRequest())
+
+    def test_missing_key(self):
+        context = self._fixture()
+        self.assertRaises(HTTPNotFound, self._fut, context, testing.DummyRequest(), blob_key = 'other')
+
+
+class BlobIterTests(TestCase):
+
+    @property
+    def _cut(self):
+        from arche.models.blob import BlobIter
+        return BlobIter
+
+    def test_iter(self):
+        obj = self._cut(BytesIO(b'abcdefg'), block_size = 3)
+        self.assertEqual(list(obj), [b'abc', b'def', b'g'])
+
+    def test_range(self):
+        obj = self._cut(BytesIO(b'abcdefg'), block_size = 3)
+        self.assertEqual(list(obj.app_iter_range(1, 6)), [b'bcd', b'ef'])
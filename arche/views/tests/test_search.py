@@ -0,0 +1,104 @@
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from pyramid import testing
+from pyramid.request import apply_request_extensions
+
+
+class SearchViewTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    @property
+    def _cut(self):
+        from arche.views.search import SearchView
+        return SearchView
+
+    def _fixture(self, num = 5, allowed_to_view = False):
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        if not allowed_to_view:
+            # The index depends on the security policy, which isn't what's tested here
+            del root.catalog['allowed_to_view']
+        for i in range(num):
+            root['d%s' % i] = Document(title = 'Doc %s' % i)
+        return root
+
+    def _mk_view(self, root, **params):
+        from webob.multidict import MultiDict
+        request = testing.DummyRequest(params = params)
+        request.GET = MultiDict(params)
+        request.root = root
+        apply_request_extensions(request)
+        return self._cut(root, request)
+
+    def test_sort_and_batch(self):
+        root = self._fixture()
+        view = self._mk_view(root, type_name = 'Document', sort_on = 'sortable_title',
+                             reverse = 'true', start = '1', limit = '2')
+        view._mk_query()
+        batch = view.get_batch()
+        self.assertEqual([x.title for x in batch], ['Doc 3', 'Doc 2'])
+        self.assertEqual(batch.total, 5)
+        self.assertEqual((batch.previous_start, batch.next_start), (0, 3))
+
+    def test_relevance_is_default_for_text_queries(self):
+        root = self._fixture()
+        view = self._mk_view(root, query = 'Doc')
+        self.assertEqual(view.sort_on, 'searchable_text')
+        view = self._mk_view(root, query = 'Doc', sort_on = 'title')
+        self.assertEqual(view.sort_on, 'title')
+
+    def test_bad_sort_on_ignored(self):
+        root = self._fixture()
+        view = self._mk_view(root, sort_on = '404')
+        self.assertEqual(view.sort_on, None)
+
+    def test_offset_is_start(self):
+        root = self._fixture()
+        view = self._mk_view(root, offset = '3')
+        self.assertEqual(view.start, 3)
+        self.assertEqual(view.offset, 3)
+
+    def test_search_json_from_rows(self):
+        self.config.include('arche.models.datetime_handler')
+        self.config.include('arche.models.jsondata')
+        self.config.include('arche.resources')
+        root = self._fixture(num = 3, allowed_to_view = True)
+        view = self._mk_view(root, type_name = 'Document', sort_on = 'sortable_title', limit = '2')
+        url = view.request.resource_url(root['d0'])
+        # Objects aren't loaded
+        for name in root.keys():
+            root.data[name] = None
+        response = view.search_json()
+        self.assertEqual([x['title'] for x in response['results']], ['Doc 0', 'Doc 1'])
+        self.assertEqual(response['results'][0]['url'], url)
+        self.assertEqual(response['total'], 3)
+
+    def test_search_json_objects_without_allowed_to_view(self):
+        self.config.include('arche.models.datetime_handler')
+        self.config.include('arche.models.jsondata')
+        self.config.include('arche.resources')
+        root = self._fixture(num = 3)
+        view = self._mk_view(root, type_name = 'Document', sort_on = 'sortable_title', limit = '2')
+        response = view.search_json()
+        self.assertEqual([x['title'] for x in response['results']], ['Doc 0', 'Doc 1'])
+
+    def test_search_select2_from_rows(self):
+        self.config.include('arche.resources')
+        root = self._fixture(num = 2, allowed_to_view = True)
+        view = self._mk_view(root, type_name = 'Document', sort_on = 'sortable_title')
+        uids = [root['d0'].uid, root['d1'].uid]
+        for name in root.keys():
+            root.data[name] = None
+        response = view.search_select_2_json()
+        self.assertEqual([(x['text'], x['id'], x['type_title']) for x in response['results']],
+                         [('Doc 0', uids[0], 'Document'), ('Doc 1', uids[1], 'Document')])
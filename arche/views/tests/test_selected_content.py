@@ -0,0 +1,59 @@
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from pyramid import testing
+from pyramid.request import apply_request_extensions
+
+
+class SelectedContentViewTests(TestCase):
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.config.include('arche.testing')
+        self.config.include('arche.testing.catalog')
+        self.config.include('arche.resources')
+
+    def tearDown(self):
+        testing.tearDown()
+
+    @property
+    def _cut(self):
+        from arche.views.selected_content import SelectedContentView
+        return SelectedContentView
+
+    def _fixture(self):
+        from arche.resources import Document
+        from arche.resources import Root
+        root = Root()
+        root['a'] = Document(title = 'A', description = 'First', body = '<p>Body</p>')
+        root['b'] = Document(title = 'B')
+        return root
+
+    def _mk_view(self, root, show_body = False):
+        request = testing.DummyRequest()
+        request.root = root
+        apply_request_extensions(request)
+        view = self._cut(root, request)
+        view.settings = {'selected_content': [root['b'].uid, root['a'].uid, 'missing'],
+                         'show_body': show_body}
+        return view
+
+    def test_from_rows(self):
+        root = self._fixture()
+        view = self._mk_view(root)
+        urls = [view.request.resource_url(root['b']), view.request.resource_url(root['a'])]
+        # Objects aren't loaded
+        for name in root.keys():
+            root.data[name] = None
+        contents = view()['contents']
+        self.assertEqual([x['title'] for x in contents], ['B', 'A'])
+        self.assertEqual([x['url'] for x in contents], urls)
+        self.assertEqual(contents[1]['description'], 'First')
+
+    def test_show_body_loads_objects(self):
+        root = self._fixture()
+        view = self._mk_view(root, show_body = True)
+        contents = view()['contents']
+        self.assertEqual([x['title'] for x in contents], ['B', 'A'])
+        self.assertEqual(contents[1]['body'], '<p>Body</p>')
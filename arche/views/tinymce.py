@@ -1,6 +1,7 @@
 from pyramid.view import view_config
 from repoze.folder import IFolder
 
+from arche.models.folder_batch import batch_params
 from arche.views.base import BaseView
 
 
@@ -9,12 +10,12 @@ class TinyMCEViews(BaseView):
     def external_image_list(self):
         images = []
         if IFolder.providedBy(self.context):
-            for obj in self.context.values():
-                if obj.type_name != 'Image':
-                    continue
+            start, limit = batch_params(self.request, limit=100)
+            batch = self.request.folder_batch(self.context, start=start, limit=limit,
+                                              sort_on='sortable_title', filters={'type_name': 'Image'})
+            for obj in batch:
                 url = self.request.resource_url(obj, 'inline')
                 images.append({'title': obj.title, 'value': url})
-            images.sort(key=lambda x: x['title'].lower())
         return images
 
 
@@ -2,8 +2,10 @@ from __future__ import unicode_literals
 
 from itertools import islice
 
+from pyramid.decorator import reify
 from pyramid.httpexceptions import HTTPBadRequest
 
+from repoze.catalog.query import Any
 from repoze.catalog.query import Eq
 from repoze.catalog.query import Contains
 
@@ -11,6 +13,9 @@ from arche import _
 from arche import security
 from arche.fanstatic_lib import users_groups_js
 from arche.interfaces import IJSONData
+from arche.models.catalog import get_catalog_rows
+from arche.models.catalog import has_row_fields
+from arche.models.jsondata import JSONRowData
 from arche.views.base import BaseView
 
 
@@ -32,9 +37,19 @@ class UsersView(BaseView):
 
 
 class JSONUsers(BaseView):
+    """ Users are read from catalog rows instead of loading the objects,
+        if the catalog has metadata or field indexes for all attributes.
+    """
+    json_attrs = ('userid', 'email', 'first_name', 'last_name', 'email_validated')
+
+    @reify
+    def use_rows(self):
+        return has_row_fields(self.request, JSONRowData.required_fields(self.json_attrs))
 
     def __call__(self):
         query = Eq('type_name', 'User') & Eq('path', self.request.resource_path(self.context))
+        if self.use_rows:
+            query &= Any('allowed_to_view', self.request.catalog_principals)
         q = self.request.GET.get('q')
         if q:
             q = ' '.join([w+'*' for w in q.split()])
@@ -51,7 +66,11 @@ class JSONUsers(BaseView):
             raise HTTPBadRequest()
         # Slice off some?
         docids = islice(docids, start, start+limit)
-        users = self.request.resolve_docids(docids)
+        if self.use_rows:
+            fields = JSONRowData.required_fields(self.json_attrs)
+            users = get_catalog_rows(self.root, docids, fields)
+        else:
+            users = self.request.resolve_docids(docids)
         return {
             'items': self.json_format_objects(users),
             'total': result.total,
@@ -64,7 +83,7 @@ class JSONUsers(BaseView):
             res.append(adapted(
                 self.request,
                 dt_formater=self.request.dt_handler.format_relative,
-                attrs=('userid', 'email', 'first_name', 'last_name', 'email_validated')
+                attrs=self.json_attrs
             ))
         return res
 
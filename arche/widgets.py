@@ -15,6 +15,9 @@ from repoze.catalog.query import Eq
 
 from arche import _
 from arche.interfaces import IFileUploadTempStore
+from arche.models.catalog import get_catalog_rows
+from arche.models.catalog import get_row_fields
+from arche.utils import get_docids_for_uids
 
 
 colander_ts = colander._
@@ -140,26 +143,52 @@ class ReferenceWidget(Select2Widget):
     context_from = 'get_root' # Which attribute on view to fetch the context from.
     #Make query view configurable?
 
+    def _referenced_docids(self, root, cstruct):
+        if not self.multiple:
+            cstruct = (cstruct,)
+        if self.id_attr == 'uid':
+            return get_docids_for_uids(root.catalog, cstruct)
+        docids = []
+        for value in cstruct:
+            docids.extend(root.catalog.query(Eq(self.id_attr, value))[1])
+        return docids
+
     def _fetch_referenced_objects(self, field, cstruct):
         if cstruct in (colander.null, None, ''):
             return []
-        view = field.schema.bindings['view']
-        root = view.root
-        query = root.catalog.query
+        root = field.schema.bindings['view'].root
         address_for_docid = root.document_map.address_for_docid
         results = []
-        if self.multiple:
-            docids = []
-            for uid in cstruct:
-                docids.extend(query(Eq(self.id_attr, uid))[1])
-        else:
-            docids = query(Eq(self.id_attr, cstruct))[1]
-        for docid in docids:
+        for docid in self._referenced_docids(root, cstruct):
             path = address_for_docid(docid)
             obj = find_resource(root, path)
             results.append(obj)
         return results
 
+    def _fetch_referenced_items(self, field, cstruct):
+        """ Returns a dict with id, title, userid, name and url for each referenced object.
+            They're read from catalog rows when the catalog has those fields.
+        """
+        if cstruct in (colander.null, None, ''):
+            return []
+        view = field.schema.bindings['view']
+        request = view.request
+        root = view.root
+        fields = set(['title', 'userid', self.id_attr])
+        if not fields <= get_row_fields(root.catalog, request.registry):
+            return [{'id': getattr(obj, self.id_attr, None),
+                     'title': getattr(obj, 'title', None),
+                     'userid': getattr(obj, 'userid', None),
+                     'name': obj.__name__,
+                     'url': request.resource_url(obj)}
+                    for obj in self._fetch_referenced_objects(field, cstruct)]
+        return [{'id': row.get(self.id_attr, None),
+                 'title': row.get('title', None),
+                 'userid': row.get('userid', None),
+                 'name': row['__name__'],
+                 'url': row.url(request)}
+                for row in get_catalog_rows(root, self._referenced_docids(root, cstruct), fields)]
+
     def serialize(self, field, cstruct, **kw):
         if self.sortable:
             #FIXME: Deform doesn't use fanstatic. Include some other way?
@@ -180,7 +209,7 @@ class ReferenceWidget(Select2Widget):
         template = readonly and self.readonly_template or self.template
         kw.setdefault('request', view.request)
         tmpl_values = self.get_template_values(field, cstruct, kw)
-        tmpl_values['values'] = self._fetch_referenced_objects(field, cstruct)
+        tmpl_values['values'] = self._fetch_referenced_items(field, cstruct)
         if not readonly:
             query_params = self.default_query_params.copy()
             query_params.update(self.query_params)
@@ -41,6 +41,9 @@ extras_require = {
         'Pillow',
         'plone.scale',
     ),
+    'stemming': (
+        'snowballstemmer',
+    ),
 }
 
 tests_require = requires + extras_require['thumbnails']